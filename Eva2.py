@@ -2,12 +2,17 @@ import sqlite3
 import csv
 import datetime
 
+from bitacora import configurar, obtener_bitacora
+from cuenta_corriente import TIEMPO_ESPERA_BLOQUEO, con_reintentos
+
+bitacora = obtener_bitacora('Eva2')
+
 DB_NAME = "MovimientosYCtaCte.db"
 
 
 def crear_conexion():
-    """Crea y retorna una conexión a la base de datos."""
-    return sqlite3.connect(DB_NAME)
+    """Crea y retorna una conexión a la base de datos (espera si otro proceso la bloquea)."""
+    return sqlite3.connect(DB_NAME, timeout=TIEMPO_ESPERA_BLOQUEO)
 
 
 def crear_tablas():
@@ -119,35 +124,43 @@ class CuentaCorriente:
 
         Args:
             nombre_archivo (str): Nombre del archivo CSV de salida.
-        """
-        try:
-            with crear_conexion() as con:
-                cursor = con.cursor()
-                cursor.execute("SELECT * FROM CtaCte")
-                resultados = cursor.fetchall()
-                columnas = [desc[0] for desc in cursor.description]
-
-            if not resultados:
-                print("No hay cuentas para exportar.")
-                return
 
-            with open(nombre_archivo, 'w', newline='', encoding='utf-8') as archivo:
-                escritor = csv.writer(archivo)
-                escritor.writerow(columnas)
-                for fila in resultados:
-                    print(fila)
-                    escritor.writerow(fila)
-
-            print(f"Se exportaron {len(resultados)} cuentas correctamente a {nombre_archivo}.\n")
-
-        except Exception as e:
-            print(f"Error al exportar CSV: {e}")
+        Si la base está bloqueada por otro proceso la lectura se reintenta;
+        cualquier otro error (o un bloqueo que no se libera) se propaga al
+        llamador en vez de solo imprimirse.
+        """
+        def escribir_cuentas():
+            # Las filas pasan del cursor al CSV sin pasar por una lista;
+            # un reintento vuelve a escribir el archivo desde el comienzo.
+            con = crear_conexion()
+            try:
+                con.execute("BEGIN")  # el conteo y las filas salen de la misma lectura
+                cantidad = con.execute("SELECT COUNT(*) FROM CtaCte").fetchone()[0]
+                if cantidad:
+                    cursor = con.execute("SELECT * FROM CtaCte")
+                    with open(nombre_archivo, 'w', newline='', encoding='utf-8') as archivo:
+                        escritor = csv.writer(archivo)
+                        escritor.writerow([desc[0] for desc in cursor.description])
+                        escritor.writerows(cursor)
+                return cantidad
+            finally:
+                con.close()
+
+        cantidad = con_reintentos('exportar_csv', escribir_cuentas)
+
+        if not cantidad:
+            bitacora.warning("No hay cuentas para exportar.")
+            return
+
+        bitacora.info("Se exportaron %d cuentas correctamente a %s.", cantidad, nombre_archivo)
 
 
 # =======================
 # EJEMPLO DE USO
 # =======================
 if __name__ == "__main__":
+    configurar(formato='texto', muestreo=None)
+
     # Instanciación de cuentas corrientes con valores de ejemplo
     cuenta1 = CuentaCorriente("Juan Pérez", 150000)
     cuenta2 = CuentaCorriente("María López", 250000)
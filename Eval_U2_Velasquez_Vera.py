@@ -1,6 +1,10 @@
 import sqlite3
 import csv
 
+from bitacora import configurar, obtener_bitacora
+
+bitacora = obtener_bitacora('Eval_U2_Velasquez_Vera')
+
 # Me conecto a la base de datos
 def crear_conexion():
     """Creo y retorno una conexión a la base de datos."""
@@ -79,24 +83,25 @@ class CuentaCorriente:
 
     def abonar(self, monto: int):
         if monto <= 0:
-            print("Error: El monto debe ser mayor a 0.")
-            return
+            raise ValueError("El monto debe ser mayor a 0.")
         self.saldo_cta += monto
         self._actualizar_saldo_bd()
         self._registrar_movimiento(monto, 0)
-        print(f"Abono exitoso: ${monto} abonados a la cuenta {self.numero_cta_cte}. Saldo actual: ${self.saldo_cta}.")
+        bitacora.info("Abono exitoso: $%s abonados a la cuenta %s. Saldo actual: $%s.",
+                      monto, self.numero_cta_cte, self.saldo_cta)
+        return self.saldo_cta
 
     def cargar(self, monto: int):
         if monto <= 0:
-            print("Error: El monto debe ser mayor a 0.")
-            return
+            raise ValueError("El monto debe ser mayor a 0.")
         if self.saldo_cta < monto:
-            print(f"Error: Saldo insuficiente. Saldo actual: ${self.saldo_cta}.")
-            return
+            raise ValueError(f"Saldo insuficiente. Saldo actual: ${self.saldo_cta}.")
         self.saldo_cta -= monto
         self._actualizar_saldo_bd()
         self._registrar_movimiento(monto, 1)
-        print(f"Carga exitosa: ${monto} cargados de la cuenta {self.numero_cta_cte}. Saldo actual: ${self.saldo_cta}.")
+        bitacora.info("Carga exitosa: $%s cargados de la cuenta %s. Saldo actual: $%s.",
+                      monto, self.numero_cta_cte, self.saldo_cta)
+        return self.saldo_cta
 
     def _actualizar_saldo_bd(self):
         con = crear_conexion()
@@ -124,33 +129,35 @@ class CuentaCorriente:
         con = crear_conexion()
         cursor = con.cursor()
         cursor.execute("SELECT * FROM CtaCte")
-        cuentas = cursor.fetchall()
         with open('CuentasCorrientes.csv', 'w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             writer.writerow(["ID Cta Cte", "Numero Cta Cte", "Rut Titular", "Nombre Titular", "Saldo"])
-            for id_cta, numero, rut, nombre, saldo in cuentas:
-                writer.writerow([id_cta, numero, rut, nombre, saldo])
+            writer.writerows(cursor)
         con.close()
-        print("Exportación de Cuentas Corrientes completa.")
+        bitacora.info("Exportación de Cuentas Corrientes completa.")
 
     def exportar_csv_movimientos(self):
         con = crear_conexion()
         cursor = con.cursor()
-        cursor.execute("SELECT * FROM Movimientos")
-        movimientos = cursor.fetchall()
+        # La descripción se calcula en SQL: las filas pasan directo al CSV
+        cursor.execute("""
+            SELECT id_movimientos, id_cta_cte, tipo_movimiento, monto,
+                   CASE tipo_movimiento WHEN 0 THEN 'Abono' ELSE 'Cargo' END
+            FROM Movimientos
+        """)
         with open('Movimientos.csv', 'w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             writer.writerow(["ID Movimiento", "ID Cta Cte", "Tipo Movimiento", "Monto", "Descripcion"])
-            for id_mov, id_cta, tipo, monto in movimientos:
-                descripcion = "Abono" if tipo == 0 else "Cargo"
-                writer.writerow([id_mov, id_cta, tipo, monto, descripcion])
+            writer.writerows(cursor)
         con.close()
-        print("Exportación de Movimientos completa.")
+        bitacora.info("Exportación de Movimientos completa.")
 
 
 
 # Ejemplos de uso
 
+configurar(formato='texto', muestreo=None)
+
 cuenta1 = CuentaCorriente(10000001, "12345678-9", "Matias Delgado", 150000)
 cuenta2 = CuentaCorriente(10000002, "98765432-1", "Danilo Lopez", 250000)
 cuenta3 = CuentaCorriente(10000003, "11223344-5", "Samira Ortega", 50000)
@@ -158,8 +165,14 @@ cuenta3 = CuentaCorriente(10000003, "11223344-5", "Samira Ortega", 50000)
 cuenta3.abonar(20000)
 cuenta1.cargar(5000)
 cuenta2.abonar(30000)
-cuenta1.cargar(999999)  # Error por saldo insuficiente
-cuenta1.abonar(-100)     # Error por monto inválido
+try:
+    cuenta1.cargar(999999)  # Error por saldo insuficiente
+except ValueError as e:
+    print(f"Error: {e}")
+try:
+    cuenta1.abonar(-100)     # Error por monto inválido
+except ValueError as e:
+    print(f"Error: {e}")
 
 # Exportar a CSV
 cuenta1.exportar_csv_ctacte()
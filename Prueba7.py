@@ -139,12 +139,10 @@ class CuentaCorriente:
         con = crear_conexion()
         cursor = con.cursor()
         cursor.execute("SELECT * FROM CtaCte")
-        cuentas = cursor.fetchall()
         with open('CuentasCorrientes.csv', 'w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             writer.writerow(["ID Cta Cte", "Numero Cta Cte", "Rut Titular", "Nombre Titular", "Saldo"])
-            for ID, numero, rut, nombre, saldo in cuentas:
-                writer.writerow([ID, numero, rut, nombre, saldo])
+            writer.writerows(cursor)
         con.close()
         print("Exportación de Cuentas Corrientes completa.")
 
@@ -152,14 +150,16 @@ class CuentaCorriente:
         """Exporta todos los movimientos a CSV."""
         con = crear_conexion()
         cursor = con.cursor()
-        cursor.execute("SELECT IdMovimientos, idCtaCte, tipoMovimiento, Monto FROM Movimientos")
-        movimientos = cursor.fetchall()
+        # La descripción se calcula en SQL: las filas pasan directo al CSV
+        cursor.execute("""
+            SELECT IdMovimientos, idCtaCte, tipoMovimiento, Monto,
+                   CASE tipoMovimiento WHEN 0 THEN 'Abono' ELSE 'Cargo' END
+            FROM Movimientos
+        """)
         with open('Movimientos.csv', 'w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             writer.writerow(["ID Movimiento", "ID Cta Cte", "Tipo Movimiento", "Monto", "Descripcion"])
-            for id_mov, id_cta, tipo, monto in movimientos:
-                descripcion = "Abono" if tipo == 0 else "Cargo"
-                writer.writerow([id_mov, id_cta, tipo, monto, descripcion])
+            writer.writerows(cursor)
         con.close()
         print("Exportación de Movimientos completa.")
 
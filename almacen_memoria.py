@@ -0,0 +1,204 @@
+import datetime
+import json
+import threading
+import time
+from array import array
+
+from bitacora import obtener_bitacora
+from cuenta_corriente import asignador_de, avanzar_secuencia_movimientos, crear_tablas, transaccion_escritura
+
+bitacora = obtener_bitacora('almacen_memoria')
+
+
+def _ultimo_id(cursor, tabla):
+    """
+    Retorna el mayor ID usado en una tabla, considerando sqlite_sequence para
+    no reutilizar IDs de filas borradas o archivadas.
+    """
+    cursor.execute(f'''
+        SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),
+            COALESCE((SELECT MAX(ID) FROM {tabla}), 0)
+        )
+    ''', (tabla,))
+    return cursor.fetchone()[0]
+
+
+def _claves_usadas(cursor, claves):
+    """Retorna cuáles de `claves` ya tiene la base (en movimientos o archivadas)."""
+    cursor.execute('''
+        SELECT claveIdempotencia FROM movimientos WHERE claveIdempotencia IN (SELECT value FROM json_each(?1))
+        UNION
+        SELECT claveIdempotencia FROM clavesArchivadas WHERE claveIdempotencia IN (SELECT value FROM json_each(?1))
+    ''', (json.dumps(claves),))
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+class AlmacenMemoria:
+    """
+    Almacén de cuentas y movimientos completamente en memoria.
+
+    Ofrece la misma interfaz que AlmacenSQLite, así que se usa con
+    `CuentaCorriente(..., almacen=AlmacenMemoria())` sin cambiar el resto del
+    código. Pensado para simulaciones (por ejemplo, Monte Carlo) con millones
+    de operaciones: no hay conexiones ni escrituras a disco por movimiento.
+    Los datos se guardan en columnas (`array` para números, listas para
+    textos) y el ID de cada registro es su posición + 1. Al terminar se puede
+    volcar todo a SQLite con `volcar_a_sqlite`.
+    """
+
+    def __init__(self):
+        self.clave = f"memoria:{id(self)}"
+        self._candado = threading.Lock()
+
+        # Cuentas
+        self.numeros = array('d')
+        self.ruts = []
+        self.nombres = []
+        self.saldos = array('d')
+
+        # Movimientos
+        self.mov_cuentas = array('q')
+        self.mov_ids = array('d')
+        self.mov_tipos = array('b')
+        self.mov_montos = array('d')
+        self.mov_fechas = array('d')
+        self.mov_saldos = array('d')
+        self.mov_descripciones = []
+        self.claves = {}
+        self._ultimo_id_movimiento = 0
+
+    def nuevo_id_movimiento(self):
+        """
+        Asigna un id_movimiento provisorio (negativo: -1, -2, ...), único
+        dentro de este almacén. volcar_a_sqlite lo reemplaza por uno del
+        AsignadorIds de la base, así no choca con los IDs ya entregados.
+        """
+        with self._candado:
+            self._ultimo_id_movimiento += 1
+            return -self._ultimo_id_movimiento
+
+    def registrar_cuenta(self, numero_cuenta, rut_titular, nombre_titular, saldo):
+        """Registra la cuenta y devuelve su ID."""
+        with self._candado:
+            self.numeros.append(numero_cuenta)
+            self.ruts.append(rut_titular)
+            self.nombres.append(nombre_titular)
+            self.saldos.append(saldo)
+            return len(self.saldos)
+
+    def registrar_cuentas(self, cuentas):
+        """Registra varias cuentas y devuelve sus IDs."""
+        return [self.registrar_cuenta(*fila) for fila in cuentas]
+
+    def leer_cuenta(self, id_cuenta):
+        """Retorna (numero, rut, nombre, saldo) o None."""
+        if not 1 <= id_cuenta <= len(self.saldos):
+            return None
+        i = id_cuenta - 1
+        return self.numeros[i], self.ruts[i], self.nombres[i], self.saldos[i]
+
+    def _saldo(self, id_cuenta):
+        if not 1 <= id_cuenta <= len(self.saldos):
+            raise ValueError(f"La cuenta {id_cuenta} no existe.")
+        return self.saldos[id_cuenta - 1]
+
+    def aplicar_movimientos(self, movimientos):
+        """
+        Aplica depósitos/retiros de forma atómica (mismo contrato que
+        AlmacenSQLite.aplicar_movimientos).
+
+        Todo se valida antes de modificar las columnas, así que si un retiro
+        no tiene saldo suficiente el almacén queda intacto.
+        """
+        with self._candado:
+            saldos = {}
+            claves_lote = {}
+            nuevos = []
+            ids = []
+            siguiente_id = len(self.mov_cuentas) + 1
+            for id_cuenta, tipo, monto, id_movimiento, clave, descripcion in movimientos:
+                if id_cuenta not in saldos:
+                    saldos[id_cuenta] = self._saldo(id_cuenta)
+                if clave is not None:
+                    original = claves_lote.get(clave) or self.claves.get(clave)
+                    if original is not None:
+                        ids.append(original)
+                        continue
+
+                saldo = saldos[id_cuenta] + monto if tipo == 1 else saldos[id_cuenta] - monto
+                if saldo < 0:
+                    raise ValueError("Saldo insuficiente.")
+                saldos[id_cuenta] = saldo
+                if clave is not None:
+                    claves_lote[clave] = siguiente_id
+                nuevos.append((id_cuenta, id_movimiento, tipo, monto, saldo, descripcion))
+                ids.append(siguiente_id)
+                siguiente_id += 1
+
+            ahora = time.time()
+            for id_cuenta, id_movimiento, tipo, monto, saldo, descripcion in nuevos:
+                self.mov_cuentas.append(id_cuenta)
+                self.mov_ids.append(id_movimiento)
+                self.mov_tipos.append(tipo)
+                self.mov_montos.append(monto)
+                self.mov_fechas.append(ahora)
+                self.mov_saldos.append(saldo)
+                self.mov_descripciones.append(descripcion)
+            self.claves.update(claves_lote)
+            for id_cuenta, saldo in saldos.items():
+                self.saldos[id_cuenta - 1] = saldo
+        return ids, saldos
+
+    def vaciar(self):
+        """Todo queda aplicado en memoria: no hay nada pendiente que escribir."""
+
+    def volcar_a_sqlite(self, nombre_bd=None):
+        """
+        Copia todas las cuentas y movimientos a SQLite en una transacción.
+
+        Los registros reciben IDs nuevos a continuación de los existentes en
+        la base: el ID en SQLite es el ID en memoria más el desplazamiento.
+        Si la base ya tiene alguna de las claves de idempotencia, el
+        movimiento se copia igual (su monto ya está en el saldo de la cuenta)
+        pero sin clave, para no chocar con el índice único.
+        Los id_movimiento provisorios (ver nuevo_id_movimiento) se reemplazan
+        por un rango reservado en el AsignadorIds de la base.
+        Retorna (desplazamiento_cuentas, desplazamiento_movimientos,
+        claves_omitidas).
+        """
+        crear_tablas(nombre_bd)
+        # La reserva usa su propia transacción: va antes de la del volcado
+        provisorios = self._ultimo_id_movimiento
+        primer_id = asignador_de(nombre_bd).reservar(provisorios) if provisorios else 0
+        with self._candado, transaccion_escritura(nombre_bd) as con:
+            cursor = con.cursor()
+            base_cuentas = _ultimo_id(cursor, 'ctacte')
+            base_movimientos = _ultimo_id(cursor, 'movimientos')
+            usadas = _claves_usadas(cursor, list(self.claves))
+            claves_por_id = {id_registro: clave for clave, id_registro in self.claves.items()
+                             if clave not in usadas}
+
+            cursor.executemany('''
+                INSERT INTO ctacte (ID, NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta)
+                VALUES (?, ?, ?, ?, ?)
+            ''', ((base_cuentas + i + 1, self.numeros[i], self.ruts[i], self.nombres[i], self.saldos[i])
+                  for i in range(len(self.saldos))))
+
+            formato = "%Y-%m-%d %H:%M:%S"
+            cursor.executemany('''
+                INSERT INTO movimientos (ID, idCtaCte, idMovimientos, tipoMovimiento, Monto, claveIdempotencia, fecha,
+                                         saldoResultante, descripcion)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', ((base_movimientos + i + 1, base_cuentas + self.mov_cuentas[i],
+                   primer_id - self.mov_ids[i] - 1 if self.mov_ids[i] < 0 else self.mov_ids[i],
+                   self.mov_tipos[i], self.mov_montos[i], claves_por_id.get(i + 1),
+                   datetime.datetime.fromtimestamp(self.mov_fechas[i]).strftime(formato), self.mov_saldos[i],
+                   self.mov_descripciones[i])
+                  for i in range(len(self.mov_cuentas))))
+            # Los id_movimiento entregados por el llamador se copian tal cual
+            avanzar_secuencia_movimientos(cursor)
+
+        bitacora.info("Se volcaron %s cuentas y %s movimientos a SQLite (%s claves de idempotencia ya "
+                      "existían y se omitieron).", len(self.saldos), len(self.mov_cuentas), len(usadas))
+        return base_cuentas, base_movimientos, len(usadas)
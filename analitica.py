@@ -0,0 +1,253 @@
+import bisect
+import heapq
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy se usan arreglos del módulo array
+    np = None
+
+from cuenta_corriente import crear_conexion, crear_tablas
+
+TAMANO_BLOQUE = 100000
+
+# Tipo de cada columna: código de array y su equivalente en NumPy
+TIPOS = {
+    'ID': ('q', 'int64'),
+    'idCtaCte': ('q', 'int64'),
+    'tipoMovimiento': ('b', 'int8'),
+    'SaldoCta': ('d', 'float64'),
+    'Monto': ('d', 'float64'),
+    'segundos': ('q', 'int64'),
+}
+
+# Columnas calculadas en SQL para que lleguen como números
+EXPRESIONES = {
+    'segundos': "CAST(strftime('%s', fecha) AS INTEGER)",
+}
+
+
+def _arreglo(valores, columna):
+    codigo, dtype = TIPOS[columna]
+    if np is not None:
+        return np.fromiter(valores, dtype=dtype, count=len(valores))
+    return array(codigo, valores)
+
+
+def leer_bloques(tabla, columnas, donde=None, nombre_bd=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Recorre `tabla` por bloques de `tamano_bloque` filas y entrega, por cada
+    bloque, un diccionario {columna: arreglo tipado}.
+
+    Los arreglos son de NumPy si está instalado y del módulo array si no.
+    Nunca hay más de un bloque en memoria, así que sirve para tablas más
+    grandes que la RAM.
+    """
+    seleccion = ', '.join(EXPRESIONES.get(columna, columna) for columna in columnas)
+    consulta = f"SELECT {seleccion} FROM {tabla}"
+    if donde:
+        consulta += f" WHERE {donde}"
+    con = crear_conexion(nombre_bd)
+    try:
+        cursor = con.execute(consulta)
+        while True:
+            filas = cursor.fetchmany(tamano_bloque)
+            if not filas:
+                break
+            yield {columna: _arreglo(valores, columna) for columna, valores in zip(columnas, zip(*filas))}
+    finally:
+        con.close()
+
+
+def cargar_columnas(tabla, columnas, donde=None, nombre_bd=None, tamano_bloque=TAMANO_BLOQUE):
+    """Carga columnas completas en memoria, como arreglos tipados."""
+    resultado = {columna: [] for columna in columnas}
+    for bloque in leer_bloques(tabla, columnas, donde, nombre_bd, tamano_bloque):
+        for columna in columnas:
+            resultado[columna].append(bloque[columna])
+    if np is not None:
+        return {columna: np.concatenate(partes) if partes else np.empty(0, TIPOS[columna][1])
+                for columna, partes in resultado.items()}
+    unidos = {}
+    for columna, partes in resultado.items():
+        unidos[columna] = array(TIPOS[columna][0])
+        for parte in partes:
+            unidos[columna].extend(parte)
+    return unidos
+
+
+# ==============================
+# Saldos
+# ==============================
+def distribucion_saldos(intervalos=10, nombre_bd=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Resume los saldos de todas las cuentas: cantidad, total, promedio,
+    desviación estándar, mínimo, máximo e histograma con `intervalos`
+    tramos de igual ancho ([(desde, hasta, cantidad), ...]).
+
+    La desviación se calcula con la media y la suma de cuadrados de las
+    diferencias de cada bloque, combinadas entre bloques (Chan et al.): a
+    diferencia de E[x²] − E[x]², no pierde precisión con saldos grandes y
+    parecidos.
+    """
+    con = crear_conexion(nombre_bd)
+    try:
+        minimo, maximo = con.execute("SELECT MIN(SaldoCta), MAX(SaldoCta) FROM ctacte").fetchone()
+    finally:
+        con.close()
+    if minimo is None:
+        return {'cantidad': 0, 'total': 0.0, 'promedio': None, 'desviacion': None,
+                'minimo': None, 'maximo': None, 'histograma': []}
+
+    ancho = (maximo - minimo) / intervalos or 1.0
+    limites = [minimo + ancho * i for i in range(intervalos + 1)]
+    conteos = [0] * intervalos
+    cantidad, total, media, cuadrados = 0, 0.0, 0.0, 0.0
+    for bloque in leer_bloques('ctacte', ['SaldoCta'], nombre_bd=nombre_bd, tamano_bloque=tamano_bloque):
+        saldos = bloque['SaldoCta']
+        filas = len(saldos)
+        if np is not None:
+            suma = float(saldos.sum())
+            diferencias = saldos - suma / filas
+            cuadrados_bloque = float(np.dot(diferencias, diferencias))
+            # El último tramo incluye al máximo
+            indices = np.minimum(((saldos - minimo) / ancho).astype(np.int64), intervalos - 1)
+            for i, n in enumerate(np.bincount(indices, minlength=intervalos)):
+                conteos[i] += int(n)
+        else:
+            suma = math.fsum(saldos)
+            media_bloque = suma / filas
+            cuadrados_bloque = math.fsum((saldo - media_bloque) ** 2 for saldo in saldos)
+            for saldo in saldos:
+                conteos[min(bisect.bisect_right(limites, saldo) - 1, intervalos - 1)] += 1
+        # Combinación de la media y la suma de cuadrados con las de los bloques anteriores
+        delta = suma / filas - media
+        total += suma
+        media += delta * filas / (cantidad + filas)
+        cuadrados += cuadrados_bloque + delta * delta * cantidad * filas / (cantidad + filas)
+        cantidad += filas
+
+    return {
+        'cantidad': cantidad,
+        'total': total,
+        'promedio': total / cantidad,
+        'desviacion': math.sqrt(cuadrados / cantidad),
+        'minimo': minimo,
+        'maximo': maximo,
+        'histograma': [(limites[i], limites[i + 1], conteos[i]) for i in range(intervalos)],
+    }
+
+
+def top_cuentas(cantidad=10, nombre_bd=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Retorna las `cantidad` cuentas de mayor saldo como [(ID, saldo), ...].
+
+    Cada bloque se reduce a sus `cantidad` mejores antes de combinarlo con
+    los anteriores: nunca se guardan más de `cantidad` cuentas más un
+    bloque.
+    """
+    mejores = []
+    for bloque in leer_bloques('ctacte', ['ID', 'SaldoCta'], nombre_bd=nombre_bd, tamano_bloque=tamano_bloque):
+        ids, saldos = bloque['ID'], bloque['SaldoCta']
+        if np is not None:
+            if len(saldos) > cantidad:
+                indices = np.argpartition(saldos, -cantidad)[-cantidad:]
+                ids, saldos = ids[indices], saldos[indices]
+            candidatos = zip(ids.tolist(), saldos.tolist())
+        else:
+            candidatos = zip(ids, saldos)
+        mejores = heapq.nlargest(cantidad, list(candidatos) + mejores, key=lambda par: par[1])
+    return mejores
+
+
+# ==============================
+# Movimientos
+# ==============================
+def totales_por_tipo(nombre_bd=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Cantidad y monto total de movimientos por tipo:
+    {'depositos': (cantidad, monto), 'retiros': (cantidad, monto)}.
+    """
+    cantidades = [0, 0]
+    montos = [0.0, 0.0]
+    columnas = ['tipoMovimiento', 'Monto']
+    for bloque in leer_bloques('movimientos', columnas, nombre_bd=nombre_bd, tamano_bloque=tamano_bloque):
+        tipos, importes = bloque['tipoMovimiento'], bloque['Monto']
+        if np is not None:
+            por_tipo = np.bincount(tipos, minlength=2)
+            por_monto = np.bincount(tipos, weights=importes, minlength=2)
+            for tipo in (0, 1):
+                cantidades[tipo] += int(por_tipo[tipo])
+                montos[tipo] += float(por_monto[tipo])
+        else:
+            for tipo, monto in zip(tipos, importes):
+                cantidades[tipo] += 1
+                montos[tipo] += monto
+    return {'depositos': (cantidades[1], montos[1]), 'retiros': (cantidades[0], montos[0])}
+
+
+def velocidad(nombre_bd=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Estadísticas de velocidad del dinero:
+
+    - movimientos_por_dia / monto_por_dia: promedio y máximo diario
+      (solo días con movimientos con fecha).
+    - movimientos_por_cuenta: promedio y máximo entre las cuentas con
+      movimientos.
+    - rotacion: monto movido total dividido por el saldo total actual.
+    """
+    por_dia = {}
+    por_cuenta = {}
+    volumen = 0.0
+    columnas = ['idCtaCte', 'Monto', 'segundos']
+    for bloque in leer_bloques('movimientos', columnas, donde='fecha IS NOT NULL',
+                               nombre_bd=nombre_bd, tamano_bloque=tamano_bloque):
+        cuentas, montos, segundos = bloque['idCtaCte'], bloque['Monto'], bloque['segundos']
+        if np is not None:
+            volumen += float(montos.sum())
+            dias, inverso = np.unique(segundos // 86400, return_inverse=True)
+            cantidades = np.bincount(inverso)
+            sumas = np.bincount(inverso, weights=montos)
+            for dia, n, suma in zip(dias.tolist(), cantidades.tolist(), sumas.tolist()):
+                previo = por_dia.get(dia, (0, 0.0))
+                por_dia[dia] = (previo[0] + n, previo[1] + suma)
+            unicas, conteos = np.unique(cuentas, return_counts=True)
+            for cuenta, n in zip(unicas.tolist(), conteos.tolist()):
+                por_cuenta[cuenta] = por_cuenta.get(cuenta, 0) + n
+        else:
+            volumen += math.fsum(montos)
+            for cuenta, monto, segundo in zip(cuentas, montos, segundos):
+                dia = segundo // 86400
+                previo = por_dia.get(dia, (0, 0.0))
+                por_dia[dia] = (previo[0] + 1, previo[1] + monto)
+                por_cuenta[cuenta] = por_cuenta.get(cuenta, 0) + 1
+
+    con = crear_conexion(nombre_bd)
+    try:
+        saldo_total = con.execute("SELECT COALESCE(SUM(SaldoCta), 0) FROM ctacte").fetchone()[0]
+    finally:
+        con.close()
+
+    def resumen(valores):
+        valores = list(valores)
+        if not valores:
+            return {'promedio': None, 'maximo': None}
+        return {'promedio': sum(valores) / len(valores), 'maximo': max(valores)}
+
+    return {
+        'dias': len(por_dia),
+        'movimientos_por_dia': resumen(n for n, _ in por_dia.values()),
+        'monto_por_dia': resumen(suma for _, suma in por_dia.values()),
+        'movimientos_por_cuenta': resumen(por_cuenta.values()),
+        'rotacion': volumen / saldo_total if saldo_total else None,
+    }
+
+
+if __name__ == "__main__":
+    crear_tablas()
+    print("Motor:", "NumPy" if np is not None else "array")
+    print(distribucion_saldos())
+    print(top_cuentas())
+    print(totales_por_tipo())
+    print(velocidad())
@@ -0,0 +1,326 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+MAXIMO_CUENTAS = 100000
+MAXIMO_ALERTAS = 10000
+
+
+# ==============================
+# Estructuras por cuenta
+# ==============================
+class VentanaDeslizante:
+    """
+    Cantidad y suma de valores en los últimos `segundos`, en memoria constante.
+
+    La ventana se divide en `tramos` casilleros circulares; al avanzar el
+    tiempo se vacían los casilleros vencidos (a lo más `tramos`), así que
+    agregar y consultar cuesta O(1). La precisión es de un casillero.
+    """
+
+    __slots__ = ('ancho', 'cantidades', 'sumas', 'tramo_actual')
+
+    def __init__(self, segundos, tramos=12):
+        self.ancho = segundos / tramos
+        self.cantidades = [0] * tramos
+        self.sumas = [0.0] * tramos
+        self.tramo_actual = None
+
+    def _avanzar(self, instante):
+        tramo = int(instante // self.ancho)
+        if self.tramo_actual is None:
+            self.tramo_actual = tramo
+        vencidos = min(tramo - self.tramo_actual, len(self.cantidades))
+        for paso in range(1, vencidos + 1):
+            i = (self.tramo_actual + paso) % len(self.cantidades)
+            self.cantidades[i] = 0
+            self.sumas[i] = 0.0
+        self.tramo_actual = max(self.tramo_actual, tramo)
+
+    def agregar(self, instante, valor):
+        self._avanzar(instante)
+        i = self.tramo_actual % len(self.cantidades)
+        self.cantidades[i] += 1
+        self.sumas[i] += valor
+
+    def totales(self, instante):
+        """Retorna (cantidad, suma) dentro de la ventana."""
+        self._avanzar(instante)
+        return sum(self.cantidades), sum(self.sumas)
+
+
+class PromedioExponencial:
+    """Media y varianza con decaimiento exponencial (peso `alfa` al último valor)."""
+
+    __slots__ = ('alfa', 'media', 'varianza', 'observaciones')
+
+    def __init__(self, alfa=0.1):
+        self.alfa = alfa
+        self.media = 0.0
+        self.varianza = 0.0
+        self.observaciones = 0
+
+    def agregar(self, valor):
+        if self.observaciones == 0:
+            self.media = valor
+        else:
+            diferencia = valor - self.media
+            incremento = self.alfa * diferencia
+            self.media += incremento
+            self.varianza = (1 - self.alfa) * (self.varianza + diferencia * incremento)
+        self.observaciones += 1
+
+    @property
+    def desviacion(self):
+        return math.sqrt(self.varianza)
+
+
+# ==============================
+# Detectores
+# ==============================
+class Detector:
+    """
+    Regla de detección. Cada detector define el estado que guarda por
+    cuenta (`nuevo_estado`) y lo actualiza en `observar`, que retorna un
+    texto con el detalle si el movimiento es sospechoso o None si no.
+    `observar` debe costar tiempo constante.
+    """
+
+    nombre = 'detector'
+
+    def nuevo_estado(self):
+        return None
+
+    def observar(self, estado, tipo, monto, saldo, instante):
+        raise NotImplementedError
+
+
+class RafagaRetiros(Detector):
+    """Más de `maximo` retiros de una cuenta dentro de `segundos`."""
+
+    nombre = 'rafaga_retiros'
+
+    def __init__(self, maximo=5, segundos=60):
+        self.maximo = maximo
+        self.segundos = segundos
+
+    def nuevo_estado(self):
+        return VentanaDeslizante(self.segundos)
+
+    def observar(self, estado, tipo, monto, saldo, instante):
+        if tipo != 0:
+            return None
+        estado.agregar(instante, monto)
+        cantidad, suma = estado.totales(instante)
+        if cantidad > self.maximo:
+            return f"{cantidad} retiros por {suma:.2f} en {self.segundos} s"
+        return None
+
+
+class MontoInusual(Detector):
+    """
+    Monto mayor que la media de la cuenta más `factor` desviaciones
+    (media y desviación con decaimiento exponencial). No alerta hasta haber
+    visto `minimo_observaciones` movimientos de la cuenta.
+    """
+
+    nombre = 'monto_inusual'
+
+    def __init__(self, factor=4.0, alfa=0.1, minimo_observaciones=10):
+        self.factor = factor
+        self.alfa = alfa
+        self.minimo_observaciones = minimo_observaciones
+
+    def nuevo_estado(self):
+        return PromedioExponencial(self.alfa)
+
+    def observar(self, estado, tipo, monto, saldo, instante):
+        umbral = estado.media + self.factor * estado.desviacion
+        sospechoso = estado.observaciones >= self.minimo_observaciones and monto > umbral
+        estado.agregar(monto)
+        if sospechoso:
+            return f"monto {monto:.2f} sobre el umbral {umbral:.2f}"
+        return None
+
+
+class VaciadoRapido(Detector):
+    """
+    La cuenta queda con menos de `saldo_minimo` después de que, dentro de
+    `segundos`, se retiró al menos `fraccion` de lo que tenía.
+    """
+
+    nombre = 'vaciado_rapido'
+
+    def __init__(self, fraccion=0.9, segundos=3600, saldo_minimo=1.0):
+        self.fraccion = fraccion
+        self.segundos = segundos
+        self.saldo_minimo = saldo_minimo
+
+    def nuevo_estado(self):
+        return VentanaDeslizante(self.segundos)
+
+    def observar(self, estado, tipo, monto, saldo, instante):
+        if tipo != 0:
+            return None
+        estado.agregar(instante, monto)
+        if saldo >= self.saldo_minimo:
+            return None
+        _, retirado = estado.totales(instante)
+        if retirado >= self.fraccion * (saldo + retirado):
+            return f"se retiró {retirado:.2f} en {self.segundos} s; saldo {saldo:.2f}"
+        return None
+
+
+def detectores_por_defecto():
+    return [RafagaRetiros(), MontoInusual(), VaciadoRapido()]
+
+
+# ==============================
+# Pipeline
+# ==============================
+class DetectorAnomalias:
+    """
+    Aplica una serie de detectores a cada movimiento, con estado por cuenta.
+
+    El estado de cada cuenta (una estructura por detector) vive en un
+    OrderedDict usado como LRU: con más de `maximo_cuentas` cuentas se
+    descarta la menos reciente, así que la memoria está acotada. Las
+    alertas se entregan a `al_alertar(alerta)` y se guardan en `alertas`
+    (las últimas MAXIMO_ALERTAS). Cada alerta es una tupla
+    (id_cuenta, id_registro, regla, detalle).
+    """
+
+    def __init__(self, detectores=None, maximo_cuentas=MAXIMO_CUENTAS, al_alertar=None, reloj=time.monotonic):
+        self.detectores = detectores if detectores is not None else detectores_por_defecto()
+        self.maximo_cuentas = maximo_cuentas
+        self.al_alertar = al_alertar
+        self.reloj = reloj
+        self.alertas = deque(maxlen=MAXIMO_ALERTAS)
+        self._estados = OrderedDict()
+        self._candado = threading.Lock()
+
+    def _estado(self, id_cuenta):
+        """Retorna [último ID observado, estado de cada detector] de la cuenta."""
+        estado = self._estados.get(id_cuenta)
+        if estado is None:
+            estado = self._estados[id_cuenta] = [0, [detector.nuevo_estado() for detector in self.detectores]]
+            if len(self._estados) > self.maximo_cuentas:
+                self._estados.popitem(last=False)
+        else:
+            self._estados.move_to_end(id_cuenta)
+        return estado
+
+    def es_nuevo(self, id_cuenta, id_registro):
+        """
+        Indica si el movimiento aún no fue observado. Los IDs de movimiento
+        de una cuenta son crecientes, así que un ID que no supera al último
+        observado es un reintento (clave de idempotencia repetida).
+        """
+        with self._candado:
+            estado = self._estados.get(id_cuenta)
+            return estado is None or id_registro > estado[0]
+
+    def observar(self, id_cuenta, id_registro, tipo, monto, saldo, instante=None):
+        """Evalúa un movimiento ya aplicado; retorna las alertas generadas."""
+        instante = self.reloj() if instante is None else instante
+        generadas = []
+        with self._candado:
+            estado = self._estado(id_cuenta)
+            estado[0] = max(estado[0], id_registro)
+            for detector, estado_detector in zip(self.detectores, estado[1]):
+                detalle = detector.observar(estado_detector, tipo, monto, saldo, instante)
+                if detalle is not None:
+                    generadas.append((id_cuenta, id_registro, detector.nombre, detalle))
+            self.alertas.extend(generadas)
+        if self.al_alertar is not None:
+            for alerta in generadas:
+                self.al_alertar(alerta)
+        return generadas
+
+
+class AlmacenVigilado:
+    """
+    Envuelve un almacén (AlmacenSQLite, AlmacenMemoria, ...) y pasa por el
+    detector cada movimiento que este aplica.
+
+    Se usa como cualquier almacén, por ejemplo
+    `CuentaCorriente(..., almacen=AlmacenVigilado(AlmacenSQLite(), detector))`,
+    y así cubre depositar, retirar, transferencias y aplicar_movimientos.
+    La detección ocurre después de confirmar la transacción y no consulta
+    la base: el saldo tras cada movimiento se deduce del saldo final.
+    """
+
+    def __init__(self, almacen, detector=None):
+        self.almacen = almacen
+        self.detector = detector or DetectorAnomalias()
+
+    @property
+    def clave(self):
+        return self.almacen.clave
+
+    def nuevo_id_movimiento(self):
+        return self.almacen.nuevo_id_movimiento()
+
+    def registrar_cuenta(self, numero_cuenta, rut_titular, nombre_titular, saldo):
+        return self.almacen.registrar_cuenta(numero_cuenta, rut_titular, nombre_titular, saldo)
+
+    def registrar_cuentas(self, cuentas):
+        return self.almacen.registrar_cuentas(cuentas)
+
+    def leer_cuenta(self, id_cuenta):
+        return self.almacen.leer_cuenta(id_cuenta)
+
+    def aplicar_movimientos(self, movimientos):
+        ids, saldos = self.almacen.aplicar_movimientos(movimientos)
+        # Los reintentos no movieron saldo: se descartan antes de deducir saldos
+        nuevos = []
+        vistos = set()
+        for movimiento, id_registro in zip(movimientos, ids):
+            if id_registro not in vistos and self.detector.es_nuevo(movimiento[0], id_registro):
+                vistos.add(id_registro)
+                nuevos.append((movimiento, id_registro))
+        # Se recorre el lote hacia atrás para conocer el saldo tras cada movimiento
+        saldo_tras = dict(saldos)
+        observados = []
+        for movimiento, id_registro in reversed(nuevos):
+            id_cuenta, tipo, monto = movimiento[:3]
+            observados.append((id_cuenta, id_registro, tipo, monto, saldo_tras[id_cuenta]))
+            saldo_tras[id_cuenta] += -monto if tipo == 1 else monto
+        instante = self.detector.reloj()
+        for id_cuenta, id_registro, tipo, monto, saldo in reversed(observados):
+            self.detector.observar(id_cuenta, id_registro, tipo, monto, saldo, instante)
+        return ids, saldos
+
+    def vaciar(self):
+        self.almacen.vaciar()
+
+
+def medir(operaciones=20000, almacen=None):
+    """
+    Compara depósitos y retiros con y sin detección sobre el mismo almacén
+    (por defecto AlmacenMemoria, para aislar el costo del detector).
+    Retorna {'sin_deteccion': µs por operación, 'con_deteccion': µs por operación}.
+    """
+    from almacen_memoria import AlmacenMemoria
+    from cuenta_corriente import CuentaCorriente
+
+    resultados = {}
+    for nombre, envolver in (('sin_deteccion', False), ('con_deteccion', True)):
+        base = almacen() if almacen else AlmacenMemoria()
+        destino = AlmacenVigilado(base) if envolver else base
+        cuentas = [CuentaCorriente(i, '1-9', 'Prueba', 1e9, almacen=destino) for i in range(100)]
+        inicio = time.perf_counter()
+        for i in range(operaciones):
+            cuenta = cuentas[i % len(cuentas)]
+            if i % 3:
+                cuenta.depositar(10 + i % 7, i)
+            else:
+                cuenta.retirar(5, i)
+        resultados[nombre] = (time.perf_counter() - inicio) / operaciones * 1e6
+    return resultados
+
+
+if __name__ == "__main__":
+    for nombre, microsegundos in medir().items():
+        print(f"{nombre}: {microsegundos:.1f} µs por operación")
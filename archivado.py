@@ -0,0 +1,161 @@
+import datetime
+import glob
+import os
+import re
+
+from cuenta_corriente import DB_NAME, crear_conexion, crear_tablas
+
+TAMANO_LOTE = 5000
+
+
+def ruta_archivo(anio, nombre_bd=None):
+    """Retorna el archivo de base de datos que guarda los movimientos de un año."""
+    raiz, extension = os.path.splitext(nombre_bd or DB_NAME)
+    return f"{raiz}_archivo_{anio}{extension}"
+
+
+def _columnas(cursor, esquema='main'):
+    """Retorna [(nombre, tipo), ...] de la tabla movimientos en un esquema."""
+    cursor.execute(f"PRAGMA {esquema}.table_info(movimientos)")
+    return [(fila[1], fila[2]) for fila in cursor.fetchall()]
+
+
+def _preparar_archivo(cursor, esquema):
+    """
+    Crea (o completa) la tabla movimientos en una base de archivo adjunta.
+
+    Copia las columnas de la tabla viva; si la tabla viva ganó columnas
+    después de creado el archivo, se agregan también aquí.
+    """
+    columnas = _columnas(cursor)
+    definicion = ', '.join(
+        f"{nombre} INTEGER PRIMARY KEY" if nombre == 'ID' else f"{nombre} {tipo}"
+        for nombre, tipo in columnas
+    )
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {esquema}.movimientos ({definicion})")
+    existentes = {nombre for nombre, _ in _columnas(cursor, esquema)}
+    for nombre, tipo in columnas:
+        if nombre not in existentes:
+            cursor.execute(f"ALTER TABLE {esquema}.movimientos ADD COLUMN {nombre} {tipo}")
+    # Historial por cuenta y fecha (ver historial_saldos.saldo_al)
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {esquema}.ix_movimientos_cuenta_fecha ON movimientos (idCtaCte, fecha)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {esquema}.ix_movimientos_fecha ON movimientos (fecha)")
+
+
+def archivar_movimientos(fecha_corte, nombre_bd=None, tamano_lote=TAMANO_LOTE):
+    """
+    Mueve los movimientos con fecha anterior a `fecha_corte` a bases por año.
+
+    Cada año va a su propio archivo (ver `ruta_archivo`), adjuntado con
+    ATTACH. El traslado se hace en lotes de `tamano_lote` filas, cada uno en
+    su propia transacción, para no bloquear a los escritores por mucho rato.
+    Un lote se copia con INSERT OR IGNORE y se confirma en el archivo antes
+    de borrarse de la base viva (en otra transacción, y solo los IDs que ya
+    están en el archivo), así que repetir el proceso tras una caída no
+    duplica ni pierde movimientos. Las claves de idempotencia de los
+    movimientos archivados quedan en `clavesArchivadas`, para que un
+    reintento no los vuelva a aplicar. Los movimientos sin fecha nunca se
+    archivan.
+
+    Retorna un diccionario {año: cantidad de movimientos archivados}.
+    """
+    if isinstance(fecha_corte, (datetime.date, datetime.datetime)):
+        fecha_corte = fecha_corte.strftime("%Y-%m-%d")
+    # Bases anteriores a clavesArchivadas
+    crear_tablas(nombre_bd)
+    con = crear_conexion(nombre_bd)
+    try:
+        cursor = con.cursor()
+        cursor.execute('''
+            SELECT DISTINCT substr(fecha, 1, 4) FROM movimientos
+            WHERE fecha IS NOT NULL AND fecha < ?
+        ''', (fecha_corte,))
+        anios = sorted(fila[0] for fila in cursor.fetchall())
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS lote_archivo (ID INTEGER PRIMARY KEY)")
+
+        archivados = {}
+        for anio in anios:
+            esquema = f"archivo_{anio}"
+            cursor.execute("ATTACH DATABASE ? AS " + esquema, (ruta_archivo(anio, nombre_bd),))
+            try:
+                with con:
+                    _preparar_archivo(cursor, esquema)
+                columnas = ', '.join(nombre for nombre, _ in _columnas(cursor))
+                desde = f"{anio}-01-01"
+                hasta = min(fecha_corte, f"{int(anio) + 1}-01-01")
+                archivados[anio] = 0
+                while True:
+                    # Primero se confirma la copia en el archivo. En modo WAL
+                    # una transacción sobre varias bases no es atómica, así
+                    # que copiar y borrar van en transacciones separadas.
+                    with con:
+                        cursor.execute("DELETE FROM temp.lote_archivo")
+                        cursor.execute('''
+                            INSERT INTO temp.lote_archivo
+                            SELECT ID FROM main.movimientos
+                            WHERE fecha >= ? AND fecha < ?
+                            LIMIT ?
+                        ''', (desde, hasta, tamano_lote))
+                        if cursor.rowcount == 0:
+                            break
+                        cursor.execute(f'''
+                            INSERT OR IGNORE INTO {esquema}.movimientos ({columnas})
+                            SELECT {columnas} FROM main.movimientos
+                            WHERE ID IN (SELECT ID FROM temp.lote_archivo)
+                        ''')
+                    # Luego se borran de la base viva solo los que ya están en
+                    # el archivo, dejando su clave de idempotencia
+                    with con:
+                        # CROSS JOIN fija el orden: se recorre el lote (sin
+                        # estadísticas) y se busca cada ID en el archivo
+                        copiados = f'''
+                            SELECT a.ID FROM temp.lote_archivo l CROSS JOIN {esquema}.movimientos a ON a.ID = l.ID
+                        '''
+                        cursor.execute(f'''
+                            INSERT OR IGNORE INTO main.clavesArchivadas (claveIdempotencia, idMovimiento)
+                            SELECT claveIdempotencia, ID FROM main.movimientos
+                            WHERE ID IN ({copiados}) AND claveIdempotencia IS NOT NULL
+                        ''')
+                        cursor.execute(f"DELETE FROM main.movimientos WHERE ID IN ({copiados})")
+                        if cursor.rowcount == 0:
+                            raise RuntimeError(f"No se pudo confirmar la copia del lote en {esquema}.")
+                        archivados[anio] += cursor.rowcount
+            finally:
+                cursor.execute("DETACH DATABASE " + esquema)
+        return archivados
+    finally:
+        con.close()
+
+
+def anios_archivados(nombre_bd=None):
+    """Retorna los años que tienen un archivo de movimientos en disco."""
+    raiz, extension = os.path.splitext(nombre_bd or DB_NAME)
+    patron = re.compile(re.escape(raiz) + r'_archivo_(\d{4})' + re.escape(extension) + '$')
+    anios = []
+    for ruta in glob.glob(f"{glob.escape(raiz)}_archivo_*{extension}"):
+        coincidencia = patron.match(ruta)
+        if coincidencia:
+            anios.append(coincidencia.group(1))
+    return sorted(anios)
+
+
+def conexion_historica(nombre_bd=None):
+    """
+    Abre una conexión con la vista temporal `movimientos_historicos`.
+
+    La vista une la tabla viva con todos los archivos anuales adjuntos, de
+    modo que las consultas de historial funcionan igual que antes del
+    archivado. SQLite limita la cantidad de bases adjuntas (10 por defecto).
+    """
+    con = crear_conexion(nombre_bd)
+    cursor = con.cursor()
+    columnas = ', '.join(nombre for nombre, _ in _columnas(cursor))
+    partes = [f"SELECT {columnas} FROM main.movimientos"]
+    for anio in anios_archivados(nombre_bd):
+        esquema = f"archivo_{anio}"
+        cursor.execute("ATTACH DATABASE ? AS " + esquema, (ruta_archivo(anio, nombre_bd),))
+        with con:
+            _preparar_archivo(cursor, esquema)
+        partes.append(f"SELECT {columnas} FROM {esquema}.movimientos")
+    cursor.execute("CREATE TEMP VIEW movimientos_historicos AS " + " UNION ALL ".join(partes))
+    return con
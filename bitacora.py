@@ -0,0 +1,156 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+# Todas las bitácoras cuelgan de esta, así se configuran juntas
+RAIZ = 'cuentas'
+# Con muestreo, 1 de cada MUESTREO registros de un mismo mensaje bajo WARNING
+MUESTREO = 100
+
+_listener = None
+
+
+def obtener_bitacora(nombre):
+    """
+    Retorna la bitácora (Bitacora) de un módulo.
+
+    El mensaje se formatea recién si el registro se emite, así que en las
+    rutas frecuentes se usa con argumentos y no con f-strings:
+    `bitacora.info("abono cuenta=%s monto=%.2f", numero, monto)`. Los datos
+    estructurados van en `extra={'datos': {...}}`.
+    """
+    return Bitacora(logging.getLogger(f'{RAIZ}.{nombre}'))
+
+
+class Muestreo:
+    """
+    Deja pasar 1 de cada `cada` registros de un mismo mensaje (la plantilla,
+    no el texto ya formateado) con nivel menor que `nivel_completo`. El
+    registro que pasa informa en `omitidos` cuántos se descartaron desde el
+    anterior.
+    """
+
+    def __init__(self, cada=MUESTREO, nivel_completo=logging.WARNING):
+        self.cada = cada
+        self.nivel_completo = nivel_completo
+        self._conteos = {}
+        self._candado = threading.Lock()
+
+    def omitidos(self, nombre, nivel, mensaje):
+        """Retorna None si el registro se descarta, o cuántos se descartaron antes de él."""
+        if nivel >= self.nivel_completo:
+            return 0
+        clave = (nombre, mensaje)
+        with self._candado:
+            visto = self._conteos.get(clave, 0)
+            self._conteos[clave] = visto + 1
+        if visto % self.cada:
+            return None
+        return self.cada - 1 if visto else 0
+
+
+_muestreo = None
+
+
+class Bitacora(logging.LoggerAdapter):
+    """
+    logging.Logger con muestreo (ver configurar): el registro descartado no
+    llega a crearse, así que cuesta solo un contador.
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, None)
+
+    def process(self, mensaje, kwargs):
+        return mensaje, kwargs
+
+    def log(self, nivel, mensaje, *args, **kwargs):
+        if not self.isEnabledFor(nivel):
+            return
+        muestreo = _muestreo
+        if muestreo is not None:
+            omitidos = muestreo.omitidos(self.logger.name, nivel, mensaje)
+            if omitidos is None:
+                return
+            if omitidos:
+                kwargs['extra'] = {**kwargs.get('extra', {}), 'omitidos': omitidos}
+        # El origen del registro es quien llamó a la bitácora, no este método
+        kwargs.setdefault('stacklevel', 2)
+        self.logger.log(nivel, mensaje, *args, **kwargs)
+
+
+class FormatoJSON(logging.Formatter):
+    """Un objeto JSON por línea: fecha, nivel, bitácora, mensaje y los `datos` del registro."""
+
+    def format(self, registro):
+        linea = {
+            'fecha': self.formatTime(registro),
+            'nivel': registro.levelname,
+            'bitacora': registro.name,
+            'mensaje': registro.getMessage(),
+        }
+        linea.update(getattr(registro, 'datos', None) or {})
+        if getattr(registro, 'omitidos', 0):
+            linea['omitidos'] = registro.omitidos
+        if registro.exc_info:
+            linea['error'] = self.formatException(registro.exc_info)
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+class _ManejadorCola(logging.handlers.QueueHandler):
+    """Encola el registro sin formatearlo: el formato ocurre en el hilo de la bitácora."""
+
+    def prepare(self, registro):
+        return registro
+
+
+def configurar(nivel=logging.INFO, destino=None, muestreo=MUESTREO, formato='json'):
+    """
+    Configura las bitácoras de RAIZ: los registros se encolan y un hilo
+    aparte los formatea y escribe en `destino` (archivo, o sys.stderr por
+    defecto), así la operación que registra no espera a la terminal ni al
+    disco. Con `muestreo` se conserva 1 de cada tantos registros de un
+    mismo mensaje (None o 1 registra todo); `formato` es 'json' o
+    'texto'. Puede llamarse de nuevo para cambiar la configuración.
+    Retorna el QueueListener (se detiene solo al salir).
+
+    El muestreo aplica a las bitácoras de obtener_bitacora; los errores y
+    advertencias se registran siempre.
+    """
+    global _listener, _muestreo
+    detener()
+    manejador = logging.StreamHandler(sys.stderr) if destino is None else logging.FileHandler(destino, encoding='utf-8')
+    if formato == 'json':
+        manejador.setFormatter(FormatoJSON())
+    else:
+        manejador.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    _muestreo = Muestreo(muestreo) if muestreo and muestreo > 1 else None
+
+    cola = queue.SimpleQueue()
+    encolador = _ManejadorCola(cola)
+    raiz = logging.getLogger(RAIZ)
+    raiz.handlers[:] = [encolador]
+    raiz.setLevel(nivel)
+    raiz.propagate = False
+
+    _listener = logging.handlers.QueueListener(cola, manejador)
+    _listener.start()
+    return _listener
+
+
+def detener():
+    """Escribe los registros pendientes y detiene el hilo de la bitácora."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for manejador in _listener.handlers:
+            manejador.close()
+        _listener = None
+
+
+atexit.register(detener)
@@ -0,0 +1,322 @@
+import sqlite3
+import string
+
+from cuenta_corriente import crear_conexion, crear_tablas
+
+RESULTADOS_POR_PAGINA = 20
+CANDIDATOS_PARECIDOS = 200
+SIMILITUD_MINIMA = 0.3
+
+# Normalización de nombres y RUT. La misma regla existe en SQL (para los
+# triggers e índices) y en Python (para las consultas): mayúsculas ASCII a
+# minúsculas y vocales con tilde, ü y ñ a su letra base.
+_CON_TILDE = 'ÁÉÍÓÚÜÑáéíóúüñ'
+_SIN_TILDE = 'aeiouunaeiouun'
+_NORMALIZAR = str.maketrans(string.ascii_uppercase + _CON_TILDE, string.ascii_lowercase + _SIN_TILDE)
+
+
+def normalizar_nombre(texto):
+    """'María Núñez' -> 'maria nunez'."""
+    return ' '.join(texto.translate(_NORMALIZAR).split())
+
+
+def normalizar_rut(rut):
+    """'12.345.678-k' -> '12345678K'."""
+    return rut.replace('.', '').replace('-', '').replace(' ', '').upper()
+
+
+def _sql_normalizar_nombre(columna):
+    expresion = columna
+    for con_tilde, sin_tilde in zip(_CON_TILDE, _SIN_TILDE):
+        expresion = f"replace({expresion}, '{con_tilde}', '{sin_tilde}')"
+    return f"lower({expresion})"
+
+
+def _sql_normalizar_rut(columna):
+    return f"upper(replace(replace(replace({columna}, '.', ''), '-', ''), ' ', ''))"
+
+
+# ==============================
+# Descripciones de movimientos
+# ==============================
+def crear_indice_descripciones(nombre_bd=None):
+    """
+    Crea el índice de texto completo (FTS5) sobre `movimientos.descripcion`.
+
+    La tabla virtual `movimientos_fts` no duplica el texto (usa la tabla
+    movimientos como contenido) y se mantiene sincronizada con triggers, así
+    que cualquier inserción, borrado (por ejemplo, al archivar) o cambio de
+    descripción actualiza el índice en la misma transacción. La primera vez
+    se indexan los movimientos existentes. Ignora mayúsculas y tildes
+    ("deposito" encuentra "Depósito").
+
+    Lanza RuntimeError si la versión de SQLite no incluye FTS5.
+    """
+    crear_tablas(nombre_bd)
+    with crear_conexion(nombre_bd) as con:
+        cursor = con.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'movimientos_fts'")
+        existia = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS movimientos_fts USING fts5(
+                    descripcion,
+                    content = 'movimientos', content_rowid = 'ID',
+                    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"SQLite no tiene soporte para FTS5: {e}")
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS movimientos_fts_insercion AFTER INSERT ON movimientos BEGIN
+                INSERT INTO movimientos_fts (rowid, descripcion) VALUES (new.ID, new.descripcion);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS movimientos_fts_borrado AFTER DELETE ON movimientos BEGIN
+                INSERT INTO movimientos_fts (movimientos_fts, rowid, descripcion)
+                VALUES ('delete', old.ID, old.descripcion);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS movimientos_fts_cambio AFTER UPDATE OF descripcion ON movimientos BEGIN
+                INSERT INTO movimientos_fts (movimientos_fts, rowid, descripcion)
+                VALUES ('delete', old.ID, old.descripcion);
+                INSERT INTO movimientos_fts (rowid, descripcion) VALUES (new.ID, new.descripcion);
+            END
+        ''')
+        if not existia:
+            cursor.execute("INSERT INTO movimientos_fts (movimientos_fts) VALUES ('rebuild')")
+
+
+def _consulta_fts(texto):
+    """
+    Convierte el texto ingresado en una consulta FTS5 segura: cada palabra
+    se busca como prefijo y deben aparecer todas ("pago serv" encuentra
+    "Pago servicios").
+    """
+    palabras = texto.split()
+    if not palabras:
+        raise ValueError("Debe indicar un texto a buscar.")
+    return ' '.join('"{}"*'.format(palabra.replace('"', '""')) for palabra in palabras)
+
+
+def buscar_movimientos(texto, cuenta_id=None, desde=None, hasta=None,
+                       pagina=1, por_pagina=RESULTADOS_POR_PAGINA, nombre_bd=None):
+    """
+    Busca movimientos por su descripción usando el índice FTS5.
+
+    Se puede filtrar por cuenta y por rango de fechas ('YYYY-MM-DD' o con
+    hora). Los resultados vienen ordenados por relevancia (bm25) y paginados
+    desde la página 1: [(ID, idCtaCte, fecha, tipoMovimiento, Monto,
+    descripcion), ...]. Requiere haber ejecutado crear_indice_descripciones.
+    """
+    if pagina < 1 or por_pagina < 1:
+        raise ValueError("La página y la cantidad por página deben ser positivas.")
+    condiciones = ["movimientos_fts MATCH ?"]
+    parametros = [_consulta_fts(texto)]
+    if cuenta_id is not None:
+        condiciones.append("m.idCtaCte = ?")
+        parametros.append(cuenta_id)
+    if desde is not None:
+        condiciones.append("m.fecha >= ?")
+        parametros.append(str(desde))
+    if hasta is not None:
+        # Una fecha sin hora incluye todo ese día
+        hasta = str(hasta)
+        condiciones.append("m.fecha <= ?")
+        parametros.append(hasta + " 23:59:59" if len(hasta) == 10 else hasta)
+    parametros += [por_pagina, (pagina - 1) * por_pagina]
+
+    with crear_conexion(nombre_bd) as con:
+        return con.execute(f'''
+            SELECT m.ID, m.idCtaCte, m.fecha, m.tipoMovimiento, m.Monto, m.descripcion
+            FROM movimientos_fts JOIN movimientos m ON m.ID = movimientos_fts.rowid
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY movimientos_fts.rank
+            LIMIT ? OFFSET ?
+        ''', parametros).fetchall()
+
+
+# ==============================
+# Titulares: nombre y RUT
+# ==============================
+def crear_indice_titulares(nombre_bd=None):
+    """
+    Crea los índices de búsqueda de titulares sobre la tabla ctacte.
+
+    - `titulares_fts` (FTS5, unicode61): búsqueda por prefijo de palabras del
+      nombre, sin distinguir mayúsculas ni tildes.
+    - `titulares_trigramas` (FTS5, trigram): trigramas del nombre
+      normalizado, para encontrar nombres mal escritos.
+    - `ix_ctacte_rut_normalizado`: índice por expresión sobre el RUT sin
+      puntos ni guion, para buscar RUT completos o parciales.
+
+    Los dos primeros se mantienen con triggers al crear, borrar o renombrar
+    cuentas (los cambios de saldo no los tocan); el índice de RUT lo
+    mantiene SQLite. La primera vez se indexan las cuentas existentes.
+    """
+    crear_tablas(nombre_bd)
+    nombre_normalizado_nuevo = _sql_normalizar_nombre('new.nomTitularCta')
+    nombre_normalizado_viejo = _sql_normalizar_nombre('old.nomTitularCta')
+    with crear_conexion(nombre_bd) as con:
+        cursor = con.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'titulares_fts'")
+        existia = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS titulares_fts USING fts5(
+                    nomTitularCta,
+                    content = 'ctacte', content_rowid = 'ID',
+                    tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+                )
+            ''')
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS titulares_trigramas USING fts5(
+                    nombre, content = '', tokenize = 'trigram'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"SQLite no tiene soporte para FTS5 con trigramas: {e}")
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS titulares_insercion AFTER INSERT ON ctacte BEGIN
+                INSERT INTO titulares_fts (rowid, nomTitularCta) VALUES (new.ID, new.nomTitularCta);
+                INSERT INTO titulares_trigramas (rowid, nombre) VALUES (new.ID, {nombre_normalizado_nuevo});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS titulares_borrado AFTER DELETE ON ctacte BEGIN
+                INSERT INTO titulares_fts (titulares_fts, rowid, nomTitularCta)
+                VALUES ('delete', old.ID, old.nomTitularCta);
+                INSERT INTO titulares_trigramas (titulares_trigramas, rowid, nombre)
+                VALUES ('delete', old.ID, {nombre_normalizado_viejo});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS titulares_cambio AFTER UPDATE OF nomTitularCta ON ctacte BEGIN
+                INSERT INTO titulares_fts (titulares_fts, rowid, nomTitularCta)
+                VALUES ('delete', old.ID, old.nomTitularCta);
+                INSERT INTO titulares_trigramas (titulares_trigramas, rowid, nombre)
+                VALUES ('delete', old.ID, {nombre_normalizado_viejo});
+                INSERT INTO titulares_fts (rowid, nomTitularCta) VALUES (new.ID, new.nomTitularCta);
+                INSERT INTO titulares_trigramas (rowid, nombre) VALUES (new.ID, {nombre_normalizado_nuevo});
+            END
+        ''')
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_ctacte_rut_normalizado ON ctacte ({_sql_normalizar_rut('rutTitularCta')})"
+        )
+        if not existia:
+            cursor.execute("INSERT INTO titulares_fts (titulares_fts) VALUES ('rebuild')")
+            cursor.execute(f'''
+                INSERT INTO titulares_trigramas (rowid, nombre)
+                SELECT ID, {_sql_normalizar_nombre('nomTitularCta')} FROM ctacte
+            ''')
+
+
+def _trigramas(palabra):
+    """Trigramas de una palabra, con relleno para que las cortas también tengan."""
+    palabra = f"  {palabra} "
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+def _similitud(palabras, nombre):
+    """
+    Promedio, para cada palabra buscada, de su mejor similitud (Jaccard de
+    trigramas) con alguna palabra del nombre.
+    """
+    del_nombre = [_trigramas(palabra) for palabra in normalizar_nombre(nombre).split()]
+    total = 0.0
+    for palabra in palabras:
+        buscada = _trigramas(palabra)
+        total += max((len(buscada & otra) / len(buscada | otra) for otra in del_nombre), default=0.0)
+    return total / len(palabras)
+
+
+def _consulta_trigramas(palabras, todas):
+    """
+    Arma la consulta sobre titulares_trigramas: una palabra coincide si el
+    nombre contiene dos trigramas consecutivos suyos (un error de tipeo
+    rompe solo algunos pares). Con `todas` deben coincidir todas las
+    palabras; si no, basta una.
+    """
+    grupos = []
+    for palabra in palabras:
+        trigramas = [palabra[i:i + 3] for i in range(len(palabra) - 2)]
+        if len(trigramas) == 1:
+            grupos.append('"{}"'.format(trigramas[0]))
+        elif trigramas:
+            pares = ' OR '.join('("{}" AND "{}")'.format(a, b) for a, b in zip(trigramas, trigramas[1:]))
+            grupos.append(f"({pares})")
+    return f" {'AND' if todas else 'OR'} ".join(grupos)
+
+
+def buscar_titulares(texto, cantidad=10, nombre_bd=None):
+    """
+    Retorna hasta `cantidad` cuentas cuyo titular coincide con `texto`:
+    [(ID, NumeroCtaCte, rutTitularCta, nomTitularCta), ...].
+
+    Primero van las coincidencias por prefijo de palabras ("mar lop"
+    encuentra "María López"). Si no alcanzan, se completa con nombres
+    parecidos ("Peres" encuentra "Pérez"): los candidatos se obtienen del
+    índice de trigramas (primero los que se parecen en todas las palabras)
+    y se ordenan por similitud, descartando los que se parecen menos que
+    SIMILITUD_MINIMA. Requiere crear_indice_titulares.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad debe ser positiva.")
+    with crear_conexion(nombre_bd) as con:
+        # Todas las coincidencias por prefijo valen lo mismo: sin ordenar por
+        # relevancia, SQLite se detiene en las primeras `cantidad`.
+        resultados = con.execute('''
+            SELECT c.ID, c.NumeroCtaCte, c.rutTitularCta, c.nomTitularCta
+            FROM titulares_fts JOIN ctacte c ON c.ID = titulares_fts.rowid
+            WHERE titulares_fts MATCH ?
+            LIMIT ?
+        ''', (_consulta_fts(texto), cantidad)).fetchall()
+
+        palabras = normalizar_nombre(texto).replace('"', '').split()
+        vistos = {fila[0] for fila in resultados}
+        parecidos = []
+        for todas in (True, False):
+            consulta = _consulta_trigramas(palabras, todas)
+            if len(resultados) + len(parecidos) >= cantidad or not consulta:
+                break
+            candidatos = con.execute('''
+                SELECT c.ID, c.NumeroCtaCte, c.rutTitularCta, c.nomTitularCta
+                FROM titulares_trigramas JOIN ctacte c ON c.ID = titulares_trigramas.rowid
+                WHERE titulares_trigramas MATCH ?
+                LIMIT ?
+            ''', (consulta, CANDIDATOS_PARECIDOS)).fetchall()
+            for fila in candidatos:
+                if fila[0] not in vistos:
+                    vistos.add(fila[0])
+                    similitud = _similitud(palabras, fila[3])
+                    if similitud >= SIMILITUD_MINIMA:
+                        parecidos.append((similitud, fila))
+
+    parecidos.sort(key=lambda par: par[0], reverse=True)
+    return resultados + [fila for _, fila in parecidos[:cantidad - len(resultados)]]
+
+
+def buscar_rut(rut, cantidad=10, nombre_bd=None):
+    """
+    Busca cuentas por RUT completo o parcial, con o sin puntos y guion
+    ("12.345" encuentra "12345678-9"). Usa el índice por expresión de
+    crear_indice_titulares. Retorna [(ID, NumeroCtaCte, rutTitularCta,
+    nomTitularCta), ...].
+    """
+    prefijo = normalizar_rut(rut)
+    if not prefijo:
+        raise ValueError("Debe indicar un RUT a buscar.")
+    # Rango [prefijo, siguiente prefijo): aprovecha el índice, a diferencia de LIKE
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    expresion = _sql_normalizar_rut('rutTitularCta')
+    with crear_conexion(nombre_bd) as con:
+        return con.execute(f'''
+            SELECT ID, NumeroCtaCte, rutTitularCta, nomTitularCta FROM ctacte
+            WHERE {expresion} >= ? AND {expresion} < ?
+            ORDER BY {expresion}
+            LIMIT ?
+        ''', (prefijo, siguiente, cantidad)).fetchall()
@@ -0,0 +1,1003 @@
+import sqlite3
+import csv
+import datetime
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from bitacora import obtener_bitacora
+
+bitacora = obtener_bitacora('cuenta_corriente')
+
+DB_NAME = "MovimientosYCtaCte.db"
+
+# Contención entre procesos: cada conexión espera hasta TIEMPO_ESPERA_BLOQUEO
+# segundos por un bloqueo (busy_timeout); si aún así falla, la operación
+# completa se reintenta hasta REINTENTOS_BLOQUEO veces con espera exponencial
+# aleatoria entre ESPERA_INICIAL y ESPERA_MAXIMA.
+TIEMPO_ESPERA_BLOQUEO = 1.0
+REINTENTOS_BLOQUEO = 8
+ESPERA_INICIAL = 0.01
+ESPERA_MAXIMA = 1.0
+# Un BEGIN IMMEDIATE que tarda más que esto cuenta como espera por bloqueo
+UMBRAL_ESPERA = 0.001
+
+
+def crear_conexion(nombre_bd=None):
+    """
+    Crea y retorna una conexión a la base de datos SQLite.
+
+    Acepta también URIs de SQLite (por ejemplo "file:replica.db?mode=ro").
+    """
+    nombre_bd = nombre_bd or DB_NAME
+    return sqlite3.connect(nombre_bd, timeout=TIEMPO_ESPERA_BLOQUEO, uri=nombre_bd.startswith('file:'))
+
+
+def crear_tablas(nombre_bd=None):
+    """
+    Crea las tablas ctacte y movimientos según la nueva especificación.
+    - ctacte: almacena información de la cuenta corriente.
+    - movimientos: almacena movimientos asociados a cada cuenta.
+    """
+    with crear_conexion(nombre_bd) as con:
+        cursor = con.cursor()
+
+        # Crear tabla ctacte
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ctacte (
+                ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                NumeroCtaCte REAL NOT NULL,
+                rutTitularCta TEXT NOT NULL CHECK(length(rutTitularCta) <= 12),
+                nomTitularCta TEXT NOT NULL CHECK(length(nomTitularCta) <= 105),
+                SaldoCta REAL NOT NULL DEFAULT 0.0
+            )
+        ''')
+
+        # Crear tabla movimientos
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS movimientos (
+                ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                idCtaCte INTEGER NOT NULL,
+                idMovimientos REAL NOT NULL,
+                tipoMovimiento INTEGER NOT NULL CHECK(tipoMovimiento IN (0,1)),
+                Monto REAL NOT NULL,
+                claveIdempotencia TEXT,
+                fecha TEXT,
+                saldoResultante REAL,
+                descripcion TEXT,
+                FOREIGN KEY (idCtaCte) REFERENCES ctacte(ID) ON DELETE CASCADE
+            )
+        ''')
+
+        # Bases creadas antes de existir la clave de idempotencia
+        _agregar_columna(cursor, 'movimientos', 'claveIdempotencia', 'TEXT')
+        # ... y antes de registrar la fecha (esos movimientos quedan sin fecha)
+        _agregar_columna(cursor, 'movimientos', 'fecha', 'TEXT')
+        # ... y antes de guardar el saldo tras cada movimiento (ver historial_saldos.completar_saldos_resultantes)
+        _agregar_columna(cursor, 'movimientos', 'saldoResultante', 'REAL')
+        _agregar_columna(cursor, 'movimientos', 'descripcion', 'TEXT')
+
+        # Una clave repetida identifica un reintento: el índice único lo impide
+        # y además permite encontrar el movimiento original sin recorrer la tabla.
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_movimientos_clave
+            ON movimientos (claveIdempotencia)
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_movimientos_fecha ON movimientos (fecha)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_movimientos_cuenta_fecha ON movimientos (idCtaCte, fecha)')
+        # Solo los movimientos sin saldo (ver historial_saldos.completar_saldos_resultantes)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS ix_movimientos_sin_saldo ON movimientos (idCtaCte)
+            WHERE saldoResultante IS NULL
+        ''')
+        # Búsquedas de cuentas por número y por titular (ver fragmentacion.py)
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_ctacte_numero ON ctacte (NumeroCtaCte)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_ctacte_rut ON ctacte (rutTitularCta)')
+
+        # Cortes de saldo: saldo de una cuenta tras un movimiento dado (ver historial_saldos.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cortesSaldo (
+                idCtaCte INTEGER NOT NULL,
+                ultimoIdMovimiento INTEGER NOT NULL,
+                fecha TEXT NOT NULL,
+                saldo REAL NOT NULL,
+                PRIMARY KEY (idCtaCte, ultimoIdMovimiento)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_cortes_cuenta_fecha ON cortesSaldo (idCtaCte, fecha, ultimoIdMovimiento)')
+
+        # Marca de agua de las exportaciones incrementales (una por destino)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS exportaciones (
+                destino TEXT PRIMARY KEY,
+                ultimoIdMovimiento INTEGER NOT NULL DEFAULT 0,
+                tamanoArchivo INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # Claves de idempotencia de los movimientos archivados (ver archivado.py):
+        # un reintento con una de ellas no debe volver a aplicarse
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clavesArchivadas (
+                claveIdempotencia TEXT PRIMARY KEY,
+                idMovimiento INTEGER NOT NULL
+            )
+        ''')
+
+        # Próximo valor libre de cada secuencia (ver AsignadorIds)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS secuencias (
+                nombre TEXT PRIMARY KEY,
+                siguiente INTEGER NOT NULL
+            )
+        ''')
+
+
+def activar_wal(nombre_bd=None):
+    """
+    Pasa la base a modo WAL (queda así para todas las conexiones futuras) y
+    retorna el modo resultante. En WAL las lecturas, como
+    CuentaCorriente.exportar_instantanea, no bloquean a los escritores.
+    """
+    con = crear_conexion(nombre_bd)
+    try:
+        return con.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+    finally:
+        con.close()
+
+
+def _agregar_columna(cursor, tabla, columna, definicion):
+    """Agrega una columna a una tabla existente si todavía no la tiene."""
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    if columna not in [fila[1] for fila in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+
+# ==============================
+# Contención: reintentos y métricas
+# ==============================
+class MetricasContencion:
+    """
+    Contadores por operación (en este proceso): operaciones completadas,
+    esperas por bloqueo y segundos esperados, reintentos y fallos
+    definitivos por bloqueo.
+    """
+
+    CAMPOS = ('operaciones', 'esperas', 'segundos_espera', 'reintentos', 'fallos')
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._datos = {}
+
+    def registrar(self, operacion, **incrementos):
+        with self._candado:
+            datos = self._datos.get(operacion)
+            if datos is None:
+                datos = self._datos[operacion] = dict.fromkeys(self.CAMPOS, 0)
+            for campo, valor in incrementos.items():
+                datos[campo] += valor
+
+    def resumen(self):
+        """Retorna una copia de los contadores: {operacion: {campo: valor}}."""
+        with self._candado:
+            return {operacion: dict(datos) for operacion, datos in self._datos.items()}
+
+    def reiniciar(self):
+        with self._candado:
+            self._datos.clear()
+
+
+metricas = MetricasContencion()
+
+
+def es_bloqueo(error):
+    """Indica si un error de SQLite se debe a que otra conexión tiene la base bloqueada."""
+    mensaje = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in mensaje or 'busy' in mensaje)
+
+
+def con_reintentos(operacion, funcion, *args, **kwargs):
+    """
+    Ejecuta `funcion(*args, **kwargs)` reintentándola si la base está bloqueada.
+
+    Entre intentos espera un tiempo aleatorio entre 0 y
+    ESPERA_INICIAL * 2^intento (con tope ESPERA_MAXIMA), para que los
+    procesos en conflicto no reintenten todos a la vez. La función debe
+    poder repetirse: una transacción fallida se revierte completa. Los
+    reintentos y fallos se cuentan en `metricas` bajo `operacion`.
+    """
+    for intento in range(REINTENTOS_BLOQUEO + 1):
+        try:
+            resultado = funcion(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not es_bloqueo(e):
+                raise
+            if intento == REINTENTOS_BLOQUEO:
+                metricas.registrar(operacion, fallos=1)
+                raise
+            metricas.registrar(operacion, reintentos=1)
+            time.sleep(random.uniform(0, min(ESPERA_MAXIMA, ESPERA_INICIAL * 2 ** intento)))
+        else:
+            metricas.registrar(operacion, operaciones=1)
+            return resultado
+
+
+def reintentar_bloqueos(operacion):
+    """Decorador que ejecuta la función con con_reintentos(operacion, ...)."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            return con_reintentos(operacion, funcion, *args, **kwargs)
+        return envoltura
+    return decorador
+
+
+# ==============================
+# Bloqueo de cuentas
+# ==============================
+_candados_cuentas = {}
+_candado_registro = threading.Lock()
+
+
+def _candado_de(cuenta):
+    """Retorna el candado en memoria asociado a una cuenta (uno por base y ID)."""
+    clave = (cuenta.almacen.clave, cuenta.id)
+    with _candado_registro:
+        candado = _candados_cuentas.get(clave)
+        if candado is None:
+            candado = _candados_cuentas[clave] = threading.RLock()
+        return candado
+
+
+@contextmanager
+def _bloquear_cuentas(*cuentas):
+    """
+    Toma los candados de varias cuentas siempre en orden ascendente de ID.
+
+    Al respetar un orden global, dos transferencias cruzadas (A->B y B->A)
+    nunca quedan esperándose mutuamente.
+    """
+    candados = []
+    vistos = set()
+    for cuenta in sorted(cuentas, key=lambda c: c.id):
+        if cuenta.id in vistos:
+            continue
+        vistos.add(cuenta.id)
+        candados.append(_candado_de(cuenta))
+    for candado in candados:
+        candado.acquire()
+    try:
+        yield
+    finally:
+        for candado in reversed(candados):
+            candado.release()
+
+
+@contextmanager
+def transaccion_escritura(nombre_bd=None, con=None, operacion='escritura'):
+    """
+    Abre una transacción de escritura (BEGIN IMMEDIATE).
+
+    El bloqueo de escritura se reserva al inicio, por lo que no hay que
+    escalar de lectura a escritura a mitad de la transacción (causa típica
+    de reintentos por "database is locked"). Hace commit al salir sin
+    errores y rollback en caso contrario. Si se entrega `con` se usa esa
+    conexión y queda abierta; si no, se abre una nueva y se cierra al final.
+    Si el BEGIN tuvo que esperar a otro escritor, la espera se cuenta en
+    `metricas` bajo `operacion`.
+    """
+    propia = con is None
+    if propia:
+        con = crear_conexion(nombre_bd)
+    try:
+        inicio = time.perf_counter()
+        con.execute("BEGIN IMMEDIATE")
+        espera = time.perf_counter() - inicio
+        if espera > UMBRAL_ESPERA:
+            metricas.registrar(operacion, esperas=1, segundos_espera=espera)
+        yield con
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    finally:
+        if propia:
+            con.close()
+
+
+def _leer_saldo(cursor, id_cuenta):
+    """Lee el saldo persistido de una cuenta dentro de la transacción actual."""
+    cursor.execute('SELECT SaldoCta FROM ctacte WHERE ID = ?', (id_cuenta,))
+    fila = cursor.fetchone()
+    if fila is None:
+        raise ValueError(f"La cuenta {id_cuenta} no existe.")
+    return fila[0]
+
+
+def _buscar_por_clave(cursor, clave_idempotencia):
+    """
+    Retorna el ID del movimiento registrado con esa clave, o None. Incluye
+    los movimientos ya archivados, cuya clave queda en clavesArchivadas.
+    """
+    if clave_idempotencia is None:
+        return None
+    cursor.execute(
+        'SELECT ID FROM movimientos WHERE claveIdempotencia = ?',
+        (clave_idempotencia,)
+    )
+    fila = cursor.fetchone()
+    if fila is None:
+        cursor.execute(
+            'SELECT idMovimiento FROM clavesArchivadas WHERE claveIdempotencia = ?',
+            (clave_idempotencia,)
+        )
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+# ==============================
+# Asignación de id_movimiento
+# ==============================
+TAMANO_BLOQUE_IDS = 1000
+# En modo ordenado por tiempo el bloque parte en milisegundos * IDS_POR_MILISEGUNDO
+# (cabe exacto en el REAL de idMovimientos hasta pasado el año 2200)
+IDS_POR_MILISEGUNDO = 1000
+
+
+class AsignadorIds:
+    """
+    Entrega valores únicos para id_movimiento sin consultar la base cada vez.
+
+    Reserva bloques de `tamano_bloque` valores en la tabla `secuencias` con
+    una transacción BEGIN IMMEDIATE, de modo que dos procesos nunca reciben
+    el mismo bloque, y los entrega desde memoria. La primera reserva parte
+    después del mayor idMovimientos ya registrado. Con
+    `ordenado_por_tiempo=True` cada bloque parte en el instante actual en
+    milisegundos (× IDS_POR_MILISEGUNDO): los IDs ordenan por el momento de
+    la reserva de su bloque (aproximadamente por tiempo entre procesos).
+    Los valores de un bloque que no se alcanzan a usar se pierden.
+    """
+
+    def __init__(self, nombre_bd=None, secuencia='movimientos', tamano_bloque=TAMANO_BLOQUE_IDS,
+                 ordenado_por_tiempo=False):
+        self.nombre_bd = nombre_bd
+        self.secuencia = secuencia
+        self.tamano_bloque = tamano_bloque
+        self.ordenado_por_tiempo = ordenado_por_tiempo
+        self._candado = threading.Lock()
+        self._siguiente = 0
+        self._limite = 0
+        self._pid = os.getpid()
+
+    @reintentar_bloqueos('reservar_ids')
+    def _reservar_bloque(self, cantidad=None):
+        """Reserva el próximo bloque (de `cantidad` valores) y retorna su primer valor."""
+        cantidad = cantidad or self.tamano_bloque
+        with transaccion_escritura(self.nombre_bd, operacion='reservar_ids') as con:
+            fila = con.execute('SELECT siguiente FROM secuencias WHERE nombre = ?', (self.secuencia,)).fetchone()
+            if fila is None:
+                fila = con.execute('SELECT CAST(COALESCE(MAX(idMovimientos), 0) AS INTEGER) + 1 FROM movimientos').fetchone()
+            inicio = fila[0]
+            if self.ordenado_por_tiempo:
+                inicio = max(inicio, int(time.time() * 1000) * IDS_POR_MILISEGUNDO)
+            con.execute('''
+                INSERT INTO secuencias (nombre, siguiente) VALUES (?, ?)
+                ON CONFLICT(nombre) DO UPDATE SET siguiente = excluded.siguiente
+            ''', (self.secuencia, inicio + cantidad))
+        return inicio
+
+    def reservar(self, cantidad):
+        """
+        Reserva `cantidad` valores consecutivos (sin pasar por el bloque en
+        memoria) y retorna el primero. Para asignar muchos IDs de una vez,
+        como en almacen_memoria.AlmacenMemoria.volcar_a_sqlite.
+        """
+        return self._reservar_bloque(cantidad)
+
+    def siguiente(self):
+        """Retorna el próximo id_movimiento."""
+        with self._candado:
+            if self._pid != os.getpid():
+                # Proceso hijo (fork): el bloque heredado también lo usa el padre
+                self._siguiente = self._limite = 0
+                self._pid = os.getpid()
+            if self._siguiente >= self._limite:
+                self._siguiente = self._reservar_bloque()
+                self._limite = self._siguiente + self.tamano_bloque
+            valor = self._siguiente
+            self._siguiente += 1
+            return valor
+
+
+def avanzar_secuencia_movimientos(cursor, secuencia='movimientos'):
+    """
+    Tras insertar movimientos con idMovimientos explícitos (importación,
+    volcado), lleva la secuencia de AsignadorIds más allá del mayor de
+    ellos, para que no vuelva a entregarlos.
+    """
+    cursor.execute('''
+        UPDATE secuencias
+        SET siguiente = MAX(siguiente, (SELECT CAST(COALESCE(MAX(idMovimientos), 0) AS INTEGER) + 1 FROM movimientos))
+        WHERE nombre = ?
+    ''', (secuencia,))
+
+
+_asignadores = {}
+
+
+def asignador_de(nombre_bd=None, **opciones):
+    """
+    Retorna el AsignadorIds compartido de una base de datos (uno por proceso).
+    Las `opciones` (tamano_bloque, ordenado_por_tiempo) se aplican solo al
+    crearlo.
+    """
+    clave = nombre_bd or DB_NAME
+    with _candado_registro:
+        asignador = _asignadores.get(clave)
+        if asignador is None:
+            asignador = _asignadores[clave] = AsignadorIds(nombre_bd, **opciones)
+        return asignador
+
+
+def _generar_ids(nombre_bd, cantidad, opciones):
+    asignador = AsignadorIds(nombre_bd, **opciones)
+    return [asignador.siguiente() for _ in range(cantidad)]
+
+
+def medir_asignador(nombre_bd=None, procesos=4, ids_por_proceso=100000, **opciones):
+    """
+    Mide cuántos IDs por segundo entregan `procesos` procesos que piden IDs
+    a la vez sobre la misma base, y verifica que no se repitan.
+    Retorna {'ids': total, 'segundos': ..., 'ids_por_segundo': ..., 'repetidos': ...}.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    crear_tablas(nombre_bd)
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(procesos) as ejecutor:
+        partes = list(ejecutor.map(_generar_ids, [nombre_bd] * procesos,
+                                   [ids_por_proceso] * procesos, [opciones] * procesos))
+    segundos = time.perf_counter() - inicio
+    total = procesos * ids_por_proceso
+    return {
+        'ids': total,
+        'segundos': segundos,
+        'ids_por_segundo': total / segundos,
+        'repetidos': total - len({valor for parte in partes for valor in parte}),
+    }
+
+
+# ==============================
+# Almacenamiento
+# ==============================
+class AlmacenSQLite:
+    """
+    Persistencia de cuentas y movimientos en SQLite (almacén por defecto).
+
+    CuentaCorriente solo depende de esta interfaz, por lo que se puede
+    reemplazar por otro almacén (ver almacen_memoria.py) que ofrezca:
+    - clave: identifica dónde viven las cuentas (para bloqueos y validaciones).
+    - registrar_cuenta(numero, rut, nombre, saldo) -> ID de la cuenta.
+    - registrar_cuentas([(numero, rut, nombre, saldo), ...]) -> IDs.
+    - leer_cuenta(id_cuenta) -> (numero, rut, nombre, saldo) o None.
+    - aplicar_movimientos(movimientos) -> (IDs de movimiento, saldos finales).
+    - nuevo_id_movimiento() -> valor para id_movimiento cuando el llamador no lo entrega.
+
+    Con `reutilizar_conexiones=True` cada hilo mantiene abierta su propia
+    conexión en vez de abrir una por operación (útil en procesos de larga
+    duración, como servidor.py).
+    """
+
+    def __init__(self, nombre_bd=None, reutilizar_conexiones=False):
+        self.nombre_bd = nombre_bd
+        self.reutilizar_conexiones = reutilizar_conexiones
+        self._local = threading.local()
+
+    @property
+    def clave(self):
+        return self.nombre_bd or DB_NAME
+
+    def _conexion(self):
+        """Retorna la conexión persistente del hilo actual."""
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = crear_conexion(self.nombre_bd)
+        return con
+
+    def _transaccion(self, operacion):
+        """Transacción de escritura sobre la conexión que corresponda."""
+        if self.reutilizar_conexiones:
+            return transaccion_escritura(self.nombre_bd, con=self._conexion(), operacion=operacion)
+        return transaccion_escritura(self.nombre_bd, operacion=operacion)
+
+    def nuevo_id_movimiento(self):
+        """Asigna un id_movimiento único (ver AsignadorIds)."""
+        return asignador_de(self.nombre_bd).siguiente()
+
+    @reintentar_bloqueos('registrar_cuenta')
+    def registrar_cuenta(self, numero_cuenta, rut_titular, nombre_titular, saldo):
+        """Registra la cuenta en la base de datos y devuelve su ID."""
+        with self._transaccion('registrar_cuenta') as con:
+            cursor = con.cursor()
+            cursor.execute('''
+                INSERT INTO ctacte (NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta)
+                VALUES (?, ?, ?, ?)
+            ''', (numero_cuenta, rut_titular, nombre_titular, saldo))
+            return cursor.lastrowid
+
+    @reintentar_bloqueos('registrar_cuentas')
+    def registrar_cuentas(self, cuentas):
+        """
+        Registra varias cuentas en una sola transacción.
+
+        `cuentas` es una lista de (numero, rut, nombre, saldo); retorna sus IDs.
+        """
+        with self._transaccion('registrar_cuentas') as con:
+            cursor = con.cursor()
+            ids = []
+            for fila in cuentas:
+                cursor.execute('''
+                    INSERT INTO ctacte (NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta)
+                    VALUES (?, ?, ?, ?)
+                ''', fila)
+                ids.append(cursor.lastrowid)
+            return ids
+
+    @reintentar_bloqueos('leer_cuenta')
+    def leer_cuenta(self, id_cuenta):
+        """Retorna (NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta) o None."""
+        consulta = 'SELECT NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta FROM ctacte WHERE ID = ?'
+        if self.reutilizar_conexiones:
+            return self._conexion().execute(consulta, (id_cuenta,)).fetchone()
+        con = crear_conexion(self.nombre_bd)
+        try:
+            return con.execute(consulta, (id_cuenta,)).fetchone()
+        finally:
+            con.close()
+
+    @reintentar_bloqueos('aplicar_movimientos')
+    def aplicar_movimientos(self, movimientos):
+        """
+        Aplica depósitos/retiros en una única transacción.
+
+        `movimientos` es una lista de (id_cuenta, tipo, monto, id_movimiento,
+        clave_idempotencia, descripcion), con tipo 1 = depósito y 0 = retiro. Un movimiento
+        cuya clave ya existe (en la base o antes en el mismo lote) no se vuelve
+        a aplicar y se informa el ID original. Si algún retiro deja un saldo
+        negativo no se aplica nada.
+
+        Retorna (IDs de movimiento en el orden de entrada, {id_cuenta: saldo}).
+        Si la base está bloqueada por otro proceso, se reintenta completa.
+        """
+        with self._transaccion('aplicar_movimientos') as con:
+            cursor = con.cursor()
+            # El saldo persistido manda: otro proceso pudo haberlo cambiado.
+            saldos = {}
+            vistos = {}
+            ids = []
+            for id_cuenta, tipo, monto, id_movimiento, clave, descripcion in movimientos:
+                if id_cuenta not in saldos:
+                    saldos[id_cuenta] = self._leer_saldo_bd(cursor, id_cuenta)
+                if clave is not None:
+                    if clave not in vistos:
+                        vistos[clave] = _buscar_por_clave(cursor, clave)
+                    if vistos[clave] is not None:
+                        ids.append(vistos[clave])
+                        continue
+
+                saldo = saldos[id_cuenta] + monto if tipo == 1 else saldos[id_cuenta] - monto
+                if saldo < 0:
+                    raise ValueError("Saldo insuficiente.")
+                saldos[id_cuenta] = saldo
+                id_registro = self._registrar_movimiento(cursor, id_cuenta, id_movimiento, tipo, monto, clave,
+                                                         saldo, descripcion)
+                if clave is not None:
+                    vistos[clave] = id_registro
+                ids.append(id_registro)
+
+            self._actualizar_saldo_bd(cursor, saldos)
+        return ids, saldos
+
+    def vaciar(self):
+        """Los saldos se escriben en cada transacción: no queda nada pendiente."""
+
+    def _leer_saldo_bd(self, cursor, id_cuenta):
+        """Saldo de la cuenta al comenzar un lote (ver saldos_diferidos.AlmacenDiferido)."""
+        return _leer_saldo(cursor, id_cuenta)
+
+    def _actualizar_saldo_bd(self, cursor, saldos):
+        """Actualiza en la base de datos el saldo de cada cuenta de `saldos`."""
+        cursor.executemany(
+            'UPDATE ctacte SET SaldoCta = ? WHERE ID = ?',
+            [(saldo, id_cuenta) for id_cuenta, saldo in saldos.items()]
+        )
+
+    def _registrar_movimiento(self, cursor, id_cuenta, id_movimiento, tipo, monto, clave_idempotencia=None,
+                              saldo_resultante=None, descripcion=None):
+        """
+        Registra un movimiento asociado a una cuenta y retorna su ID.
+
+        `saldo_resultante` es el saldo de la cuenta después del movimiento; se
+        escribe en la misma transacción que el nuevo saldo de la cuenta.
+        """
+        fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.execute('''
+            INSERT INTO movimientos (idCtaCte, idMovimientos, tipoMovimiento, Monto, claveIdempotencia, fecha,
+                                     saldoResultante, descripcion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (id_cuenta, id_movimiento, tipo, monto, clave_idempotencia, fecha, saldo_resultante, descripcion))
+        return cursor.lastrowid
+
+
+class CuentaCorriente:
+    """
+    Representa una cuenta corriente con operaciones de depósito y retiro.
+
+    Por defecto persiste en SQLite (`nombre_bd`); con `almacen` se puede usar
+    otro almacenamiento con la misma interfaz que AlmacenSQLite.
+    """
+
+    def __init__(self, numero_cuenta, rut_titular, nombre_titular, saldo_inicial=0.0,
+                 nombre_bd=None, almacen=None):
+        self.numero_cuenta = numero_cuenta
+        self.rut_titular = rut_titular
+        self.nombre_titular = nombre_titular
+        self.saldo = saldo_inicial
+        self.nombre_bd = nombre_bd
+        self.almacen = almacen or AlmacenSQLite(nombre_bd)
+        self.id = self.almacen.registrar_cuenta(numero_cuenta, rut_titular, nombre_titular, saldo_inicial)
+
+    @classmethod
+    def crear_varias(cls, datos, nombre_bd=None, almacen=None):
+        """
+        Crea varias cuentas registrándolas en una sola transacción.
+
+        `datos` es una lista de (numero_cuenta, rut_titular, nombre_titular,
+        saldo_inicial). Retorna las cuentas creadas en el mismo orden.
+        """
+        almacen = almacen or AlmacenSQLite(nombre_bd)
+        datos = list(datos)
+        cuentas = []
+        for (numero, rut, nombre, saldo), id_cuenta in zip(datos, almacen.registrar_cuentas(datos)):
+            cuenta = cls.__new__(cls)
+            cuenta.numero_cuenta, cuenta.rut_titular, cuenta.nombre_titular, cuenta.saldo = numero, rut, nombre, saldo
+            cuenta.nombre_bd = nombre_bd
+            cuenta.almacen = almacen
+            cuenta.id = id_cuenta
+            cuentas.append(cuenta)
+        return cuentas
+
+    @classmethod
+    def cargar(cls, id_cuenta, nombre_bd=None, almacen=None):
+        """Retorna la cuenta ya registrada con ese ID, o None si no existe."""
+        almacen = almacen or AlmacenSQLite(nombre_bd)
+        fila = almacen.leer_cuenta(id_cuenta)
+        if fila is None:
+            return None
+        cuenta = cls.__new__(cls)
+        cuenta.numero_cuenta, cuenta.rut_titular, cuenta.nombre_titular, cuenta.saldo = fila
+        cuenta.nombre_bd = nombre_bd
+        cuenta.almacen = almacen
+        cuenta.id = id_cuenta
+        return cuenta
+
+    def depositar(self, monto, id_movimiento=None, clave_idempotencia=None, descripcion=None):
+        """
+        Realiza un depósito en la cuenta y retorna el ID del movimiento.
+
+        Si no se entrega `id_movimiento`, el almacén asigna uno único.
+
+        Si se entrega `clave_idempotencia` y ya existe un movimiento con esa
+        clave, no se vuelve a aplicar: se retorna el ID del movimiento original.
+        `descripcion` es un texto libre ("Depósito sueldo") que se puede buscar
+        con busqueda.buscar_movimientos.
+        """
+        if monto <= 0:
+            raise ValueError("El monto a depositar debe ser positivo.")
+        return self._aplicar_movimiento(id_movimiento, 1, monto, clave_idempotencia, descripcion)
+
+    def retirar(self, monto, id_movimiento=None, clave_idempotencia=None, descripcion=None):
+        """
+        Realiza un retiro de la cuenta y retorna el ID del movimiento.
+
+        Un reintento con la misma `clave_idempotencia` retorna el movimiento
+        original sin volver a descontar el saldo.
+        """
+        if monto <= 0:
+            raise ValueError("El monto a retirar debe ser positivo.")
+        return self._aplicar_movimiento(id_movimiento, 0, monto, clave_idempotencia, descripcion)
+
+    def _aplicar_movimiento(self, id_movimiento, tipo, monto, clave_idempotencia, descripcion=None):
+        """Actualiza el saldo y registra el movimiento en una misma transacción."""
+        if id_movimiento is None:
+            id_movimiento = self.almacen.nuevo_id_movimiento()
+        with _bloquear_cuentas(self):
+            ids, saldos = self.almacen.aplicar_movimientos(
+                [(self.id, tipo, monto, id_movimiento, clave_idempotencia, descripcion)]
+            )
+            self.saldo = saldos[self.id]
+            return ids[0]
+
+    @staticmethod
+    @reintentar_bloqueos('leer_tabla')
+    def _leer_tabla(consulta, nombre_bd=None):
+        """Ejecuta una consulta y retorna (columnas, filas); reintenta si la base está bloqueada."""
+        with crear_conexion(nombre_bd) as con:
+            cursor = con.cursor()
+            cursor.execute(consulta)
+            resultados = cursor.fetchall()
+            return [desc[0] for desc in cursor.description], resultados
+
+    @staticmethod
+    def exportar_cuentas_csv(nombre_archivo='CuentasCorrientes.csv', nombre_bd=None):
+        """Exporta todas las cuentas a un archivo CSV."""
+        columnas, resultados = CuentaCorriente._leer_tabla("SELECT * FROM ctacte", nombre_bd)
+
+        with open(nombre_archivo, 'w', newline='', encoding='utf-8') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(columnas)
+            escritor.writerows(resultados)
+        bitacora.info("Se exportaron %s cuentas a %s.", len(resultados), nombre_archivo)
+
+    @staticmethod
+    def exportar_movimientos_csv(nombre_archivo='Movimientos.csv', nombre_bd=None):
+        """Exporta todos los movimientos a un archivo CSV."""
+        columnas, resultados = CuentaCorriente._leer_tabla("SELECT * FROM movimientos", nombre_bd)
+
+        with open(nombre_archivo, 'w', newline='', encoding='utf-8') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(columnas)
+            escritor.writerows(resultados)
+        bitacora.info("Se exportaron %s movimientos a %s.", len(resultados), nombre_archivo)
+
+    @staticmethod
+    def exportar_movimientos_incremental(nombre_archivo='Movimientos.csv', destino=None,
+                                         anexar=True, nombre_bd=None):
+        """
+        Exporta solo los movimientos nuevos desde la última exportación a `destino`.
+
+        La marca de agua (último ID exportado) se guarda por destino en la tabla
+        `exportaciones`; por defecto el destino es el propio nombre de archivo.
+        - anexar=True: agrega las filas nuevas al final del archivo. Se guarda
+          también el tamaño del archivo, de modo que si una exportación anterior
+          se interrumpió antes de actualizar la marca, lo escrito de más se trunca.
+        - anexar=False: escribe un archivo nuevo solo con el delta, usando un
+          archivo temporal y un reemplazo atómico.
+
+        Retorna la cantidad de movimientos exportados.
+        """
+        destino = destino or nombre_archivo
+        with crear_conexion(nombre_bd) as con:
+            cursor = con.cursor()
+            cursor.execute(
+                'SELECT ultimoIdMovimiento, tamanoArchivo FROM exportaciones WHERE destino = ?',
+                (destino,)
+            )
+            ultimo_id, tamano = cursor.fetchone() or (0, 0)
+
+            cursor.execute('SELECT * FROM movimientos WHERE ID > ? ORDER BY ID', (ultimo_id,))
+            columnas = [desc[0] for desc in cursor.description]
+            posicion_id = columnas.index('ID')
+
+            if anexar:
+                if os.path.exists(nombre_archivo):
+                    actual = os.path.getsize(nombre_archivo)
+                    if actual < tamano:
+                        raise ValueError(f"{nombre_archivo} es más corto que lo ya exportado; "
+                                         "fue modificado fuera de la exportación.")
+                    # Descarta lo escrito por una exportación que no alcanzó a confirmarse
+                    os.truncate(nombre_archivo, tamano)
+                else:
+                    tamano = 0
+                ruta_escritura = nombre_archivo
+                modo = 'a'
+            else:
+                ruta_escritura = nombre_archivo + '.tmp'
+                modo = 'w'
+
+            exportados = 0
+            with open(ruta_escritura, modo, newline='', encoding='utf-8') as archivo:
+                escritor = csv.writer(archivo)
+                if not anexar or tamano == 0:
+                    escritor.writerow(columnas)
+                for fila in cursor:
+                    escritor.writerow(fila)
+                    ultimo_id = fila[posicion_id]
+                    exportados += 1
+                archivo.flush()
+                os.fsync(archivo.fileno())
+
+            if not anexar:
+                os.replace(ruta_escritura, nombre_archivo)
+
+            # La marca se confirma solo después de que el archivo quedó en disco
+            cursor.execute('''
+                INSERT INTO exportaciones (destino, ultimoIdMovimiento, tamanoArchivo)
+                VALUES (?, ?, ?)
+                ON CONFLICT(destino) DO UPDATE SET
+                    ultimoIdMovimiento = excluded.ultimoIdMovimiento,
+                    tamanoArchivo = excluded.tamanoArchivo
+            ''', (destino, ultimo_id, os.path.getsize(nombre_archivo)))
+
+        bitacora.info("Se exportaron %s movimientos nuevos a %s.", exportados, nombre_archivo)
+        return exportados
+
+    @staticmethod
+    @reintentar_bloqueos('exportar_instantanea')
+    def exportar_instantanea(archivo_cuentas='CuentasCorrientes.csv', archivo_movimientos='Movimientos.csv',
+                             manifiesto='Exportacion.json', nombre_bd=None):
+        """
+        Exporta cuentas y movimientos desde una misma instantánea de la base.
+
+        Ambas tablas se leen dentro de una sola transacción de lectura, así que
+        los dos CSV son consistentes entre sí aunque haya escrituras en curso
+        (en modo WAL, ver activar_wal, tampoco las bloquea). Las filas se
+        escriben a medida que se leen, sin cargar las tablas en memoria, en
+        archivos temporales que reemplazan a los finales recién al terminar.
+
+        Al final escribe `manifiesto` (JSON) con los últimos IDs de cuenta y
+        de movimiento incluidos, la cantidad de filas de cada archivo y la
+        fecha. Ambos IDs quedan guardados en la base, así que sirven para
+        comparar exportaciones hechas desde conexiones o procesos distintos.
+        Se escribe al final: si existe, ambos CSV están completos y
+        corresponden a él.
+        Retorna el contenido del manifiesto.
+        """
+        con = crear_conexion(nombre_bd)
+        try:
+            con.execute('BEGIN')
+            # La primera lectura fija la instantánea para el resto de la transacción
+            ultimo_id = con.execute('SELECT COALESCE(MAX(ID), 0) FROM movimientos').fetchone()[0]
+            datos = {
+                'modo_diario': con.execute('PRAGMA journal_mode').fetchone()[0],
+                'ultimoIdCuenta': con.execute('SELECT COALESCE(MAX(ID), 0) FROM ctacte').fetchone()[0],
+                'ultimoIdMovimiento': ultimo_id,
+                'fecha': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            for clave, tabla, nombre_archivo in (('cuentas', 'ctacte', archivo_cuentas),
+                                                 ('movimientos', 'movimientos', archivo_movimientos)):
+                cursor = con.execute(f'SELECT * FROM {tabla} ORDER BY ID')
+                filas = 0
+                with open(nombre_archivo + '.tmp', 'w', newline='', encoding='utf-8') as archivo:
+                    escritor = csv.writer(archivo)
+                    escritor.writerow([desc[0] for desc in cursor.description])
+                    while True:
+                        bloque = cursor.fetchmany(1000)
+                        if not bloque:
+                            break
+                        escritor.writerows(bloque)
+                        filas += len(bloque)
+                datos[clave] = {'archivo': nombre_archivo, 'filas': filas}
+            con.rollback()
+        finally:
+            con.close()
+
+        # Un manifiesto anterior no debe describir los CSV nuevos
+        if os.path.exists(manifiesto):
+            os.remove(manifiesto)
+        for clave in ('cuentas', 'movimientos'):
+            nombre_archivo = datos[clave]['archivo']
+            os.replace(nombre_archivo + '.tmp', nombre_archivo)
+        with open(manifiesto + '.tmp', 'w', encoding='utf-8') as archivo:
+            json.dump(datos, archivo, ensure_ascii=False, indent=2)
+        os.replace(manifiesto + '.tmp', manifiesto)
+        bitacora.info("Se exportaron %s cuentas y %s movimientos (hasta el ID %s) a %s y %s.",
+                      datos['cuentas']['filas'], datos['movimientos']['filas'], ultimo_id,
+                      archivo_cuentas, archivo_movimientos)
+        return datos
+
+
+# ==============================
+# Transferencias
+# ==============================
+def _validar_mismo_almacen(origen, destinos):
+    """Verifica que todas las cuentas vivan en el mismo almacén."""
+    for destino in destinos:
+        if destino.almacen.clave != origen.almacen.clave:
+            raise ValueError("Las cuentas de una transferencia deben estar en la misma base de datos.")
+        if destino.id == origen.id:
+            raise ValueError("La cuenta de origen y destino deben ser distintas.")
+
+
+def claves_transferencia(clave_idempotencia, cantidad):
+    """
+    Deriva una clave por tramo (retiro y depósito) de cada pago de una
+    transferencia; retorna una lista de pares (clave_origen, clave_destino).
+
+    La clave del índice es única por fila, así que cada movimiento de una
+    transferencia recibe la clave del llamador más un sufijo estable.
+    """
+    if clave_idempotencia is None:
+        return [(None, None)] * cantidad
+    return [(f"{clave_idempotencia}:{i}:origen", f"{clave_idempotencia}:{i}:destino")
+            for i in range(cantidad)]
+
+
+def transferir(origen, destino, monto, id_movimiento=None, clave_idempotencia=None, descripcion=None):
+    """
+    Transfiere `monto` desde `origen` hacia `destino` de forma atómica.
+
+    Ambos saldos y ambos movimientos (retiro en origen, depósito en destino,
+    con el mismo id_movimiento) se escriben en una única transacción: o se
+    aplican los cuatro cambios o ninguno. Retorna los IDs de ambos
+    movimientos; un reintento con la misma `clave_idempotencia` retorna los
+    originales sin mover dinero otra vez.
+    """
+    return transferir_lote(origen, [(destino, monto)], id_movimiento, clave_idempotencia, descripcion)[0]
+
+
+def transferir_lote(origen, pagos, id_movimiento=None, clave_idempotencia=None, descripcion=None):
+    """
+    Transfiere desde `origen` a varios destinos en una sola transacción.
+
+    Pensado para pagos masivos (por ejemplo, remuneraciones): `pagos` es una
+    lista de pares (cuenta_destino, monto). Si el saldo no alcanza para el
+    total, no se aplica ningún pago. Retorna una lista de pares
+    (ID movimiento origen, ID movimiento destino), uno por pago. La
+    `descripcion` se registra en ambos movimientos de cada pago. Sin
+    `id_movimiento` se asigna uno, común a todos los pagos del lote.
+    """
+    pagos = list(pagos)
+    if not pagos:
+        return []
+    for _, monto in pagos:
+        if monto <= 0:
+            raise ValueError("El monto a transferir debe ser positivo.")
+    destinos = [destino for destino, _ in pagos]
+    _validar_mismo_almacen(origen, destinos)
+    if id_movimiento is None:
+        id_movimiento = origen.almacen.nuevo_id_movimiento()
+
+    movimientos = []
+    for (destino, monto), (clave_origen, clave_destino) in zip(pagos, claves_transferencia(clave_idempotencia, len(pagos))):
+        movimientos.append((origen.id, 0, monto, id_movimiento, clave_origen, descripcion))
+        movimientos.append((destino.id, 1, monto, id_movimiento, clave_destino, descripcion))
+
+    with _bloquear_cuentas(origen, *destinos):
+        ids, saldos = origen.almacen.aplicar_movimientos(movimientos)
+        for cuenta in [origen] + destinos:
+            cuenta.saldo = saldos[cuenta.id]
+    return list(zip(ids[0::2], ids[1::2]))
+
+
+# ==============================
+# Ingesta de movimientos en lote
+# ==============================
+def aplicar_movimientos(movimientos):
+    """
+    Aplica un lote de depósitos/retiros en una sola transacción.
+
+    `movimientos` es una lista de tuplas
+    (cuenta, tipo, monto, id_movimiento, clave_idempotencia[, descripcion]),
+    con tipo 1 = depósito y 0 = retiro. Las claves ya registradas, o repetidas dentro
+    del mismo lote, no se vuelven a aplicar: se retorna el ID original. Un
+    id_movimiento None se reemplaza por uno asignado por el almacén.
+    Retorna la lista de IDs de movimiento en el mismo orden de entrada.
+    """
+    # La descripción es opcional: se completa con None
+    movimientos = [tuple(movimiento) + (None,) * (6 - len(movimiento)) for movimiento in movimientos]
+    if not movimientos:
+        return []
+    almacen = movimientos[0][0].almacen
+    for cuenta, tipo, monto, _, _, _ in movimientos:
+        if tipo not in (0, 1):
+            raise ValueError("El tipo de movimiento debe ser 0 (retiro) o 1 (depósito).")
+        if monto <= 0:
+            raise ValueError("El monto del movimiento debe ser positivo.")
+        if cuenta.almacen.clave != almacen.clave:
+            raise ValueError("Las cuentas del lote deben estar en la misma base de datos.")
+
+    cuentas = {movimiento[0].id: movimiento[0] for movimiento in movimientos}
+    movimientos = [
+        (cuenta.id, tipo, monto, almacen.nuevo_id_movimiento() if id_movimiento is None else id_movimiento, *resto)
+        for cuenta, tipo, monto, id_movimiento, *resto in movimientos
+    ]
+    with _bloquear_cuentas(*cuentas.values()):
+        ids, saldos = almacen.aplicar_movimientos(movimientos)
+        for id_cuenta, cuenta in cuentas.items():
+            cuenta.saldo = saldos[id_cuenta]
+        return ids
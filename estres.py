@@ -0,0 +1,298 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cuenta_corriente import CuentaCorriente, crear_conexion, crear_tablas, metricas, transferir
+from saldos_diferidos import crear_almacen
+
+# Proporción de cada operación en la carga
+MEZCLA = {'deposito': 45, 'retiro': 35, 'transferencia': 20}
+CUENTAS = 10
+SALDO_INICIAL = 1000.0
+MONTO_MAXIMO = 100
+PERCENTILES = (50, 95, 99)
+
+
+# ==============================
+# Carga de trabajo
+# ==============================
+def _hilo(cuentas, operaciones, mezcla, semilla, resultado):
+    """
+    Ejecuta `operaciones` operaciones al azar sobre `cuentas` y acumula en
+    `resultado` las latencias, los conteos y, por cuenta, el cambio de
+    saldo de las operaciones confirmadas.
+    """
+    azar = random.Random(semilla)
+    tipos = list(mezcla)
+    pesos = [mezcla[tipo] for tipo in tipos]
+    for tipo in azar.choices(tipos, pesos, k=operaciones):
+        monto = float(azar.randint(1, MONTO_MAXIMO))
+        origen, destino = azar.sample(cuentas, 2)
+        inicio = time.perf_counter()
+        try:
+            if tipo == 'deposito':
+                origen.depositar(monto)
+                cambios = {origen.id: monto}
+            elif tipo == 'retiro':
+                origen.retirar(monto)
+                cambios = {origen.id: -monto}
+            else:
+                transferir(origen, destino, monto)
+                cambios = {origen.id: -monto, destino.id: monto}
+        except ValueError:
+            # Saldo insuficiente: la operación se rechaza sin escribir nada
+            estado = 'rechazos'
+            cambios = {}
+        except Exception as e:
+            estado = 'errores'
+            cambios = {}
+            resultado['ultimo_error'] = f"{type(e).__name__}: {e}"
+        else:
+            estado = 'exitos'
+        latencia = time.perf_counter() - inicio
+        resultado['latencias'][tipo].append(latencia)
+        resultado[estado][tipo] += 1
+        for id_cuenta, cambio in cambios.items():
+            resultado['cambios'][id_cuenta] = resultado['cambios'].get(id_cuenta, 0.0) + cambio
+
+
+def _proceso(nombre_bd, ids, hilos, operaciones, mezcla, semilla, durabilidad):
+    """
+    Ejecuta `hilos` hilos con `operaciones` operaciones cada uno, sobre
+    cuentas cargadas en este proceso. Retorna los resultados combinados de
+    sus hilos, los segundos que tardaron y la contención registrada.
+    """
+    almacen = crear_almacen(nombre_bd, durabilidad, reutilizar_conexiones=True)
+    cuentas = [CuentaCorriente.cargar(id_cuenta, nombre_bd, almacen) for id_cuenta in ids]
+    resultados = [{
+        'latencias': {tipo: [] for tipo in mezcla},
+        'exitos': dict.fromkeys(mezcla, 0),
+        'rechazos': dict.fromkeys(mezcla, 0),
+        'errores': dict.fromkeys(mezcla, 0),
+        'cambios': {},
+    } for _ in range(hilos)]
+    contencion_antes = metricas.resumen()
+
+    trabajadores = [threading.Thread(target=_hilo, args=(cuentas, operaciones, mezcla, semilla * 1000 + i, resultado))
+                    for i, resultado in enumerate(resultados)]
+    inicio = time.perf_counter()
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    segundos = time.perf_counter() - inicio
+    almacen.vaciar()
+
+    combinado = _combinar(resultados)
+    combinado['segundos'] = segundos
+    combinado['contencion'] = _diferencia(metricas.resumen(), contencion_antes)
+    return combinado
+
+
+def _combinar(resultados):
+    """Suma los resultados de varios hilos o procesos."""
+    combinado = {'latencias': {}, 'exitos': {}, 'rechazos': {}, 'errores': {}, 'cambios': {}, 'contencion': {}}
+    for resultado in resultados:
+        for tipo, latencias in resultado['latencias'].items():
+            combinado['latencias'].setdefault(tipo, []).extend(latencias)
+        for campo in ('exitos', 'rechazos', 'errores', 'cambios'):
+            for clave, valor in resultado[campo].items():
+                combinado[campo][clave] = combinado[campo].get(clave, 0) + valor
+        for operacion, datos in resultado.get('contencion', {}).items():
+            acumulado = combinado['contencion'].setdefault(operacion, dict.fromkeys(datos, 0))
+            for campo, valor in datos.items():
+                acumulado[campo] += valor
+        if 'ultimo_error' in resultado:
+            combinado['ultimo_error'] = resultado['ultimo_error']
+    return combinado
+
+
+def _diferencia(despues, antes):
+    """Contadores de `metricas` registrados entre dos resúmenes."""
+    diferencia = {}
+    for operacion, datos in despues.items():
+        previos = antes.get(operacion, {})
+        cambios = {campo: valor - previos.get(campo, 0) for campo, valor in datos.items()}
+        if any(cambios.values()):
+            diferencia[operacion] = cambios
+    return diferencia
+
+
+def _percentil(ordenados, percentil):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * percentil / 100))]
+
+
+# ==============================
+# Invariantes
+# ==============================
+def verificar(ids, saldo_inicial, cambios, exitos, nombre_bd=None):
+    """
+    Verifica las invariantes sobre las cuentas `ids` después de una carga y
+    retorna {invariante: [problemas]} (listas vacías si se cumplen):
+    - actualizaciones_perdidas: el saldo de la cuenta no es el inicial más
+      los cambios de las operaciones confirmadas (`cambios`), o faltan o
+      sobran movimientos respecto de las confirmadas (`exitos`).
+    - saldos_negativos: una cuenta, o el saldo tras algún movimiento,
+      quedó bajo cero.
+    - saldo_distinto_de_movimientos: el saldo de la cuenta no es el inicial
+      más la suma de sus movimientos, o el `saldoResultante` de un
+      movimiento no es el del anterior más su monto (dos transacciones
+      partieron del mismo saldo).
+    """
+    problemas = {'actualizaciones_perdidas': [], 'saldos_negativos': [], 'saldo_distinto_de_movimientos': []}
+    marcas = ', '.join('?' * len(ids))
+    con = crear_conexion(nombre_bd)
+    try:
+        saldos = dict(con.execute(f'SELECT ID, SaldoCta FROM ctacte WHERE ID IN ({marcas})', ids))
+        esperados = exitos.get('deposito', 0) + exitos.get('retiro', 0) + 2 * exitos.get('transferencia', 0)
+        registrados = con.execute(f'SELECT COUNT(*) FROM movimientos WHERE idCtaCte IN ({marcas})', ids).fetchone()[0]
+        if registrados != esperados:
+            problemas['actualizaciones_perdidas'].append(
+                f"{registrados} movimientos registrados para {esperados} confirmados")
+
+        calculados = dict.fromkeys(ids, saldo_inicial)
+        for id_registro, id_cuenta, tipo, monto, resultante in con.execute(f'''
+            SELECT ID, idCtaCte, tipoMovimiento, Monto, saldoResultante FROM movimientos
+            WHERE idCtaCte IN ({marcas}) ORDER BY idCtaCte, ID
+        ''', ids):
+            calculados[id_cuenta] += monto if tipo == 1 else -monto
+            if resultante is None or abs(resultante - calculados[id_cuenta]) > 1e-6:
+                problemas['saldo_distinto_de_movimientos'].append(
+                    f"movimiento {id_registro} de la cuenta {id_cuenta}: saldo resultante {resultante}, "
+                    f"según los movimientos {calculados[id_cuenta]}")
+            if resultante is not None and resultante < 0:
+                problemas['saldos_negativos'].append(f"movimiento {id_registro}: saldo resultante {resultante}")
+    finally:
+        con.close()
+
+    for id_cuenta in ids:
+        saldo = saldos[id_cuenta]
+        if saldo < 0:
+            problemas['saldos_negativos'].append(f"cuenta {id_cuenta}: saldo {saldo}")
+        esperado = saldo_inicial + cambios.get(id_cuenta, 0.0)
+        if abs(saldo - esperado) > 1e-6:
+            problemas['actualizaciones_perdidas'].append(
+                f"cuenta {id_cuenta}: saldo {saldo}, según las operaciones confirmadas {esperado}")
+        if abs(saldo - calculados[id_cuenta]) > 1e-6:
+            problemas['saldo_distinto_de_movimientos'].append(
+                f"cuenta {id_cuenta}: saldo {saldo}, según los movimientos {calculados[id_cuenta]}")
+    return problemas
+
+
+# ==============================
+# Prueba de estrés
+# ==============================
+def estresar(nombre_bd=None, procesos=2, hilos=4, operaciones=250, cuentas=CUENTAS, mezcla=None,
+             saldo_inicial=SALDO_INICIAL, durabilidad='inmediata', semilla=0):
+    """
+    Ejecuta depósitos, retiros y transferencias al azar (proporciones en
+    `mezcla`, por defecto MEZCLA) desde `procesos` procesos con `hilos`
+    hilos cada uno, `operaciones` por hilo, sobre `cuentas` cuentas nuevas
+    con `saldo_inicial`. Pocas cuentas para muchos hilos significa más
+    contención. Sin `nombre_bd` usa una base temporal. Las durabilidades
+    diferidas (saldos_diferidos.py) suponen un único proceso escritor.
+
+    Retorna un diccionario con las operaciones por segundo, las latencias
+    por tipo en milisegundos (percentiles PERCENTILES y máximo), los
+    conteos de éxitos, rechazos por saldo insuficiente y errores, la
+    contención registrada en `metricas` y las invariantes (ver verificar);
+    'ok' es True si todas se cumplen.
+    """
+    mezcla = dict(mezcla or MEZCLA)
+    if cuentas < 2:
+        raise ValueError("Se necesitan al menos dos cuentas para transferir.")
+    if durabilidad != 'inmediata' and procesos > 1:
+        raise ValueError("Los saldos diferidos admiten un solo proceso escritor.")
+    with tempfile.TemporaryDirectory() as carpeta:
+        nombre_bd = nombre_bd or os.path.join(carpeta, 'Estres.db')
+        crear_tablas(nombre_bd)
+        datos = [(800000 + i, '12345678-9', f"Estrés {i}", saldo_inicial) for i in range(cuentas)]
+        ids = [cuenta.id for cuenta in CuentaCorriente.crear_varias(datos, nombre_bd)]
+
+        argumentos = (nombre_bd, ids, hilos, operaciones, mezcla)
+        if procesos == 1:
+            partes = [_proceso(*argumentos, semilla, durabilidad)]
+        else:
+            with ProcessPoolExecutor(procesos) as ejecutor:
+                futuros = [ejecutor.submit(_proceso, *argumentos, semilla * 1000 + i, durabilidad)
+                           for i in range(procesos)]
+                partes = [futuro.result() for futuro in futuros]
+
+        resultado = _combinar(partes)
+        invariantes = verificar(ids, saldo_inicial, resultado['cambios'], resultado['exitos'], nombre_bd)
+
+    segundos = max(parte['segundos'] for parte in partes)
+    total = sum(len(latencias) for latencias in resultado['latencias'].values())
+    latencias = {}
+    for tipo, valores in resultado['latencias'].items():
+        if valores:
+            valores.sort()
+            latencias[tipo] = {f"p{p}": _percentil(valores, p) * 1000 for p in PERCENTILES}
+            latencias[tipo]['maximo'] = valores[-1] * 1000
+    return {
+        'operaciones': total,
+        'segundos': segundos,
+        'operaciones_por_segundo': total / segundos,
+        'latencias_ms': latencias,
+        'exitos': resultado['exitos'],
+        'rechazos': resultado['rechazos'],
+        'errores': resultado['errores'],
+        'ultimo_error': resultado.get('ultimo_error'),
+        'contencion': resultado['contencion'],
+        'invariantes': invariantes,
+        'ok': not any(invariantes.values()),
+    }
+
+
+def _leer_mezcla(texto):
+    """'deposito=45,retiro=35,transferencia=20' -> {'deposito': 45, ...}."""
+    mezcla = {}
+    for parte in texto.split(','):
+        tipo, _, peso = parte.partition('=')
+        if tipo not in MEZCLA:
+            raise argparse.ArgumentTypeError(f"Operación desconocida: {tipo}")
+        mezcla[tipo] = float(peso)
+    return mezcla
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Prueba de estrés concurrente: rendimiento, latencias e invariantes de saldo."
+    )
+    parser.add_argument('--bd', help="base de datos (por defecto, una temporal)")
+    parser.add_argument('--procesos', type=int, default=2)
+    parser.add_argument('--hilos', type=int, default=4, help="hilos por proceso")
+    parser.add_argument('--operaciones', type=int, default=250, help="operaciones por hilo")
+    parser.add_argument('--cuentas', type=int, default=CUENTAS)
+    parser.add_argument('--mezcla', type=_leer_mezcla, default=MEZCLA,
+                        help="proporciones, por ejemplo deposito=45,retiro=35,transferencia=20")
+    parser.add_argument('--durabilidad', choices=('inmediata', 'por_lotes', 'al_cerrar'), default='inmediata')
+    args = parser.parse_args(argv)
+
+    informe = estresar(args.bd, args.procesos, args.hilos, args.operaciones, args.cuentas, args.mezcla,
+                       durabilidad=args.durabilidad)
+    print(f"{informe['operaciones']} operaciones en {informe['segundos']:.2f} s: "
+          f"{informe['operaciones_por_segundo']:.0f} por segundo")
+    for tipo, valores in informe['latencias_ms'].items():
+        detalle = ', '.join(f"{nombre} {ms:.2f}" for nombre, ms in valores.items())
+        print(f"  {tipo}: {informe['exitos'][tipo]} exitosas, {informe['rechazos'][tipo]} rechazadas, "
+              f"{informe['errores'][tipo]} con error; ms {detalle}")
+    if informe['ultimo_error']:
+        print(f"  último error: {informe['ultimo_error']}")
+    for operacion, datos in informe['contencion'].items():
+        print(f"  contención {operacion}: {datos}")
+    for invariante, problemas in informe['invariantes'].items():
+        print(f"{'OK   ' if not problemas else 'FALLA'} {invariante}")
+        for problema in problemas[:10]:
+            print(f"      {problema}")
+    return 0 if informe['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
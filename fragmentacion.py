@@ -0,0 +1,182 @@
+import csv
+import heapq
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from bitacora import obtener_bitacora
+from cuenta_corriente import DB_NAME, CuentaCorriente, crear_conexion, crear_tablas, transferir
+
+bitacora = obtener_bitacora('fragmentacion')
+
+# Cada fragmento numera sus IDs desde fragmento * RANGO_IDS, así los IDs de
+# cuentas y movimientos son únicos entre archivos y delatan su fragmento.
+RANGO_IDS = 10 ** 12
+
+
+class AlmacenFragmentado:
+    """
+    Reparte las cuentas (y sus movimientos) entre varios archivos SQLite.
+
+    Cada cuenta vive en el fragmento que indica el hash de su número de
+    cuenta. Como SQLite admite un solo escritor por archivo, las escrituras
+    sobre cuentas de fragmentos distintos avanzan en paralelo. Las consultas
+    que no conocen la cuenta se reparten entre todos los fragmentos y se
+    combinan los resultados.
+    """
+
+    def __init__(self, cantidad=4, nombre_base=None):
+        if cantidad < 1:
+            raise ValueError("Debe haber al menos un fragmento.")
+        raiz, extension = os.path.splitext(nombre_base or DB_NAME)
+        self.rutas = [f"{raiz}_{i}{extension}" for i in range(cantidad)]
+        for numero, ruta in enumerate(self.rutas):
+            crear_tablas(ruta)
+            self._reservar_rango_ids(numero, ruta)
+
+    @staticmethod
+    def _reservar_rango_ids(numero, ruta):
+        """Hace que los AUTOINCREMENT del fragmento partan en su propio rango."""
+        with crear_conexion(ruta) as con:
+            for tabla in ('ctacte', 'movimientos'):
+                con.execute('''
+                    INSERT INTO sqlite_sequence (name, seq)
+                    SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+                ''', (tabla, numero * RANGO_IDS, tabla))
+
+    # ==============================
+    # Enrutamiento
+    # ==============================
+    def fragmento_de(self, numero_cuenta):
+        """
+        Retorna el índice de fragmento de un número de cuenta (estable entre procesos).
+
+        NumeroCtaCte se guarda como REAL: 1001, 1001.0 y "1001" deben caer en
+        el mismo fragmento, así que se usa una sola forma del número.
+        """
+        valor = float(numero_cuenta)
+        texto = str(int(valor)) if valor.is_integer() else repr(valor)
+        return zlib.crc32(texto.encode('utf-8')) % len(self.rutas)
+
+    def fragmento_de_id(self, id_registro):
+        """Retorna el índice de fragmento de un ID de cuenta o movimiento."""
+        return id_registro // RANGO_IDS
+
+    def ruta_de(self, numero_cuenta):
+        """Retorna el archivo de base de datos donde vive la cuenta."""
+        return self.rutas[self.fragmento_de(numero_cuenta)]
+
+    def _en_paralelo(self, consulta, *parametros):
+        """Ejecuta una consulta en todos los fragmentos a la vez y retorna sus filas."""
+        def ejecutar(ruta):
+            con = crear_conexion(ruta)
+            try:
+                return con.execute(consulta, parametros).fetchall()
+            finally:
+                con.close()
+
+        with ThreadPoolExecutor(max_workers=len(self.rutas)) as pool:
+            return list(pool.map(ejecutar, self.rutas))
+
+    # ==============================
+    # Operaciones
+    # ==============================
+    def crear_cuenta(self, numero_cuenta, rut_titular, nombre_titular, saldo_inicial=0.0):
+        """Crea la cuenta en su fragmento y retorna el CuentaCorriente asociado."""
+        return CuentaCorriente(numero_cuenta, rut_titular, nombre_titular, saldo_inicial,
+                               nombre_bd=self.ruta_de(numero_cuenta))
+
+    def transferir(self, origen, destino, monto, id_movimiento, clave_idempotencia=None, descripcion=None):
+        """
+        Transfiere entre dos cuentas del mismo fragmento.
+
+        Cada fragmento es un archivo con sus propias transacciones, por lo que
+        una transferencia entre fragmentos no sería atómica y se rechaza.
+        """
+        if origen.almacen.clave != destino.almacen.clave:
+            raise ValueError("La transferencia involucra cuentas de fragmentos distintos.")
+        return transferir(origen, destino, monto, id_movimiento, clave_idempotencia, descripcion)
+
+    def buscar_cuenta(self, numero_cuenta):
+        """Retorna la fila de ctacte de un número de cuenta, o None."""
+        con = crear_conexion(self.ruta_de(numero_cuenta))
+        try:
+            return con.execute(
+                'SELECT * FROM ctacte WHERE NumeroCtaCte = ?', (numero_cuenta,)
+            ).fetchone()
+        finally:
+            con.close()
+
+    def buscar_por_id(self, id_cuenta):
+        """Retorna la fila de ctacte con ese ID, consultando solo su fragmento."""
+        con = crear_conexion(self.rutas[self.fragmento_de_id(id_cuenta)])
+        try:
+            return con.execute('SELECT * FROM ctacte WHERE ID = ?', (id_cuenta,)).fetchone()
+        finally:
+            con.close()
+
+    def buscar_por_rut(self, rut_titular):
+        """Retorna todas las cuentas de un RUT, buscando en todos los fragmentos."""
+        resultados = self._en_paralelo('SELECT * FROM ctacte WHERE rutTitularCta = ? ORDER BY ID', rut_titular)
+        return list(heapq.merge(*resultados))
+
+    def movimientos_de(self, numero_cuenta):
+        """Retorna los movimientos de una cuenta (viven en el fragmento de la cuenta)."""
+        con = crear_conexion(self.ruta_de(numero_cuenta))
+        try:
+            return con.execute('''
+                SELECT m.* FROM movimientos m JOIN ctacte c ON c.ID = m.idCtaCte
+                WHERE c.NumeroCtaCte = ? ORDER BY m.ID
+            ''', (numero_cuenta,)).fetchall()
+        finally:
+            con.close()
+
+    # ==============================
+    # Reportes
+    # ==============================
+    def resumen(self):
+        """Retorna (cantidad de cuentas, saldo total) sumando todos los fragmentos."""
+        parciales = self._en_paralelo('SELECT COUNT(*), COALESCE(SUM(SaldoCta), 0) FROM ctacte')
+        return (sum(filas[0][0] for filas in parciales),
+                sum(filas[0][1] for filas in parciales))
+
+    def cuentas_mayor_saldo(self, cantidad=10):
+        """Retorna las `cantidad` cuentas con mayor saldo entre todos los fragmentos."""
+        parciales = self._en_paralelo(
+            'SELECT * FROM ctacte ORDER BY SaldoCta DESC LIMIT ?', cantidad
+        )
+        return heapq.nlargest(cantidad, (fila for filas in parciales for fila in filas),
+                              key=lambda fila: fila[4])
+
+    # ==============================
+    # Exportación
+    # ==============================
+    def _exportar(self, tabla, nombre_archivo):
+        """Escribe una tabla de todos los fragmentos en un solo CSV, ordenada por ID."""
+        total = 0
+        with open(nombre_archivo, 'w', newline='', encoding='utf-8') as archivo:
+            escritor = csv.writer(archivo)
+            # Los rangos de IDs son disjuntos y crecientes por fragmento, así
+            # que recorrerlos en orden ya entrega el resultado combinado.
+            for numero, ruta in enumerate(self.rutas):
+                con = crear_conexion(ruta)
+                try:
+                    cursor = con.execute(f"SELECT * FROM {tabla} ORDER BY ID")
+                    if numero == 0:
+                        escritor.writerow([desc[0] for desc in cursor.description])
+                    for fila in cursor:
+                        escritor.writerow(fila)
+                        total += 1
+                finally:
+                    con.close()
+        return total
+
+    def exportar_cuentas_csv(self, nombre_archivo='CuentasCorrientes.csv'):
+        """Exporta las cuentas de todos los fragmentos a un archivo CSV."""
+        total = self._exportar('ctacte', nombre_archivo)
+        bitacora.info("Se exportaron %s cuentas a %s.", total, nombre_archivo)
+
+    def exportar_movimientos_csv(self, nombre_archivo='Movimientos.csv'):
+        """Exporta los movimientos de todos los fragmentos a un archivo CSV."""
+        total = self._exportar('movimientos', nombre_archivo)
+        bitacora.info("Se exportaron %s movimientos a %s.", total, nombre_archivo)
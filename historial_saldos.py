@@ -0,0 +1,209 @@
+import datetime
+
+from archivado import anios_archivados, conexion_historica
+from cuenta_corriente import crear_conexion, crear_tablas, transaccion_escritura
+from saldos_diferidos import materializar_saldos
+
+MOVIMIENTOS_POR_CORTE = 500
+CUENTAS_POR_LOTE = 500
+
+# Monto con signo: los depósitos suman y los retiros restan
+_MONTO_CON_SIGNO = "CASE tipoMovimiento WHEN 1 THEN Monto ELSE -Monto END"
+
+
+def _normalizar_fecha(fecha, fin_del_dia=True):
+    """
+    Convierte la fecha consultada al formato de `movimientos.fecha`.
+
+    Una fecha sin hora (date o 'YYYY-MM-DD') se interpreta como el final de
+    ese día, o como su inicio con fin_del_dia=False.
+    """
+    if isinstance(fecha, datetime.datetime):
+        return fecha.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(fecha, datetime.date):
+        fecha = fecha.strftime("%Y-%m-%d")
+    if len(fecha) == 10:
+        return fecha + (" 23:59:59" if fin_del_dia else " 00:00:00")
+    return fecha
+
+
+def _conexion_historial(nombre_bd=None):
+    """
+    Retorna (conexión, tabla) para leer el historial completo: si hay años
+    archivados, la vista movimientos_historicos (ver archivado.py).
+    """
+    if anios_archivados(nombre_bd):
+        return conexion_historica(nombre_bd), 'movimientos_historicos'
+    return crear_conexion(nombre_bd), 'movimientos'
+
+
+def registrar_cortes(nombre_bd=None, movimientos_por_corte=MOVIMIENTOS_POR_CORTE):
+    """
+    Guarda un corte de saldo para cada cuenta con al menos
+    `movimientos_por_corte` movimientos desde su último corte.
+
+    Un corte es el saldo de la cuenta justo después de su último movimiento.
+    Se toma dentro de una transacción de escritura, así que el saldo y los
+    movimientos leídos son consistentes. Pensado para ejecutarse
+    periódicamente (por ejemplo, una vez al día); retorna la cantidad de
+    cortes creados.
+    """
+    with transaccion_escritura(nombre_bd) as con:
+        cursor = con.cursor()
+        # Con saldos diferidos (saldos_diferidos.py) ctacte puede ir atrasado
+        materializar_saldos(cursor)
+        cursor.execute('''
+            INSERT INTO cortesSaldo (idCtaCte, ultimoIdMovimiento, fecha, saldo)
+            SELECT c.ID, p.ultimo, m.fecha, c.SaldoCta
+            FROM (
+                SELECT idCtaCte, MAX(ID) AS ultimo, COUNT(*) AS cantidad
+                FROM movimientos
+                WHERE fecha IS NOT NULL
+                  AND ID > COALESCE((SELECT MAX(ultimoIdMovimiento) FROM cortesSaldo
+                                     WHERE cortesSaldo.idCtaCte = movimientos.idCtaCte), 0)
+                GROUP BY idCtaCte
+            ) AS p
+            JOIN ctacte c ON c.ID = p.idCtaCte
+            JOIN movimientos m ON m.ID = p.ultimo
+            WHERE p.cantidad >= ?
+        ''', (movimientos_por_corte,))
+        return cursor.rowcount
+
+
+def completar_saldos_resultantes(nombre_bd=None, cuentas_por_lote=CUENTAS_POR_LOTE):
+    """
+    Calcula `saldoResultante` en los movimientos que no lo tienen
+    (registrados antes de existir la columna, o importados desde CSV).
+
+    El saldo tras cada movimiento se reconstruye hacia atrás desde el saldo
+    actual de la cuenta: saldo actual - total de la cuenta + acumulado hasta
+    el movimiento. Se procesan `cuentas_por_lote` cuentas por transacción;
+    repetirlo es seguro. Retorna la cantidad de movimientos completados.
+    """
+    con = crear_conexion(nombre_bd)
+    try:
+        cuentas = [fila[0] for fila in con.execute(
+            'SELECT DISTINCT idCtaCte FROM movimientos WHERE saldoResultante IS NULL'
+        )]
+    finally:
+        con.close()
+
+    completados = 0
+    for inicio in range(0, len(cuentas), cuentas_por_lote):
+        lote = cuentas[inicio:inicio + cuentas_por_lote]
+        marcas = ', '.join('?' * len(lote))
+        with transaccion_escritura(nombre_bd) as con:
+            cursor = con.cursor()
+            materializar_saldos(cursor)
+            cursor.execute(f'''
+                UPDATE movimientos SET saldoResultante = calculo.saldo
+                FROM (
+                    SELECT m.ID,
+                           c.SaldoCta
+                           - SUM({_MONTO_CON_SIGNO}) OVER (PARTITION BY m.idCtaCte)
+                           + SUM({_MONTO_CON_SIGNO}) OVER (PARTITION BY m.idCtaCte ORDER BY m.ID) AS saldo
+                    FROM movimientos m JOIN ctacte c ON c.ID = m.idCtaCte
+                    WHERE m.idCtaCte IN ({marcas})
+                ) AS calculo
+                WHERE movimientos.ID = calculo.ID AND movimientos.saldoResultante IS NULL
+            ''', lote)
+            completados += cursor.rowcount
+    return completados
+
+
+def estado_de_cuenta(cuenta_id, desde=None, hasta=None, nombre_bd=None):
+    """
+    Retorna la cartola de una cuenta: [(ID, fecha, tipoMovimiento, Monto,
+    saldoResultante), ...] en orden cronológico, opcionalmente entre dos
+    fechas. Es una sola lectura por el índice (idCtaCte, fecha), que incluye
+    los movimientos archivados.
+    """
+    desde = '' if desde is None else _normalizar_fecha(desde, fin_del_dia=False)
+    hasta = '9999' if hasta is None else _normalizar_fecha(hasta)
+    con, tabla = _conexion_historial(nombre_bd)
+    try:
+        return con.execute(f'''
+            SELECT ID, fecha, tipoMovimiento, Monto, saldoResultante FROM {tabla}
+            WHERE idCtaCte = ? AND fecha >= ? AND fecha <= ?
+            ORDER BY fecha, ID
+        ''', (cuenta_id, desde, hasta)).fetchall()
+    finally:
+        con.close()
+
+
+def saldo_al(cuenta_id, fecha, nombre_bd=None):
+    """
+    Retorna el saldo que tenía la cuenta en la fecha indicada.
+
+    Normalmente es el `saldoResultante` del último movimiento hasta esa
+    fecha (una sola lectura). Si ese movimiento no lo tiene, parte del
+    corte más cercano anterior a la fecha y suma los movimientos
+    posteriores a él; si no hay uno, parte del corte siguiente (o del saldo
+    actual) y descuenta los movimientos posteriores a la fecha. Las
+    búsquedas usan los índices por cuenta y fecha, así que el costo depende
+    de la distancia entre cortes y no del largo del historial. Si hay años
+    archivados, también se leen sus movimientos.
+
+    Lanza ValueError si la cuenta no existe.
+    """
+    fecha = _normalizar_fecha(fecha)
+    con, tabla = _conexion_historial(nombre_bd)
+    try:
+        cursor = con.cursor()
+        cursor.execute("SELECT SaldoCta FROM ctacte WHERE ID = ?", (cuenta_id,))
+        fila = cursor.fetchone()
+        if fila is None:
+            raise ValueError(f"La cuenta {cuenta_id} no existe.")
+        saldo_actual = fila[0]
+
+        cursor.execute(f'''
+            SELECT saldoResultante FROM {tabla}
+            WHERE idCtaCte = ? AND fecha <= ?
+            ORDER BY fecha DESC, ID DESC LIMIT 1
+        ''', (cuenta_id, fecha))
+        fila = cursor.fetchone()
+        if fila is not None and fila[0] is not None:
+            return fila[0]
+
+        # Hacia adelante desde el último corte anterior a la fecha
+        cursor.execute('''
+            SELECT ultimoIdMovimiento, fecha, saldo FROM cortesSaldo
+            WHERE idCtaCte = ? AND fecha <= ?
+            ORDER BY fecha DESC, ultimoIdMovimiento DESC LIMIT 1
+        ''', (cuenta_id, fecha))
+        corte = cursor.fetchone()
+        if corte is not None:
+            ultimo_id, fecha_corte, saldo = corte
+            cursor.execute(f'''
+                SELECT COALESCE(SUM({_MONTO_CON_SIGNO}), 0) FROM {tabla}
+                WHERE idCtaCte = ? AND fecha >= ? AND fecha <= ? AND ID > ?
+            ''', (cuenta_id, fecha_corte, fecha, ultimo_id))
+            return saldo + cursor.fetchone()[0]
+
+        # Hacia atrás desde el primer corte posterior (o el saldo actual)
+        cursor.execute('''
+            SELECT ultimoIdMovimiento, saldo FROM cortesSaldo
+            WHERE idCtaCte = ? AND fecha > ?
+            ORDER BY fecha, ultimoIdMovimiento LIMIT 1
+        ''', (cuenta_id, fecha))
+        corte = cursor.fetchone()
+        if corte is not None:
+            ultimo_id, saldo = corte
+            cursor.execute(f'''
+                SELECT COALESCE(SUM({_MONTO_CON_SIGNO}), 0) FROM {tabla}
+                WHERE idCtaCte = ? AND fecha > ? AND ID <= ?
+            ''', (cuenta_id, fecha, ultimo_id))
+        else:
+            saldo = saldo_actual
+            cursor.execute(f'''
+                SELECT COALESCE(SUM({_MONTO_CON_SIGNO}), 0) FROM {tabla}
+                WHERE idCtaCte = ? AND fecha > ?
+            ''', (cuenta_id, fecha))
+        return saldo - cursor.fetchone()[0]
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    crear_tablas()
+    print(f"Se registraron {registrar_cortes()} cortes de saldo.")
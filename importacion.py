@@ -0,0 +1,295 @@
+import csv
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from bitacora import obtener_bitacora
+from cuenta_corriente import avanzar_secuencia_movimientos, crear_conexion, crear_tablas
+
+bitacora = obtener_bitacora('importacion')
+
+# Mismas restricciones que las tablas ctacte/movimientos
+RUT_VALIDO = re.compile(r'^\d{1,2}(\.?\d{3}){2}-[\dkK]$')
+LARGO_MAXIMO_RUT = 12
+LARGO_MAXIMO_NOMBRE = 105
+
+TAMANO_BLOQUE = 4 * 1024 * 1024
+
+
+# ==============================
+# Validación de filas
+# ==============================
+def _numero(valor, campo):
+    """Convierte un campo numérico o lanza ValueError con un mensaje claro."""
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} no es numérico: {valor!r}")
+
+
+def validar_cuenta(fila):
+    """
+    Valida una fila de cuenta (dict por nombre de columna) y retorna la tupla
+    (ID, NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta). El ID es None
+    si el archivo no lo trae.
+    """
+    rut = (fila.get('rutTitularCta') or '').strip()
+    nombre = (fila.get('nomTitularCta') or '').strip()
+    if len(rut) > LARGO_MAXIMO_RUT or not RUT_VALIDO.match(rut):
+        raise ValueError(f"RUT con formato inválido: {rut!r}")
+    if not nombre:
+        raise ValueError("El nombre del titular es obligatorio.")
+    if len(nombre) > LARGO_MAXIMO_NOMBRE:
+        raise ValueError(f"El nombre del titular supera {LARGO_MAXIMO_NOMBRE} caracteres.")
+    id_cuenta = int(fila['ID']) if fila.get('ID') else None
+    return (
+        id_cuenta,
+        _numero(fila.get('NumeroCtaCte'), 'NumeroCtaCte'),
+        rut,
+        nombre,
+        _numero(fila.get('SaldoCta') or 0, 'SaldoCta'),
+    )
+
+
+def validar_movimiento(fila):
+    """
+    Valida una fila de movimiento y retorna la tupla
+    (ID, idCtaCte, idMovimientos, tipoMovimiento, Monto, claveIdempotencia,
+    fecha, saldoResultante, descripcion). ID y saldoResultante son None si
+    el archivo no los trae.
+    """
+    try:
+        id_registro = int(fila['ID']) if fila.get('ID') else None
+        id_cuenta = int(fila.get('idCtaCte'))
+        tipo = int(fila.get('tipoMovimiento'))
+    except (TypeError, ValueError):
+        raise ValueError("ID, idCtaCte y tipoMovimiento deben ser enteros.")
+    if tipo not in (0, 1):
+        raise ValueError(f"tipoMovimiento debe ser 0 o 1: {tipo}")
+    monto = _numero(fila.get('Monto'), 'Monto')
+    if monto <= 0:
+        raise ValueError("El monto debe ser positivo.")
+    saldo = fila.get('saldoResultante')
+    return (
+        id_registro,
+        id_cuenta,
+        _numero(fila.get('idMovimientos'), 'idMovimientos'),
+        tipo,
+        monto,
+        fila.get('claveIdempotencia') or None,
+        fila.get('fecha') or None,
+        _numero(saldo, 'saldoResultante') if saldo else None,
+        fila.get('descripcion') or None,
+    )
+
+
+VALIDADORES = {
+    'cuentas': validar_cuenta,
+    'movimientos': validar_movimiento,
+}
+
+
+# ==============================
+# División del archivo en rangos de bytes
+# ==============================
+def _leer_encabezado(nombre_archivo):
+    """Retorna (columnas, posición donde empiezan los datos)."""
+    with open(nombre_archivo, 'rb') as archivo:
+        linea = archivo.readline()
+        columnas = next(csv.reader([linea.decode('utf-8-sig')]))
+        return [columna.strip() for columna in columnas], archivo.tell()
+
+
+def _rangos(inicio, fin, tamano_bloque):
+    """Divide [inicio, fin) en rangos de a lo más `tamano_bloque` bytes."""
+    rangos = []
+    while inicio < fin:
+        rangos.append((inicio, min(inicio + tamano_bloque, fin)))
+        inicio += tamano_bloque
+    return rangos
+
+
+def procesar_rango(nombre_archivo, tipo, columnas, inicio, fin):
+    """
+    Lee, parsea y valida las líneas que empiezan dentro de [inicio, fin).
+
+    Si `inicio` cae a mitad de una línea, esa línea pertenece al rango
+    anterior y se salta. Se asume un registro por línea (los campos no
+    contienen saltos de línea). Retorna (filas_validas, errores), donde cada
+    fila válida es (posición en bytes, fila) y cada error es
+    (posición en bytes, mensaje).
+    """
+    validar = VALIDADORES[tipo]
+    validas = []
+    errores = []
+    with open(nombre_archivo, 'rb') as archivo:
+        archivo.seek(inicio - 1)
+        if archivo.read(1) != b'\n':
+            archivo.readline()
+        while True:
+            posicion = archivo.tell()
+            if posicion >= fin:
+                break
+            linea = archivo.readline()
+            if not linea:
+                break
+            texto = linea.decode('utf-8').rstrip('\r\n')
+            if not texto:
+                continue
+            try:
+                valores = next(csv.reader([texto]))
+                validas.append((posicion, validar(dict(zip(columnas, valores)))))
+            except (ValueError, KeyError) as e:
+                errores.append((posicion, str(e)))
+    return validas, errores
+
+
+# ==============================
+# Escritura (un solo escritor)
+# ==============================
+def _ids_existentes(cursor, tabla, ids):
+    """Retorna cuáles de `ids` ya existen como ID en `tabla`, en una sola consulta."""
+    cursor.execute(f'SELECT ID FROM {tabla} WHERE ID IN (SELECT value FROM json_each(?))',
+                   (json.dumps(sorted(ids)),))
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def _escribir_cuentas(cursor, filas):
+    """
+    Inserta cuentas validadas, conservando el ID cuando el archivo lo trae.
+
+    Una cuenta cuyo ID ya existe (en la base o antes en el archivo) no se
+    importa y se informa como error, así que reimportar el mismo archivo es
+    seguro. Retorna la lista de errores (posición en bytes, mensaje).
+    """
+    vistos = _ids_existentes(cursor, 'ctacte', {fila[0] for _, fila in filas if fila[0] is not None})
+    con_id = []
+    sin_id = []
+    errores = []
+    for posicion, fila in filas:
+        if fila[0] is None:
+            sin_id.append(fila[1:])
+        elif fila[0] in vistos:
+            errores.append((posicion, f"La cuenta {fila[0]} ya existe."))
+        else:
+            vistos.add(fila[0])
+            con_id.append(fila)
+    cursor.executemany('''
+        INSERT INTO ctacte (ID, NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta)
+        VALUES (?, ?, ?, ?, ?)
+    ''', con_id)
+    cursor.executemany('''
+        INSERT INTO ctacte (NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta)
+        VALUES (?, ?, ?, ?)
+    ''', sin_id)
+    return errores
+
+
+def _escribir_movimientos(cursor, filas):
+    """
+    Copia movimientos validados al historial, tal como vienen en el archivo.
+
+    No toca ctacte.SaldoCta: el saldo de cada cuenta ya viene en el CSV de
+    cuentas (exportado junto con estos movimientos), así que aplicarlos de
+    nuevo lo contaría dos veces. Por lo mismo se conserva saldoResultante.
+    Para mover saldos se usa aplicar_movimientos de cuenta_corriente.py.
+
+    Como en las cuentas, el ID se conserva cuando el archivo lo trae y un
+    movimiento cuyo ID ya existe no se importa y se informa como error, así
+    que reimportar el mismo archivo es seguro. También se rechazan los
+    movimientos de cuentas inexistentes; los de claveIdempotencia ya
+    importada se ignoran. Retorna la lista de errores (posición en bytes,
+    mensaje).
+    """
+    cuentas = _ids_existentes(cursor, 'ctacte', {fila[1] for _, fila in filas})
+    vistos = _ids_existentes(cursor, 'movimientos', {fila[0] for _, fila in filas if fila[0] is not None})
+    validas = []
+    errores = []
+    for posicion, fila in filas:
+        if fila[1] not in cuentas:
+            errores.append((posicion, f"La cuenta {fila[1]} no existe."))
+        elif fila[0] in vistos:
+            errores.append((posicion, f"El movimiento {fila[0]} ya existe."))
+        else:
+            if fila[0] is not None:
+                vistos.add(fila[0])
+            validas.append(fila)
+    # Sin ID en el archivo (None), SQLite asigna el siguiente
+    cursor.executemany('''
+        INSERT OR IGNORE INTO movimientos (ID, idCtaCte, idMovimientos, tipoMovimiento, Monto, claveIdempotencia,
+                                           fecha, saldoResultante, descripcion)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', validas)
+    # Los idMovimientos importados no deben volver a entregarse (ver AsignadorIds)
+    avanzar_secuencia_movimientos(cursor)
+    return errores
+
+
+ESCRITORES = {
+    'cuentas': _escribir_cuentas,
+    'movimientos': _escribir_movimientos,
+}
+
+
+def importar_csv(nombre_archivo, tipo, nombre_bd=None, procesos=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Importa un CSV de cuentas o movimientos usando varios núcleos.
+
+    El archivo se divide en rangos de bytes que un pool de procesos parsea y
+    valida en paralelo; el proceso principal es el único escritor de SQLite y
+    confirma una transacción por bloque, en el orden del archivo. Como máximo
+    hay dos bloques por proceso en vuelo: un archivo de varios GB se importa
+    con unos pocos bloques de `tamano_bloque` bytes en memoria.
+
+    Retorna (cantidad_importada, errores), con errores como lista de
+    (posición en bytes, mensaje). Las filas inválidas, las filas con un ID
+    ya existente y los movimientos de cuentas inexistentes no se importan.
+    """
+    if tipo not in VALIDADORES:
+        raise ValueError(f"Tipo de importación desconocido: {tipo}")
+    crear_tablas(nombre_bd)
+    columnas, inicio_datos = _leer_encabezado(nombre_archivo)
+    rangos = _rangos(inicio_datos, os.path.getsize(nombre_archivo), tamano_bloque)
+    procesos = procesos or os.cpu_count() or 1
+    escribir = ESCRITORES[tipo]
+
+    importadas = 0
+    errores = []
+    con = crear_conexion(nombre_bd)
+    try:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            pendientes = deque()
+            rangos = iter(rangos)
+            for inicio, fin in rangos:
+                pendientes.append(pool.submit(procesar_rango, nombre_archivo, tipo, columnas, inicio, fin))
+                if len(pendientes) >= 2 * procesos:
+                    break
+
+            while pendientes:
+                validas, errores_bloque = pendientes.popleft().result()
+                siguiente = next(rangos, None)
+                if siguiente is not None:
+                    pendientes.append(pool.submit(procesar_rango, nombre_archivo, tipo, columnas, *siguiente))
+                antes = con.total_changes
+                with con:
+                    rechazadas = escribir(con.cursor(), validas)
+                importadas += con.total_changes - antes
+                # En el orden del archivo
+                errores.extend(sorted(errores_bloque + rechazadas))
+    finally:
+        con.close()
+
+    bitacora.info("Se importaron %s %s desde %s (%s filas con error).", importadas, tipo, nombre_archivo, len(errores))
+    return importadas, errores
+
+
+def importar_cuentas_csv(nombre_archivo='CuentasCorrientes.csv', nombre_bd=None, procesos=None):
+    """Importa cuentas desde un CSV con el formato de exportar_cuentas_csv."""
+    return importar_csv(nombre_archivo, 'cuentas', nombre_bd, procesos)
+
+
+def importar_movimientos_csv(nombre_archivo='Movimientos.csv', nombre_bd=None, procesos=None):
+    """Importa movimientos desde un CSV con el formato de exportar_movimientos_csv."""
+    return importar_csv(nombre_archivo, 'movimientos', nombre_bd, procesos)
@@ -0,0 +1,337 @@
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from collections import OrderedDict
+
+from cuenta_corriente import (AlmacenSQLite, CuentaCorriente, aplicar_movimientos,
+                              claves_transferencia, crear_tablas, transferir)
+
+TAMANO_LOTE = 500
+CUENTAS_EN_CACHE = 10000
+
+OPERACIONES = ('crear_cuenta', 'depositar', 'retirar', 'transferir', 'exportar')
+CAMPOS_ENTEROS = ('cuenta', 'origen', 'destino')
+CAMPOS_NUMERICOS = ('monto', 'id_movimiento', 'numero_cuenta', 'saldo_inicial')
+
+
+# ==============================
+# Lectura de operaciones
+# ==============================
+def _desde_csv(fila):
+    """Convierte una fila CSV (todo texto) al mismo formato que JSON Lines."""
+    operacion = {}
+    for campo, valor in fila.items():
+        if valor is None or valor == '':
+            continue
+        if campo in CAMPOS_ENTEROS:
+            valor = int(valor)
+        elif campo in CAMPOS_NUMERICOS:
+            valor = float(valor)
+        operacion[campo] = valor
+    return operacion
+
+
+def leer_operaciones(entrada, formato='jsonl'):
+    """
+    Recorre la entrada línea a línea y entrega (número de línea, operación).
+
+    Si una línea no se puede interpretar se entrega el error en lugar de la
+    operación. Nunca se carga la entrada completa en memoria.
+    """
+    if formato == 'csv':
+        lector = csv.DictReader(entrada)
+        for fila in lector:
+            try:
+                yield lector.line_num, _desde_csv(fila)
+            except ValueError as e:
+                yield lector.line_num, ValueError(f"Valor numérico inválido: {e}")
+    else:
+        for numero, linea in enumerate(entrada, start=1):
+            if not linea.strip():
+                continue
+            try:
+                yield numero, json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield numero, ValueError(f"JSON inválido: {e}")
+
+
+def _numero(operacion, campo, defecto=None):
+    """Retorna el campo si es numérico (o `defecto` si falta); si no, lanza ValueError."""
+    valor = operacion.get(campo, defecto)
+    if valor is None and defecto is None:
+        return None
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        raise ValueError(f"{campo} debe ser numérico.")
+    return valor
+
+
+def _entero(operacion, campo):
+    """Retorna el campo obligatorio si es un entero; si no, lanza ValueError (o KeyError si falta)."""
+    valor = operacion[campo]
+    if isinstance(valor, bool) or not isinstance(valor, int):
+        raise ValueError(f"{campo} debe ser un entero.")
+    return valor
+
+
+def _texto(operacion, campo, obligatorio=False):
+    """Retorna el campo si es texto (None si es opcional y falta); si no, lanza ValueError."""
+    valor = operacion[campo] if obligatorio else operacion.get(campo)
+    if valor is not None and not isinstance(valor, str):
+        raise ValueError(f"{campo} debe ser texto.")
+    return valor
+
+
+# ==============================
+# Procesamiento por lotes
+# ==============================
+class ProcesadorLotes:
+    """
+    Aplica operaciones agrupándolas en transacciones de hasta `tamano_lote`.
+
+    Las creaciones de cuentas consecutivas se registran juntas, y los
+    depósitos, retiros y transferencias consecutivos se aplican con
+    aplicar_movimientos en una sola transacción. Si el lote falla (por
+    ejemplo, por saldo insuficiente en una línea) se revierte completo y se
+    aplica operación por operación para informar el estado de cada línea.
+    El resultado de cada línea se escribe recién cuando su transacción quedó
+    confirmada, en el mismo orden de la entrada.
+    """
+
+    def __init__(self, salida, nombre_bd=None, tamano_lote=TAMANO_LOTE):
+        crear_tablas(nombre_bd)
+        self.salida = salida
+        self.nombre_bd = nombre_bd
+        self.tamano_lote = tamano_lote
+        self.almacen = AlmacenSQLite(nombre_bd, reutilizar_conexiones=True)
+        self._cuentas = OrderedDict()
+        self._pendientes = []
+        self.resumen = {'ok': 0, 'error': 0}
+
+    # ------------------------------
+    # Resultados
+    # ------------------------------
+    def _emitir(self, linea, resultado=None, error=None):
+        if error is None:
+            registro = {'linea': linea, 'estado': 'ok'}
+            registro.update(resultado or {})
+            self.resumen['ok'] += 1
+        else:
+            registro = {'linea': linea, 'estado': 'error', 'error': error}
+            self.resumen['error'] += 1
+        self.salida.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    # ------------------------------
+    # Cuentas (caché acotado)
+    # ------------------------------
+    def _cuenta(self, id_cuenta):
+        cuenta = self._cuentas.get(id_cuenta)
+        if cuenta is not None:
+            self._cuentas.move_to_end(id_cuenta)
+            return cuenta
+        cuenta = CuentaCorriente.cargar(id_cuenta, self.nombre_bd, self.almacen)
+        if cuenta is None:
+            raise ValueError(f"La cuenta {id_cuenta} no existe.")
+        self._recordar(cuenta)
+        return cuenta
+
+    def _recordar(self, cuenta):
+        self._cuentas[cuenta.id] = cuenta
+        if len(self._cuentas) > CUENTAS_EN_CACHE:
+            self._cuentas.popitem(last=False)
+
+    # ------------------------------
+    # Entrada
+    # ------------------------------
+    def procesar(self, linea, operacion):
+        """Recibe una operación; aplica el lote cuando se llena."""
+        if isinstance(operacion, Exception):
+            self.vaciar()
+            self._emitir(linea, error=str(operacion))
+            return
+        tipo = operacion.get('op') if isinstance(operacion, dict) else None
+        if tipo not in OPERACIONES:
+            self.vaciar()
+            self._emitir(linea, error=f"Operación desconocida: {tipo!r}")
+            return
+        if tipo == 'exportar':
+            # Lo anterior debe quedar aplicado antes de exportar
+            self.vaciar()
+            self._exportar(linea, operacion)
+            return
+        self._pendientes.append((linea, operacion))
+        if len(self._pendientes) >= self.tamano_lote:
+            self.vaciar()
+
+    def vaciar(self):
+        """Aplica las operaciones pendientes, en grupos consecutivos del mismo tipo."""
+        pendientes, self._pendientes = self._pendientes, []
+        grupo = []
+        for linea, operacion in pendientes:
+            if grupo and (operacion['op'] == 'crear_cuenta') != (grupo[0][1]['op'] == 'crear_cuenta'):
+                self._aplicar_grupo(grupo)
+                grupo = []
+            grupo.append((linea, operacion))
+        if grupo:
+            self._aplicar_grupo(grupo)
+        self.salida.flush()
+
+    def _aplicar_grupo(self, grupo):
+        if grupo[0][1]['op'] == 'crear_cuenta':
+            self._crear_cuentas(grupo)
+        else:
+            self._aplicar_movimientos(grupo)
+
+    # ------------------------------
+    # Operaciones
+    # ------------------------------
+    def _emitir_grupo(self, grupo, resultados):
+        """Escribe los resultados de un grupo en el orden original de las líneas."""
+        for linea, _ in grupo:
+            resultado, error = resultados[linea]
+            self._emitir(linea, resultado, error)
+
+    def _crear_cuentas(self, grupo):
+        resultados = {}
+        validas = []
+        for linea, operacion in grupo:
+            try:
+                if 'numero_cuenta' not in operacion:
+                    raise KeyError('numero_cuenta')
+                datos = (_numero(operacion, 'numero_cuenta'), _texto(operacion, 'rut_titular', True),
+                         _texto(operacion, 'nombre_titular', True), _numero(operacion, 'saldo_inicial', 0.0))
+                validas.append((linea, datos))
+            except KeyError as e:
+                resultados[linea] = (None, f"Falta el campo {e}.")
+            except ValueError as e:
+                resultados[linea] = (None, str(e))
+        try:
+            cuentas = CuentaCorriente.crear_varias([datos for _, datos in validas], self.nombre_bd, self.almacen)
+        except sqlite3.IntegrityError:
+            # Alguna fila viola una restricción: se crean de a una
+            cuentas = []
+            for linea, datos in validas:
+                try:
+                    cuentas.append(CuentaCorriente.crear_varias([datos], self.nombre_bd, self.almacen)[0])
+                except sqlite3.IntegrityError as e:
+                    cuentas.append(None)
+                    resultados[linea] = (None, str(e))
+        for (linea, _), cuenta in zip(validas, cuentas):
+            if cuenta is not None:
+                self._recordar(cuenta)
+                resultados[linea] = ({'id': cuenta.id}, None)
+        self._emitir_grupo(grupo, resultados)
+
+    def _tramos(self, operacion):
+        """Traduce una operación a tramos (cuenta, tipo, monto, id_movimiento, clave, descripcion)."""
+        monto = operacion['monto']
+        if isinstance(monto, bool) or not isinstance(monto, (int, float)) or monto <= 0:
+            raise ValueError("El monto debe ser un número positivo.")
+        id_movimiento = _numero(operacion, 'id_movimiento')
+        clave = _texto(operacion, 'clave_idempotencia')
+        descripcion = _texto(operacion, 'descripcion')
+        if operacion['op'] == 'transferir':
+            origen = self._cuenta(_entero(operacion, 'origen'))
+            destino = self._cuenta(_entero(operacion, 'destino'))
+            if origen.id == destino.id:
+                raise ValueError("La cuenta de origen y destino deben ser distintas.")
+            if id_movimiento is None:
+                # Ambos tramos de una transferencia comparten el ID asignado
+                id_movimiento = self.almacen.nuevo_id_movimiento()
+            clave_origen, clave_destino = claves_transferencia(clave, 1)[0]
+            return [(origen, 0, monto, id_movimiento, clave_origen, descripcion),
+                    (destino, 1, monto, id_movimiento, clave_destino, descripcion)]
+        cuenta = self._cuenta(_entero(operacion, 'cuenta'))
+        if id_movimiento is None:
+            id_movimiento = self.almacen.nuevo_id_movimiento()
+        tipo = 1 if operacion['op'] == 'depositar' else 0
+        return [(cuenta, tipo, monto, id_movimiento, clave, descripcion)]
+
+    @staticmethod
+    def _resultado(operacion, ids):
+        if operacion['op'] == 'transferir':
+            return {'ids_registro': ids}
+        return {'id_registro': ids[0]}
+
+    def _aplicar_movimientos(self, grupo):
+        resultados = {}
+        preparadas = []
+        for linea, operacion in grupo:
+            try:
+                preparadas.append((linea, operacion, self._tramos(operacion)))
+            except KeyError as e:
+                resultados[linea] = (None, f"Falta el campo {e}.")
+            except ValueError as e:
+                resultados[linea] = (None, str(e))
+
+        try:
+            ids = aplicar_movimientos([tramo for _, _, tramos in preparadas for tramo in tramos])
+            posicion = 0
+            for linea, operacion, tramos in preparadas:
+                resultados[linea] = (self._resultado(operacion, ids[posicion:posicion + len(tramos)]), None)
+                posicion += len(tramos)
+        except ValueError:
+            # El lote se revirtió completo: se aplica cada operación por separado
+            for linea, operacion, tramos in preparadas:
+                try:
+                    if operacion['op'] == 'transferir':
+                        ids = list(transferir(tramos[0][0], tramos[1][0], operacion['monto'],
+                                              tramos[0][3], operacion.get('clave_idempotencia'),
+                                              operacion.get('descripcion')))
+                    else:
+                        ids = aplicar_movimientos(tramos)
+                    resultados[linea] = (self._resultado(operacion, ids), None)
+                except ValueError as e:
+                    resultados[linea] = (None, str(e))
+        self._emitir_grupo(grupo, resultados)
+
+    def _exportar(self, linea, operacion):
+        tipo = operacion.get('tipo')
+        try:
+            archivo = _texto(operacion, 'archivo')
+            if tipo == 'cuentas':
+                CuentaCorriente.exportar_cuentas_csv(archivo or 'CuentasCorrientes.csv', self.nombre_bd)
+            elif tipo == 'movimientos':
+                CuentaCorriente.exportar_movimientos_csv(archivo or 'Movimientos.csv', self.nombre_bd)
+            elif tipo == 'instantanea':
+                CuentaCorriente.exportar_instantanea(nombre_bd=self.nombre_bd)
+            else:
+                raise ValueError("tipo debe ser 'cuentas', 'movimientos' o 'instantanea'.")
+        except (ValueError, OSError) as e:
+            self._emitir(linea, error=str(e))
+            return
+        self._emitir(linea)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(
+        description="Aplica un flujo de operaciones (una por línea, JSON Lines o CSV) sobre las cuentas corrientes."
+    )
+    parser.add_argument('entrada', nargs='?', default='-', help="Archivo de operaciones ('-' = entrada estándar)")
+    parser.add_argument('--formato', choices=('jsonl', 'csv'), help="Por defecto según la extensión (jsonl si es stdin)")
+    parser.add_argument('--salida', default='-', help="Archivo de resultados ('-' = salida estándar)")
+    parser.add_argument('--bd', default=None, help="Archivo de base de datos")
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Operaciones por transacción")
+    argumentos = parser.parse_args(argumentos)
+
+    formato = argumentos.formato or ('csv' if argumentos.entrada.lower().endswith('.csv') else 'jsonl')
+    entrada = sys.stdin if argumentos.entrada == '-' else open(argumentos.entrada, newline='', encoding='utf-8')
+    salida = sys.stdout if argumentos.salida == '-' else open(argumentos.salida, 'w', encoding='utf-8')
+    try:
+        procesador = ProcesadorLotes(salida, argumentos.bd, argumentos.lote)
+        for linea, operacion in leer_operaciones(entrada, formato):
+            procesador.procesar(linea, operacion)
+        procesador.vaciar()
+    finally:
+        if entrada is not sys.stdin:
+            entrada.close()
+        if salida is not sys.stdout:
+            salida.close()
+    print(f"Operaciones exitosas: {procesador.resumen['ok']}, con error: {procesador.resumen['error']}.",
+          file=sys.stderr)
+    return 0 if procesador.resumen['error'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
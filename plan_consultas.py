@@ -0,0 +1,422 @@
+import argparse
+import contextlib
+import datetime
+import os
+import random
+import re
+import runpy
+import sqlite3
+import sys
+import tempfile
+from urllib.parse import quote
+
+from cuenta_corriente import crear_conexion, crear_tablas
+
+# Tamaño del conjunto de datos de la auditoría: con tablas chicas SQLite
+# puede preferir recorrerlas, así que los planes se obtienen a escala
+CUENTAS = 10000
+MOVIMIENTOS = 200000
+
+# Solo estas sentencias tienen un plan que revisar
+_ORDENES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+_FILTRO = re.compile(r'\bWHERE\b', re.IGNORECASE)
+_LIMITE = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+# Sentencias que preparan la conexión (bases adjuntas, tablas y vistas
+# temporales): se repiten antes de planificar las consultas que vienen después
+_PREPARACION = re.compile(r'^\s*(?:ATTACH\b.*\bAS\s+(\w+)\s*$|CREATE\s+TEMP(?:ORARY)?\b)',
+                          re.IGNORECASE | re.DOTALL)
+_DESADJUNTAR = re.compile(r'^\s*DETACH\s+(?:DATABASE\s+)?(\w+)', re.IGNORECASE)
+# Tablas internas de SQLite: siempre chicas
+_INTERNAS = ('sqlite_master', 'sqlite_schema', 'sqlite_sequence', 'sqlite_stat1')
+
+# Consultas que recorren una tabla o la ordenan a propósito: fragmento de la
+# consulta normalizada (ver normalizar) -> motivo
+PERMITIDAS = {
+    'INSERT INTO cortesSaldo': "registrar_cortes revisa todas las cuentas; es un proceso periódico",
+    'FROM movimientos WHERE fecha IS NOT NULL':
+        "reporte de analitica sobre todos los movimientos; el filtro solo descarta los sin fecha",
+    'ORDER BY movimientos_fts.rank': "la relevancia (bm25) se calcula para cada coincidencia antes de ordenar",
+    'ORDER BY SaldoCta DESC LIMIT':
+        "un índice por saldo se actualizaría en cada movimiento; el ranking es un reporte ocasional",
+    'FROM temp.lote_archivo l CROSS JOIN':
+        "archivado recorre su lote temporal (a lo más TAMANO_LOTE filas) y busca cada ID en el archivo",
+}
+
+
+def normalizar(consulta):
+    """Consulta con los literales reemplazados por ? y los espacios colapsados: agrupa las repeticiones."""
+    return ' '.join(_LITERALES.sub('?', consulta).split())
+
+
+# ==============================
+# Captura
+# ==============================
+@contextlib.contextmanager
+def capturar():
+    """
+    Registra cada sentencia SQL que ejecuta este proceso mientras dura el
+    bloque, sin importar qué módulo abre la conexión (reemplaza
+    sqlite3.connect y usa set_trace_callback).
+
+    Entrega un diccionario {(base, consulta normalizada): (consulta, origen,
+    preparacion)} con la primera ejecución de cada consulta, donde `base`
+    es el argumento con que se abrió la conexión (None para bases en
+    memoria), `origen` es 'archivo:línea' de quien la ejecutó y
+    `preparacion` las sentencias ATTACH y CREATE TEMP que la conexión
+    había ejecutado antes (y siguen vigentes).
+    """
+    consultas = {}
+    conectar = sqlite3.connect
+
+    def conectar_con_traza(database, *args, **kwargs):
+        con = conectar(database, *args, **kwargs)
+        base = _ruta_de(database, kwargs.get('uri', False))
+        preparacion = []
+        con.set_trace_callback(lambda consulta: _registrar(consultas, base, consulta, preparacion))
+        return con
+
+    sqlite3.connect = conectar_con_traza
+    try:
+        yield consultas
+    finally:
+        sqlite3.connect = conectar
+
+
+def _ruta_de(database, uri):
+    """URI de solo lectura para volver a abrir la base, o None si es en memoria."""
+    database = os.fspath(database)
+    if uri:
+        return None if 'mode=memory' in database else database
+    if database in ('', ':memory:'):
+        return None
+    return f"file:{quote(os.path.abspath(database))}?mode=ro"
+
+
+def _registrar(consultas, base, consulta, preparacion):
+    # `preparacion` guarda (esquema adjuntado o None, sentencia)
+    preparatoria = _PREPARACION.match(consulta)
+    if preparatoria:
+        esquema = preparatoria.group(1)
+        preparacion.append((esquema and esquema.lower(), consulta))
+        return
+    desadjuntada = _DESADJUNTAR.match(consulta)
+    if desadjuntada:
+        esquema = desadjuntada.group(1).lower()
+        preparacion[:] = [(nombre, sentencia) for nombre, sentencia in preparacion if nombre != esquema]
+        return
+    # Las líneas de los triggers llegan como comentarios
+    if not consulta.lstrip().upper().startswith(_ORDENES):
+        return
+    clave = (base, normalizar(consulta))
+    if clave not in consultas:
+        consultas[clave] = (consulta, _origen(), tuple(sentencia for _, sentencia in preparacion))
+
+
+def _origen():
+    """'archivo:línea' del primer marco fuera de este módulo."""
+    marco = sys._getframe(1)
+    while marco is not None and marco.f_code.co_filename == __file__:
+        marco = marco.f_back
+    if marco is None:
+        return '?'
+    return f"{os.path.basename(marco.f_code.co_filename)}:{marco.f_lineno}"
+
+
+# ==============================
+# Análisis de planes
+# ==============================
+def problemas_del_plan(plan, consulta, parciales=()):
+    """
+    Revisa las filas de EXPLAIN QUERY PLAN (id, padre, _, detalle) de una
+    consulta y retorna los pasos problemáticos:
+    - Recorrer una tabla (SCAN, con o sin índice de cobertura) cuando la
+      consulta filtra con WHERE, o recorrer una segunda tabla dentro del
+      mismo SELECT (un recorrido completo por cada fila de la primera).
+      Recorrer un índice parcial (`parciales`) no cuenta: solo contiene
+      las filas que cumplen su condición.
+    - Ordenar o agrupar en un B-tree temporal (USE TEMP B-TREE) en una
+      consulta con LIMIT: con un índice en ese orden SQLite se detendría en
+      las primeras filas, en vez de leer y ordenar todas las candidatas.
+    Leer o agregar una tabla completa sin filtro (exportaciones, reportes)
+    no es un problema: no hay índice que lo evite. Tampoco lo es ordenar
+    sin LIMIT lo que entregó una búsqueda por índice: son las filas que
+    la consulta debe leer de todas formas.
+    """
+    filtra = _FILTRO.search(consulta) is not None
+    limita = _LIMITE.search(consulta) is not None
+    # Las subconsultas y CTE también aparecen como SCAN, pero no son tablas
+    subconsultas = {detalle.split()[1] for _, _, _, detalle in plan
+                    if detalle.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    recorridas = {}
+    problemas = []
+    for _, padre, _, detalle in plan:
+        if detalle.startswith('SCAN '):
+            tabla = detalle.split()[1]
+            if (tabla == 'CONSTANT' or tabla in subconsultas or tabla.startswith('(') or tabla in _INTERNAS
+                    or 'VIRTUAL TABLE' in detalle or detalle.split(' INDEX ')[-1] in parciales):
+                continue
+            recorridas[padre] = recorridas.get(padre, 0) + 1
+            if filtra or recorridas[padre] > 1:
+                problemas.append(detalle)
+        elif detalle.startswith('USE TEMP B-TREE') and limita:
+            problemas.append(detalle)
+    return problemas
+
+
+def permitida(consulta):
+    """Retorna el motivo si la consulta está en PERMITIDAS, o None."""
+    normalizada = normalizar(consulta)
+    for fragmento, motivo in PERMITIDAS.items():
+        if fragmento in normalizada:
+            return motivo
+    return None
+
+
+def analizar(consultas):
+    """
+    Obtiene el plan de cada consulta capturada, sobre la misma base en que
+    se ejecutó y con las mismas bases adjuntas y tablas temporales, y
+    retorna una lista de diccionarios con 'base', 'consulta', 'origen',
+    'plan' (detalles), 'problemas' y 'motivo' (de PERMITIDAS). Las
+    consultas que aun así no se pueden volver a planificar quedan con
+    'error'.
+    """
+    conexiones = {}
+    resultados = []
+    try:
+        for (base, _), (consulta, origen, preparacion) in consultas.items():
+            resultado = {'base': base, 'consulta': consulta, 'origen': origen,
+                         'plan': [], 'problemas': [], 'motivo': None, 'error': None}
+            resultados.append(resultado)
+            if base is None:
+                resultado['error'] = 'base en memoria'
+                continue
+            try:
+                if (base, preparacion) not in conexiones:
+                    con = sqlite3.connect(base, uri=True)
+                    conexiones[base, preparacion] = con, _indices_parciales(con)
+                    for sentencia in preparacion:
+                        con.execute(sentencia)
+                con, parciales = conexiones[base, preparacion]
+                plan = con.execute('EXPLAIN QUERY PLAN ' + consulta).fetchall()
+            except sqlite3.Error as e:
+                resultado['error'] = str(e)
+                continue
+            resultado['plan'] = [fila[3] for fila in plan]
+            resultado['problemas'] = problemas_del_plan(plan, consulta, parciales)
+            if resultado['problemas']:
+                resultado['motivo'] = permitida(consulta)
+    finally:
+        for con, _ in conexiones.values():
+            con.close()
+    return resultados
+
+
+def _indices_parciales(con):
+    """Nombres de los índices con WHERE (parciales) de la base."""
+    return {nombre for nombre, sql in con.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'")
+            if sql and _FILTRO.search(sql)}
+
+
+# ==============================
+# Datos y carga de trabajo
+# ==============================
+def poblar(nombre_bd, cuentas=CUENTAS, movimientos=MOVIMIENTOS, semilla=0):
+    """
+    Llena una base nueva con `cuentas` cuentas y `movimientos` movimientos
+    repartidos en dos años, con saldos consistentes, y ejecuta ANALYZE para
+    que el planificador conozca el tamaño de las tablas.
+    """
+    azar = random.Random(semilla)
+    palabras = ['Pago', 'servicios', 'Sueldo', 'Arriendo', 'Transferencia', 'Compra', 'supermercado', 'Depósito']
+    crear_tablas(nombre_bd)
+    inicio = datetime.datetime(2024, 1, 1)
+    segundos = 2 * 365 * 24 * 3600
+    with crear_conexion(nombre_bd) as con:
+        con.executemany(
+            'INSERT INTO ctacte (ID, NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta) VALUES (?, ?, ?, ?, 0)',
+            ((i, 100000 + i, f"{10000000 + i}-{i % 10}", f"Titular {azar.choice(palabras)} {i}")
+             for i in range(1, cuentas + 1))
+        )
+        instantes = sorted(azar.randrange(segundos) for _ in range(movimientos))
+        saldos = [0.0] * (cuentas + 1)
+        filas = []
+        for id_registro, instante in enumerate(instantes, 1):
+            id_cuenta = azar.randint(1, cuentas)
+            tipo = 1 if saldos[id_cuenta] < 100 or azar.random() < 0.6 else 0
+            monto = float(azar.randint(1, 100))
+            saldos[id_cuenta] += monto if tipo == 1 else -monto
+            fecha = (inicio + datetime.timedelta(seconds=instante)).strftime("%Y-%m-%d %H:%M:%S")
+            filas.append((id_registro, id_cuenta, id_registro, tipo, monto, f"carga-{id_registro}", fecha,
+                          saldos[id_cuenta], f"{azar.choice(palabras)} {azar.choice(palabras)}"))
+        con.executemany('''
+            INSERT INTO movimientos (ID, idCtaCte, idMovimientos, tipoMovimiento, Monto,
+                                     claveIdempotencia, fecha, saldoResultante, descripcion)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', filas)
+        con.executemany('UPDATE ctacte SET SaldoCta = ? WHERE ID = ?',
+                        ((saldo, id_cuenta) for id_cuenta, saldo in enumerate(saldos) if id_cuenta))
+        con.execute('ANALYZE')
+
+
+def ejecutar_operaciones(nombre_bd, carpeta):
+    """
+    Ejecuta sobre `nombre_bd` cada operación de los módulos del proyecto que
+    consulta la base: cuentas y movimientos, exportaciones, historial,
+    búsquedas, reportes, réplica, importación y archivado. Los archivos
+    que generan quedan en `carpeta`.
+    """
+    import analitica
+    import archivado
+    import busqueda
+    import exportadores
+    import historial_saldos
+    import importacion
+    import replica
+    from cuenta_corriente import CuentaCorriente, aplicar_movimientos, transferir, transferir_lote
+    from fragmentacion import AlmacenFragmentado
+    from saldos_diferidos import crear_almacen, recuperar_saldos
+
+    def ruta(nombre):
+        return os.path.join(carpeta, nombre)
+
+    # Cuentas y movimientos
+    origen = CuentaCorriente(900001, '11111111-1', 'Auditoría Origen', 1000.0, nombre_bd)
+    destino = CuentaCorriente.cargar(1, nombre_bd)
+    otras = CuentaCorriente.crear_varias([(900002, '22222222-2', 'Auditoría Lote', 0.0)], nombre_bd)
+    origen.depositar(10.0, clave_idempotencia='auditoria-deposito')
+    origen.depositar(10.0, clave_idempotencia='auditoria-deposito')
+    origen.retirar(5.0, descripcion='Retiro auditoría')
+    transferir(origen, destino, 1.0)
+    transferir_lote(origen, [(destino, 1.0), (otras[0], 2.0)])
+    aplicar_movimientos([(origen, 1, 3.0, None, None), (destino, 0, 1.0, None, 'auditoria-lote')])
+    diferido = crear_almacen(nombre_bd, 'al_cerrar')
+    CuentaCorriente.cargar(2, almacen=diferido).depositar(4.0)
+    diferido.cerrar()
+    recuperar_saldos(nombre_bd)
+
+    # Exportaciones
+    CuentaCorriente.exportar_cuentas_csv(ruta('CuentasCorrientes.csv'), nombre_bd)
+    CuentaCorriente.exportar_movimientos_csv(ruta('Movimientos.csv'), nombre_bd)
+    CuentaCorriente.exportar_movimientos_incremental(ruta('Incremental.csv'), nombre_bd=nombre_bd)
+    CuentaCorriente.exportar_instantanea(ruta('Cuentas.csv'), ruta('Instantanea.csv'), ruta('Exportacion.json'),
+                                         nombre_bd)
+    exportadores.exportar('movimientos', {ruta('Movimientos.jsonl'): 'jsonl'}, donde='fecha >= ?',
+                          parametros=('2025-12-01',), nombre_bd=nombre_bd)
+    exportadores.exportar_movimientos_detalle({ruta('MovimientosDetalle.csv'): 'csv'}, nombre_bd)
+
+    # Historial de saldos
+    historial_saldos.registrar_cortes(nombre_bd, movimientos_por_corte=10)
+    historial_saldos.completar_saldos_resultantes(nombre_bd)
+    historial_saldos.estado_de_cuenta(1, '2024-03-01', '2024-06-30', nombre_bd)
+    historial_saldos.saldo_al(1, '2024-06-30', nombre_bd)
+    # Sin saldoResultante, saldo_al parte de los cortes
+    with crear_conexion(nombre_bd) as con:
+        con.execute('UPDATE movimientos SET saldoResultante = NULL WHERE idCtaCte = 3')
+    historial_saldos.saldo_al(3, '2024-06-30', nombre_bd)
+    historial_saldos.saldo_al(3, '2024-01-01', nombre_bd)
+    historial_saldos.completar_saldos_resultantes(nombre_bd)
+
+    # Búsquedas
+    busqueda.crear_indice_descripciones(nombre_bd)
+    busqueda.buscar_movimientos('pago serv', cuenta_id=1, desde='2024-01-01', hasta='2025-12-31', nombre_bd=nombre_bd)
+    busqueda.crear_indice_titulares(nombre_bd)
+    busqueda.buscar_titulares('Titular Sueldo', nombre_bd=nombre_bd)
+    busqueda.buscar_titulares('Titlar Suedlo', nombre_bd=nombre_bd)
+    busqueda.buscar_rut('10.000.01', nombre_bd=nombre_bd)
+
+    # Reportes
+    analitica.distribucion_saldos(nombre_bd=nombre_bd)
+    analitica.top_cuentas(nombre_bd=nombre_bd)
+    analitica.totales_por_tipo(nombre_bd=nombre_bd)
+    analitica.velocidad(nombre_bd=nombre_bd)
+
+    # Fragmentos
+    fragmentado = AlmacenFragmentado(2, ruta('Fragmentos.db'))
+    cuenta = fragmentado.crear_cuenta(500001, '33333333-3', 'Auditoría Fragmento', 10.0)
+    cuenta.depositar(1.0)
+    fragmentado.buscar_cuenta(500001)
+    fragmentado.buscar_por_id(cuenta.id)
+    fragmentado.buscar_por_rut('33333333-3')
+    fragmentado.movimientos_de(500001)
+    fragmentado.resumen()
+    fragmentado.cuentas_mayor_saldo()
+    fragmentado.exportar_movimientos_csv(ruta('MovimientosFragmentos.csv'))
+
+    # Réplica e importación
+    replica.crear_snapshot(nombre_bd, ruta('Replica.db'))
+    replica.exportar_desde_replica(ruta('Replica.db'), ruta('CuentasReplica.csv'), ruta('MovimientosReplica.csv'))
+    importacion.importar_cuentas_csv(ruta('CuentasCorrientes.csv'), ruta('Importada.db'), procesos=2)
+
+    # Archivado (al final: saca movimientos de la base)
+    archivado.archivar_movimientos('2024-02-01', nombre_bd)
+
+
+def ejecutar_script(ruta, carpeta):
+    """
+    Ejecuta un script del proyecto (por ejemplo 'Prueba 5.py') como
+    programa principal dentro de `carpeta`, donde crea su propia base y
+    sus archivos.
+    """
+    ruta = os.path.abspath(ruta)
+    anterior = os.getcwd()
+    os.chdir(carpeta)
+    try:
+        runpy.run_path(ruta, run_name='__main__')
+    finally:
+        os.chdir(anterior)
+
+
+def auditar(cuentas=CUENTAS, movimientos=MOVIMIENTOS, scripts=()):
+    """
+    Crea una base de prueba con `cuentas` y `movimientos`, ejecuta sobre
+    ella todas las operaciones del proyecto (ver ejecutar_operaciones) y
+    cada uno de los `scripts`, y analiza el plan de cada consulta
+    distinta que se ejecutó. Todo ocurre en una carpeta temporal.
+    Retorna la lista de analizar().
+    """
+    with tempfile.TemporaryDirectory() as carpeta:
+        nombre_bd = os.path.join(carpeta, 'Auditoria.db')
+        poblar(nombre_bd, cuentas, movimientos)
+        with capturar() as consultas:
+            ejecutar_operaciones(nombre_bd, carpeta)
+            for numero, script in enumerate(scripts):
+                carpeta_script = os.path.join(carpeta, f"script_{numero}")
+                os.mkdir(carpeta_script)
+                ejecutar_script(script, carpeta_script)
+        return analizar(consultas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Revisa con EXPLAIN QUERY PLAN cada consulta del proyecto sobre una base de prueba."
+    )
+    parser.add_argument('scripts', nargs='*', help="scripts a ejecutar además de los módulos (p. ej. 'Prueba 5.py')")
+    parser.add_argument('--cuentas', type=int, default=CUENTAS)
+    parser.add_argument('--movimientos', type=int, default=MOVIMIENTOS)
+    parser.add_argument('--detalle', action='store_true', help="muestra el plan de todas las consultas")
+    args = parser.parse_args(argv)
+
+    resultados = auditar(args.cuentas, args.movimientos, args.scripts)
+    # Una consulta sin plan no quedó auditada; solo las bases en memoria no se pueden volver a abrir
+    sin_plan = [r for r in resultados if r['error']]
+    fallidas = [r for r in resultados if (r['problemas'] and r['motivo'] is None)
+                or (r['error'] and r['base'] is not None)]
+    for resultado in resultados:
+        if resultado in fallidas or args.detalle:
+            estado = 'FALLA' if resultado in fallidas else ('SIN PLAN' if resultado['error'] else 'OK')
+            print(f"[{estado}] {resultado['origen']}: {normalizar(resultado['consulta'])}")
+            for paso in resultado['plan']:
+                print(f"    {'!! ' if paso in resultado['problemas'] else ''}{paso}")
+            if resultado['error']:
+                print(f"    {resultado['error']}")
+            if resultado['motivo'] and args.detalle:
+                print(f"    permitida: {resultado['motivo']}")
+    print(f"{len(resultados)} consultas analizadas ({len(sin_plan)} sin plan), "
+          f"{len(fallidas)} con recorridos o B-trees temporales no esperados o sin plan.")
+    return 1 if fallidas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
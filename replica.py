@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import time
+
+from bitacora import configurar
+from cuenta_corriente import DB_NAME, CuentaCorriente, crear_conexion, crear_tablas
+
+REPLICA_NAME = "MovimientosYCtaCte_reportes.db"
+
+# Páginas copiadas por paso y pausa entre pasos: entre pasos el respaldo
+# suelta el bloqueo de lectura y las escrituras del primario siguen.
+PAGINAS_POR_PASO = 256
+PAUSA_ENTRE_PASOS = 0.005
+
+
+def crear_snapshot(nombre_bd=None, nombre_replica=REPLICA_NAME,
+                   paginas_por_paso=PAGINAS_POR_PASO, pausa=PAUSA_ENTRE_PASOS):
+    """
+    Copia la base de datos viva a una réplica para reportes.
+
+    Usa la API de respaldo en línea de SQLite (`Connection.backup`) copiando
+    `paginas_por_paso` páginas a la vez, por lo que nunca mantiene un bloqueo
+    largo sobre el primario. Si el primario cambia durante la copia, SQLite
+    reinicia el respaldo, de modo que la réplica siempre queda consistente
+    (con escrituras muy frecuentes conviene subir `paginas_por_paso`, o usar
+    -1 con el primario en modo WAL, para que la copia alcance a terminar).
+    La copia se hace en un archivo temporal que luego reemplaza a la réplica,
+    así los lectores nunca ven una réplica a medio copiar.
+    """
+    temporal = nombre_replica + '.tmp'
+    origen = crear_conexion(nombre_bd)
+    destino = sqlite3.connect(temporal)
+    try:
+        origen.backup(destino, pages=paginas_por_paso, sleep=pausa)
+    finally:
+        destino.close()
+        origen.close()
+    os.replace(temporal, nombre_replica)
+    return nombre_replica
+
+
+def conexion_replica(nombre_replica=REPLICA_NAME):
+    """Abre la réplica en modo solo lectura (mode=ro)."""
+    if not os.path.exists(nombre_replica):
+        raise FileNotFoundError(f"No existe la réplica {nombre_replica}; ejecute crear_snapshot().")
+    return sqlite3.connect(f"file:{nombre_replica}?mode=ro", uri=True)
+
+
+def antiguedad_replica(nombre_replica=REPLICA_NAME):
+    """Retorna los segundos transcurridos desde el último snapshot."""
+    return time.time() - os.path.getmtime(nombre_replica)
+
+
+def exportar_desde_replica(nombre_replica=REPLICA_NAME,
+                           archivo_cuentas='CuentasCorrientes.csv',
+                           archivo_movimientos='Movimientos.csv'):
+    """
+    Exporta cuentas y movimientos leyendo la réplica en vez del primario.
+
+    Las exportaciones largas dejan de retener bloqueos sobre el archivo en
+    el que escriben depositar/retirar.
+    """
+    replica = f"file:{nombre_replica}?mode=ro"
+    CuentaCorriente.exportar_cuentas_csv(archivo_cuentas, nombre_bd=replica)
+    CuentaCorriente.exportar_movimientos_csv(archivo_movimientos, nombre_bd=replica)
+
+
+if __name__ == "__main__":
+    configurar(formato='texto', muestreo=None)
+    crear_tablas(DB_NAME)
+    crear_snapshot(DB_NAME)
+    exportar_desde_replica()
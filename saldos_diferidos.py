@@ -0,0 +1,206 @@
+import atexit
+import threading
+import time
+
+from cuenta_corriente import AlmacenSQLite, con_reintentos, transaccion_escritura
+
+# Modos de durabilidad del saldo de las cuentas (los movimientos se
+# confirman siempre en su propia transacción):
+# - inmediata: cada transacción escribe también el saldo (AlmacenSQLite).
+# - por_lotes: los saldos se escriben cada INTERVALO_VACIADO segundos o al
+#   acumular MAXIMO_PENDIENTES cuentas con saldo pendiente.
+# - al_cerrar: los saldos se escriben solo con vaciar() o al terminar el proceso.
+DURABILIDADES = ('inmediata', 'por_lotes', 'al_cerrar')
+INTERVALO_VACIADO = 1.0
+MAXIMO_PENDIENTES = 1000
+
+# Fila de `secuencias` con el primer movimiento cuyo saldo podría no estar en ctacte
+SECUENCIA_SALDOS = 'saldos'
+
+
+def materializar_saldos(cursor):
+    """
+    Lleva a ctacte el saldo de cada cuenta con movimientos posteriores al
+    último vaciado, tomándolo del `saldoResultante` de su último movimiento.
+    Retorna la cantidad de cuentas corregidas.
+    """
+    cursor.execute('SELECT siguiente FROM secuencias WHERE nombre = ?', (SECUENCIA_SALDOS,))
+    fila = cursor.fetchone()
+    desde = fila[0] if fila else 0
+    # Con MAX(ID), SQLite toma saldoResultante de la misma fila. El + evita
+    # que agrupe recorriendo el índice por cuenta (toda la tabla) en vez de
+    # leer solo desde `desde` por la clave primaria.
+    cursor.execute('''
+        UPDATE ctacte SET SaldoCta = ultimo.saldo
+        FROM (
+            SELECT idCtaCte, saldoResultante AS saldo, MAX(ID)
+            FROM movimientos WHERE ID >= ? GROUP BY +idCtaCte
+        ) AS ultimo
+        WHERE ctacte.ID = ultimo.idCtaCte AND ultimo.saldo IS NOT NULL AND ctacte.SaldoCta <> ultimo.saldo
+    ''', (desde,))
+    corregidas = cursor.rowcount
+    _marcar_vaciado(cursor)
+    return corregidas
+
+
+def _marcar_vaciado(cursor):
+    """Registra que ctacte refleja todos los movimientos confirmados hasta ahora."""
+    cursor.execute('''
+        INSERT INTO secuencias (nombre, siguiente)
+        VALUES (?, (SELECT COALESCE(MAX(ID), 0) + 1 FROM movimientos))
+        ON CONFLICT(nombre) DO UPDATE SET siguiente = excluded.siguiente
+    ''', (SECUENCIA_SALDOS,))
+
+
+def recuperar_saldos(nombre_bd=None, con=None):
+    """
+    Reconstruye los saldos de ctacte desde los movimientos, después de una
+    caída con saldos sin escribir (durabilidad por_lotes o al_cerrar).
+
+    Solo recorre los movimientos posteriores al último vaciado. Es seguro
+    ejecutarla en cualquier momento, incluso con un AlmacenDiferido activo:
+    el saldo que escribe es el mismo que ese almacén tiene pendiente.
+    Retorna la cantidad de cuentas corregidas.
+    """
+    with transaccion_escritura(nombre_bd, con=con, operacion='recuperar_saldos') as con:
+        return materializar_saldos(con.cursor())
+
+
+class AlmacenDiferido(AlmacenSQLite):
+    """
+    AlmacenSQLite que no escribe el saldo de la cuenta en cada movimiento.
+
+    Cada movimiento se confirma como siempre, con su `saldoResultante`; el
+    nuevo saldo queda pendiente en memoria y se escribe en ctacte según la
+    `durabilidad` ('por_lotes' o 'al_cerrar', ver DURABILIDADES). Una cuenta
+    con cientos de movimientos por segundo escribe así su saldo una vez por
+    vaciado y no una vez por movimiento. Si el proceso cae, los movimientos
+    siguen siendo la fuente de verdad: al crear el almacén se ejecuta
+    `recuperar_saldos`.
+
+    Los saldos pendientes viven en este proceso: debe ser el único que
+    escribe en esas cuentas (por ejemplo, servidor.py).
+    """
+
+    def __init__(self, nombre_bd=None, durabilidad='por_lotes', intervalo=INTERVALO_VACIADO,
+                 maximo_pendientes=MAXIMO_PENDIENTES, reutilizar_conexiones=False):
+        if durabilidad not in ('por_lotes', 'al_cerrar'):
+            raise ValueError("La durabilidad diferida debe ser 'por_lotes' o 'al_cerrar'.")
+        super().__init__(nombre_bd, reutilizar_conexiones)
+        self.durabilidad = durabilidad
+        self.intervalo = intervalo
+        self.maximo_pendientes = maximo_pendientes
+        # Se toma durante toda la transacción: al vaciar, todo movimiento
+        # confirmado ya tiene su saldo en `_pendientes`
+        self._candado = threading.Lock()
+        self._pendientes = {}
+        self._escritos = {}
+        self._ultimo_vaciado = time.monotonic()
+        self._detenido = threading.Event()
+
+        recuperar_saldos(nombre_bd)
+        atexit.register(self.cerrar)
+        if durabilidad == 'por_lotes':
+            threading.Thread(target=self._vaciar_periodicamente, daemon=True).start()
+
+    def _vaciar_periodicamente(self):
+        while not self._detenido.wait(self.intervalo):
+            if time.monotonic() - self._ultimo_vaciado >= self.intervalo:
+                self.vaciar()
+
+    def leer_cuenta(self, id_cuenta):
+        """Retorna (NumeroCtaCte, rutTitularCta, nomTitularCta, SaldoCta) o None, con el saldo vigente."""
+        fila = super().leer_cuenta(id_cuenta)
+        saldo = self._pendientes.get(id_cuenta)
+        if fila is None or saldo is None:
+            return fila
+        return fila[:3] + (saldo,)
+
+    def aplicar_movimientos(self, movimientos):
+        with self._candado:
+            self._escritos = {}
+            ids, saldos = super().aplicar_movimientos(movimientos)
+            # Confirmado: lo escrito deja de estar pendiente y lo nuevo se agrega
+            for id_cuenta in self._escritos:
+                self._pendientes.pop(id_cuenta, None)
+            if self._escritos:
+                self._ultimo_vaciado = time.monotonic()
+            else:
+                self._pendientes.update(saldos)
+            return ids, saldos
+
+    def _leer_saldo_bd(self, cursor, id_cuenta):
+        saldo = self._pendientes.get(id_cuenta)
+        return saldo if saldo is not None else super()._leer_saldo_bd(cursor, id_cuenta)
+
+    def _actualizar_saldo_bd(self, cursor, saldos):
+        """Deja los saldos pendientes, o los escribe junto con los anteriores si toca vaciar."""
+        if self.durabilidad == 'por_lotes' and (
+                len(self._pendientes) + len(saldos) >= self.maximo_pendientes
+                or time.monotonic() - self._ultimo_vaciado >= self.intervalo):
+            self._escritos = {**self._pendientes, **saldos}
+            self._escribir(cursor, self._escritos)
+        else:
+            self._escritos = {}
+
+    def _escribir(self, cursor, saldos):
+        # _ultimo_vaciado se actualiza recién cuando la transacción se confirma
+        super()._actualizar_saldo_bd(cursor, saldos)
+        _marcar_vaciado(cursor)
+
+    def vaciar(self):
+        """Escribe en ctacte todos los saldos pendientes."""
+        with self._candado:
+            if self._pendientes:
+                con_reintentos('vaciar_saldos', self._escribir_pendientes)
+                self._pendientes.clear()
+            self._ultimo_vaciado = time.monotonic()
+
+    def _escribir_pendientes(self):
+        with self._transaccion('vaciar_saldos') as con:
+            self._escribir(con.cursor(), self._pendientes)
+
+    def cerrar(self):
+        """Detiene el vaciado periódico y escribe los saldos pendientes."""
+        self._detenido.set()
+        self.vaciar()
+        atexit.unregister(self.cerrar)
+
+
+def crear_almacen(nombre_bd=None, durabilidad='inmediata', reutilizar_conexiones=False, **opciones):
+    """
+    Crea el almacén SQLite para un modo de durabilidad (ver DURABILIDADES).
+    Las `opciones` (intervalo, maximo_pendientes) aplican a los modos diferidos.
+    """
+    if durabilidad not in DURABILIDADES:
+        raise ValueError(f"Durabilidad desconocida: {durabilidad}")
+    if durabilidad == 'inmediata':
+        return AlmacenSQLite(nombre_bd, reutilizar_conexiones)
+    return AlmacenDiferido(nombre_bd, durabilidad, reutilizar_conexiones=reutilizar_conexiones, **opciones)
+
+
+def medir(operaciones=20000, nombre_bd=None):
+    """
+    Compara depósitos sobre una misma cuenta con cada durabilidad.
+    Retorna {durabilidad: µs por operación}.
+    """
+    from cuenta_corriente import CuentaCorriente, crear_tablas
+
+    crear_tablas(nombre_bd)
+    resultados = {}
+    for durabilidad in DURABILIDADES:
+        almacen = crear_almacen(nombre_bd, durabilidad, reutilizar_conexiones=True)
+        cuenta = CuentaCorriente(1, '1-9', 'Prueba', 0.0, nombre_bd, almacen)
+        inicio = time.perf_counter()
+        for i in range(operaciones):
+            cuenta.depositar(1.0, i)
+        almacen.vaciar()
+        resultados[durabilidad] = (time.perf_counter() - inicio) / operaciones * 1e6
+        if isinstance(almacen, AlmacenDiferido):
+            almacen.cerrar()
+    return resultados
+
+
+if __name__ == "__main__":
+    for durabilidad, microsegundos in medir().items():
+        print(f"{durabilidad}: {microsegundos:.1f} µs por depósito")
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cuenta_corriente import CuentaCorriente, crear_tablas, transferir
+from saldos_diferidos import DURABILIDADES, crear_almacen
+
+RUTA_CUENTA = re.compile(r'^/cuentas/(\d+)$')
+RUTA_OPERACION = re.compile(r'^/cuentas/(\d+)/(depositos|retiros)$')
+CUENTAS_EN_CACHE = 10000
+
+
+class ServicioCuentas:
+    """
+    Estado compartido del servidor: un almacén con conexiones reutilizadas por
+    hilo y un caché LRU de las cuentas ya cargadas (a lo más
+    CUENTAS_EN_CACHE; la menos usada se descarta). `durabilidad` elige cuándo se
+    escribe el saldo de las cuentas (ver saldos_diferidos.DURABILIDADES).
+    Las exportaciones se escriben solo dentro de `carpeta_exportaciones`.
+    """
+
+    def __init__(self, nombre_bd=None, durabilidad='inmediata', carpeta_exportaciones='.'):
+        crear_tablas(nombre_bd)
+        self.nombre_bd = nombre_bd
+        self.carpeta_exportaciones = carpeta_exportaciones
+        self.almacen = crear_almacen(nombre_bd, durabilidad, reutilizar_conexiones=True)
+        self._cuentas = OrderedDict()
+        self._candado = threading.Lock()
+
+    def cuenta(self, id_cuenta):
+        """Retorna la cuenta desde el caché, cargándola la primera vez."""
+        with self._candado:
+            cuenta = self._cuentas.get(id_cuenta)
+            if cuenta is not None:
+                self._cuentas.move_to_end(id_cuenta)
+                return cuenta
+        cuenta = CuentaCorriente.cargar(id_cuenta, self.nombre_bd, self.almacen)
+        if cuenta is None:
+            raise LookupError(f"La cuenta {id_cuenta} no existe.")
+        return self._recordar(cuenta)
+
+    def _recordar(self, cuenta):
+        """Deja la cuenta en el caché (si otro hilo ya la cargó, retorna esa)."""
+        with self._candado:
+            cuenta = self._cuentas.setdefault(cuenta.id, cuenta)
+            self._cuentas.move_to_end(cuenta.id)
+            if len(self._cuentas) > CUENTAS_EN_CACHE:
+                self._cuentas.popitem(last=False)
+        return cuenta
+
+    def crear_cuenta(self, datos):
+        """Crea una cuenta y la deja en el caché."""
+        cuenta = CuentaCorriente(datos['numero_cuenta'], datos['rut_titular'], datos['nombre_titular'],
+                                 datos.get('saldo_inicial', 0.0), self.nombre_bd, self.almacen)
+        self._recordar(cuenta)
+        return {'id': cuenta.id, 'saldo': cuenta.saldo}
+
+    def consultar(self, id_cuenta):
+        """Lee la cuenta desde la base (no desde el caché)."""
+        fila = self.almacen.leer_cuenta(id_cuenta)
+        if fila is None:
+            raise LookupError(f"La cuenta {id_cuenta} no existe.")
+        numero, rut, nombre, saldo = fila
+        return {'id': id_cuenta, 'numero_cuenta': numero, 'rut_titular': rut,
+                'nombre_titular': nombre, 'saldo': saldo}
+
+    def operar(self, id_cuenta, operacion, datos):
+        """Aplica un depósito o un retiro."""
+        cuenta = self.cuenta(id_cuenta)
+        metodo = cuenta.depositar if operacion == 'depositos' else cuenta.retirar
+        id_registro = metodo(datos['monto'], datos.get('id_movimiento'), datos.get('clave_idempotencia'),
+                             datos.get('descripcion'))
+        return {'id_registro': id_registro, 'saldo': cuenta.saldo}
+
+    def transferir(self, datos):
+        """Transfiere entre dos cuentas."""
+        origen = self.cuenta(datos['origen'])
+        destino = self.cuenta(datos['destino'])
+        ids = transferir(origen, destino, datos['monto'], datos.get('id_movimiento'),
+                         datos.get('clave_idempotencia'), datos.get('descripcion'))
+        return {'ids_registro': list(ids), 'saldo_origen': origen.saldo, 'saldo_destino': destino.saldo}
+
+    def _ruta_exportacion(self, archivo):
+        """Ruta de `archivo` dentro de la carpeta de exportaciones; rechaza rutas y nombres especiales."""
+        if not isinstance(archivo, str) or archivo in ('', '.', '..') or os.path.basename(archivo) != archivo:
+            raise ValueError("archivo debe ser un nombre de archivo, sin carpetas.")
+        return os.path.join(self.carpeta_exportaciones, archivo)
+
+    def exportar(self, datos):
+        """Exporta cuentas o movimientos a CSV en la carpeta de exportaciones."""
+        tipo = datos.get('tipo')
+        if tipo == 'cuentas':
+            ruta = self._ruta_exportacion(datos.get('archivo', 'CuentasCorrientes.csv'))
+        elif tipo == 'movimientos':
+            ruta = self._ruta_exportacion(datos.get('archivo', 'Movimientos.csv'))
+        elif tipo != 'instantanea':
+            raise ValueError("tipo debe ser 'cuentas', 'movimientos' o 'instantanea'.")
+        # El CSV de cuentas debe incluir los saldos aún no escritos
+        self.almacen.vaciar()
+        if tipo == 'cuentas':
+            CuentaCorriente.exportar_cuentas_csv(ruta, self.nombre_bd)
+        elif tipo == 'movimientos':
+            CuentaCorriente.exportar_movimientos_csv(ruta, self.nombre_bd)
+        else:
+            return CuentaCorriente.exportar_instantanea(
+                self._ruta_exportacion('CuentasCorrientes.csv'), self._ruta_exportacion('Movimientos.csv'),
+                self._ruta_exportacion('Exportacion.json'), self.nombre_bd)
+        return {'ok': True}
+
+
+class ManejadorCuentas(BaseHTTPRequestHandler):
+    """
+    API JSON sobre HTTP/1.1: la conexión del cliente se mantiene abierta
+    entre solicitudes (keep-alive), así que cada operación cuesta solo el
+    trabajo en la base de datos.
+
+    - POST /cuentas                      crea una cuenta
+    - GET  /cuentas/<id>                 consulta una cuenta
+    - POST /cuentas/<id>/depositos       deposita {monto, id_movimiento, clave_idempotencia, descripcion}
+    - POST /cuentas/<id>/retiros         retira   {monto, id_movimiento, clave_idempotencia, descripcion}
+    - POST /transferencias               {origen, destino, monto, id_movimiento, clave_idempotencia, descripcion}
+    - POST /exportaciones                {tipo: cuentas|movimientos|instantanea, archivo (nombre, sin carpetas)}
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Encabezados y cuerpo salen en escrituras separadas; con Nagle activo
+    # cada respuesta esperaría el ACK retardado del cliente (~40 ms).
+    disable_nagle_algorithm = True
+    servicio = None
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _leer_json(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(largo) or b'{}')
+
+    def _atender(self, accion):
+        try:
+            self._responder(200, accion())
+        except KeyError as e:
+            self._responder(400, {'error': f"Falta el campo {e}."})
+        except LookupError as e:
+            self._responder(404, {'error': str(e)})
+        except (ValueError, TypeError, json.JSONDecodeError) as e:
+            self._responder(400, {'error': str(e)})
+        except sqlite3.IntegrityError as e:
+            # Datos que violan una restricción: un valor repetido es un conflicto
+            estado = 409 if 'UNIQUE' in str(e) else 400
+            self._responder(estado, {'error': f"Datos rechazados por la base: {e}"})
+        except sqlite3.OperationalError as e:
+            # Base bloqueada tras los reintentos, o no disponible
+            self._responder(503, {'error': f"Base de datos no disponible: {e}"})
+        except sqlite3.Error as e:
+            self._responder(500, {'error': f"Error de base de datos: {e}"})
+        except OSError as e:
+            # Por ejemplo, la carpeta de exportaciones no existe o no se puede escribir
+            self._responder(500, {'error': f"Error de archivo: {e.strerror or e}"})
+
+    def do_GET(self):
+        ruta = RUTA_CUENTA.match(self.path)
+        if ruta:
+            self._atender(lambda: self.servicio.consultar(int(ruta.group(1))))
+        else:
+            self._responder(404, {'error': 'Ruta no encontrada.'})
+
+    def do_POST(self):
+        try:
+            datos = self._leer_json()
+        except json.JSONDecodeError as e:
+            self._responder(400, {'error': f"JSON inválido: {e}"})
+            return
+        ruta = RUTA_OPERACION.match(self.path)
+        if ruta:
+            self._atender(lambda: self.servicio.operar(int(ruta.group(1)), ruta.group(2), datos))
+        elif self.path == '/cuentas':
+            self._atender(lambda: self.servicio.crear_cuenta(datos))
+        elif self.path == '/transferencias':
+            self._atender(lambda: self.servicio.transferir(datos))
+        elif self.path == '/exportaciones':
+            self._atender(lambda: self.servicio.exportar(datos))
+        else:
+            self._responder(404, {'error': 'Ruta no encontrada.'})
+
+    def log_message(self, formato, *args):
+        # Sin una línea por solicitud: en carga alta la salida domina la latencia
+        pass
+
+
+def crear_servidor(host='127.0.0.1', puerto=8000, nombre_bd=None, durabilidad='inmediata',
+                   carpeta_exportaciones='.'):
+    """Crea el servidor HTTP (aún sin atender solicitudes)."""
+    servicio = ServicioCuentas(nombre_bd, durabilidad, carpeta_exportaciones)
+    manejador = type('Manejador', (ManejadorCuentas,), {'servicio': servicio})
+    return ThreadingHTTPServer((host, puerto), manejador)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio local de cuentas corrientes.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8000)
+    parser.add_argument('--bd', default=None, help="Archivo de base de datos")
+    parser.add_argument('--durabilidad', choices=DURABILIDADES, default='inmediata',
+                        help="Cuándo se escribe el saldo de las cuentas")
+    parser.add_argument('--exportaciones', default='.', help="Carpeta donde se escriben las exportaciones")
+    argumentos = parser.parse_args()
+
+    servidor = crear_servidor(argumentos.host, argumentos.puerto, argumentos.bd, argumentos.durabilidad,
+                              argumentos.exportaciones)
+    print(f"Atendiendo en http://{argumentos.host}:{argumentos.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servidor.RequestHandlerClass.servicio.almacen.vaciar()
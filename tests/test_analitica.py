@@ -0,0 +1,54 @@
+import os
+import statistics
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analitica  # noqa: E402
+from cuenta_corriente import CuentaCorriente, crear_tablas  # noqa: E402
+
+
+class DesviacionSaldos(unittest.TestCase):
+    """La desviación no pierde precisión con saldos grandes y parecidos."""
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def _base(self, saldos):
+        nombre_bd = os.path.join(self.carpeta.name, f"Cuentas_{len(saldos)}.db")
+        crear_tablas(nombre_bd)
+        for numero, saldo in enumerate(saldos, start=1):
+            CuentaCorriente(numero, '11111111-1', 'Titular', saldo, nombre_bd)
+        return nombre_bd
+
+    def _comprobar(self):
+        nombre_bd = self._base([1e9, 1e9 + 1])
+        self.assertEqual(analitica.distribucion_saldos(nombre_bd=nombre_bd)['desviacion'], 0.5)
+
+        saldos = [1e9, 1e9 + 1, 1e9 + 2, 1e9 + 0.5, 1e9 + 1.5]
+        nombre_bd = self._base(saldos)
+        # Con bloques de 2 filas también se prueba la combinación entre bloques
+        for tamano_bloque in (2, analitica.TAMANO_BLOQUE):
+            resumen = analitica.distribucion_saldos(nombre_bd=nombre_bd, tamano_bloque=tamano_bloque)
+            self.assertAlmostEqual(resumen['desviacion'], statistics.pstdev(saldos), places=9)
+            self.assertEqual(resumen['total'], sum(saldos))
+
+    def test_con_array(self):
+        motor, analitica.np = analitica.np, None
+        try:
+            self._comprobar()
+        finally:
+            analitica.np = motor
+
+    @unittest.skipIf(analitica.np is None, "NumPy no está instalado")
+    def test_con_numpy(self):
+        self._comprobar()
+
+
+if __name__ == "__main__":
+    unittest.main()
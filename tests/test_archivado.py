@@ -0,0 +1,66 @@
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archivado import archivar_movimientos, ruta_archivo  # noqa: E402
+from cuenta_corriente import (CuentaCorriente, aplicar_movimientos, crear_conexion,  # noqa: E402
+                              crear_tablas, transferir)
+
+
+class ReintentosTrasArchivar(unittest.TestCase):
+    """Una clave de idempotencia sigue valiendo después de archivar su movimiento."""
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.nombre_bd = os.path.join(self.carpeta.name, 'Cuentas.db')
+        crear_tablas(self.nombre_bd)
+        self.origen = CuentaCorriente(1, '11111111-1', 'Origen', 100.0, self.nombre_bd)
+        self.destino = CuentaCorriente(2, '22222222-2', 'Destino', 0.0, self.nombre_bd)
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def _archivar(self):
+        manana = datetime.date.today() + datetime.timedelta(days=1)
+        archivados = archivar_movimientos(manana, self.nombre_bd)
+        self.assertGreater(sum(archivados.values()), 0)
+        with crear_conexion(self.nombre_bd) as con:
+            self.assertEqual(con.execute('SELECT COUNT(*) FROM movimientos').fetchone()[0], 0)
+
+    def _saldo(self, cuenta):
+        return CuentaCorriente.cargar(cuenta.id, self.nombre_bd).saldo
+
+    def test_deposito(self):
+        original = self.origen.depositar(10.0, clave_idempotencia='deposito-1')
+        self._archivar()
+        self.assertEqual(self.origen.depositar(10.0, clave_idempotencia='deposito-1'), original)
+        self.assertEqual(self._saldo(self.origen), 110.0)
+
+    def test_transferencia(self):
+        original = transferir(self.origen, self.destino, 30.0, clave_idempotencia='transferencia-1')
+        self._archivar()
+        self.assertEqual(transferir(self.origen, self.destino, 30.0, clave_idempotencia='transferencia-1'), original)
+        self.assertEqual((self._saldo(self.origen), self._saldo(self.destino)), (70.0, 30.0))
+
+    def test_lote(self):
+        original = aplicar_movimientos([(self.origen, 0, 5.0, None, 'lote-1')])
+        self._archivar()
+        self.assertEqual(aplicar_movimientos([(self.origen, 0, 5.0, None, 'lote-1')]), original)
+        self.assertEqual(self._saldo(self.origen), 95.0)
+
+    def test_archivo_conserva_movimientos(self):
+        self.origen.depositar(10.0, clave_idempotencia='deposito-2')
+        self._archivar()
+        # Repetir el archivado no duplica nada
+        archivar_movimientos(datetime.date.today() + datetime.timedelta(days=1), self.nombre_bd)
+        anio = datetime.date.today().strftime('%Y')
+        with crear_conexion(ruta_archivo(anio, self.nombre_bd)) as con:
+            self.assertEqual(con.execute('SELECT COUNT(*) FROM movimientos').fetchone()[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
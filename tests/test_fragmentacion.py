@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fragmentacion import AlmacenFragmentado  # noqa: E402
+
+
+class EnrutamientoPorNumero(unittest.TestCase):
+    """El número leído de la base encuentra la cuenta en su fragmento."""
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.almacen = AlmacenFragmentado(4, os.path.join(self.carpeta.name, 'Cuentas.db'))
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def test_numero_leido_de_la_base(self):
+        for numero in range(1001, 1021):
+            cuenta = self.almacen.crear_cuenta(numero, '11111111-1', 'Titular', 100.0)
+            cuenta.depositar(10.0)
+            fila = self.almacen.buscar_por_id(cuenta.id)
+            self.assertIsInstance(fila[1], float)
+            self.assertEqual(self.almacen.buscar_cuenta(fila[1]), fila)
+            self.assertEqual(len(self.almacen.movimientos_de(fila[1])), 1)
+
+    def test_formas_del_mismo_numero(self):
+        fragmento = self.almacen.fragmento_de(1001)
+        self.assertEqual(self.almacen.fragmento_de(1001.0), fragmento)
+        self.assertEqual(self.almacen.fragmento_de('1001'), fragmento)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archivado import archivar_movimientos  # noqa: E402
+from cuenta_corriente import CuentaCorriente, crear_conexion, crear_tablas  # noqa: E402
+from historial_saldos import estado_de_cuenta, saldo_al  # noqa: E402
+
+
+class SaldoTrasArchivar(unittest.TestCase):
+    """Los saldos pasados siguen siendo correctos después de archivar."""
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.nombre_bd = os.path.join(self.carpeta.name, 'Cuentas.db')
+        crear_tablas(self.nombre_bd)
+        self.cuenta = CuentaCorriente(1, '11111111-1', 'Titular', 0.0, self.nombre_bd)
+        self.cuenta.depositar(100.0)
+        self.cuenta.retirar(30.0)
+        with crear_conexion(self.nombre_bd) as con:
+            con.execute("UPDATE movimientos SET fecha = '2020-03-01 10:00:00' WHERE ID = 1")
+            con.execute("UPDATE movimientos SET fecha = '2020-06-01 10:00:00' WHERE ID = 2")
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def _archivar(self):
+        self.assertEqual(archivar_movimientos(datetime.date(2021, 1, 1), self.nombre_bd), {'2020': 2})
+
+    def _comprobar_saldos(self):
+        self.assertEqual(saldo_al(1, '2020-02-01', self.nombre_bd), 0.0)
+        self.assertEqual(saldo_al(1, '2020-04-01', self.nombre_bd), 100.0)
+        self.assertEqual(saldo_al(1, '2020-12-31', self.nombre_bd), 70.0)
+
+    def test_saldo_al(self):
+        self._archivar()
+        self._comprobar_saldos()
+
+    def test_saldo_al_sin_saldo_resultante(self):
+        with crear_conexion(self.nombre_bd) as con:
+            con.execute("UPDATE movimientos SET saldoResultante = NULL")
+        self._archivar()
+        self._comprobar_saldos()
+
+    def test_estado_de_cuenta(self):
+        self._archivar()
+        cartola = estado_de_cuenta(1, '2020-01-01', '2020-12-31', self.nombre_bd)
+        self.assertEqual([(fila[0], fila[3], fila[4]) for fila in cartola], [(1, 100.0, 100.0), (2, 30.0, 70.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()